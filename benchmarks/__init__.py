@@ -0,0 +1,7 @@
+""" Benchmarks for the harmonious engine
+
+Run a benchmark as a module from the repository root, for example:
+
+    python -m benchmarks.parse_throughput --tasks 2000
+
+"""
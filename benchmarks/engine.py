@@ -0,0 +1,312 @@
+""" Engine benchmark
+
+Measures each layer of the engine on synthetic suites, with the browser
+replaced by the in-process fake browser or by a directive that does nothing:
+
+    parse_task_file     reading and binding task files
+    parse_test_plan     reading test plan documents
+    directive_bind      looking directives up in the registry
+    directive_run       Directive.run of a directive that does nothing
+    callbacks_empty     CALLBACK_REGISTRY.run_all with no callbacks registered
+    callbacks_four      CALLBACK_REGISTRY.run_all with four callbacks registered
+    scope_lookup        NestedScope lookups through three scopes
+    result_tree         building the Result tree of a suite
+    analyze_results     summarising that Result tree
+    task_run            running synthetic tasks in the fake browser
+
+Each layer is timed --repeat times and the best time kept. Results are
+stored as JSON with --output; --compare checks them against an earlier run
+and exits with status 1 when a layer got slower by more than --threshold:
+
+    python -m benchmarks.engine --output baseline.json
+    python -m benchmarks.engine --compare baseline.json --threshold 0.25
+    python -m benchmarks.engine --compare baseline.json current.json
+
+Layers are compared by their time per operation, so runs at different
+--scale can still be compared.
+
+"""
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import itertools
+
+from harmonious import parsers
+from harmonious.core import Directive, NestedScope, Result, Variables, CALLBACK_REGISTRY
+from harmonious.decorators import directive
+from harmonious.fake import FakeBrowser, FAKE_PAGES
+from harmonious.output.results import analyze_results
+from benchmarks.synthetic import write_suite, DIRECTIVES, GLOSSARY
+
+# The page synthetic tasks load; it has every element their glossary names
+SYNTHETIC_PAGE = """<html><head><title>Testing - Search</title></head><body>
+<form><input name="q"><button id="submit">Search</button></form>
+<p id="resultStats">About 10 results for Testing</p>
+<input type="checkbox" id="agree">
+<select id="country"><option value="us">United States<option value="gb">United Kingdom</select>
+</body></html>"""
+
+
+@directive(r'^Benchmark no-op (?P<value>.+)$')
+def no_op(browser, value):
+    pass
+
+
+# Numbers the rounds of directive_bind, which each bind strings of their own
+BIND_ROUNDS = itertools.count()
+
+
+def no_op_callback(**kwargs):
+    pass
+
+
+class Suite(object):
+    """ A synthetic suite written to a temporary directory
+
+        Args:
+        scale: multiplies the number of plans, tasks and directives measured
+
+        Attributes:
+        plan_files, task_files: the files written, see ::func::write_suite
+        operations: the number of operations in each in-memory layer
+    """
+    def __init__(self, scale):
+        self.path = tempfile.mkdtemp()
+        self.plans = max(1, int(50 * scale))
+        self.tasks = max(1, int(500 * scale))
+        self.steps = 5
+        self.directives = 8
+        (self.plan_files, self.task_files) = write_suite(self.path, self.plans, self.tasks,
+                                                         self.steps, self.directives)
+        self.operations = max(1, int(100000 * scale))
+
+    def close(self):
+        shutil.rmtree(self.path)
+
+
+def parse_task_files(suite):
+    start = time.time()
+    for filename in suite.task_files:
+        parsers.parse_task_file(filename)
+    return (time.time() - start, len(suite.task_files))
+
+
+def parse_test_plans(suite):
+    start = time.time()
+    for filename in suite.plan_files:
+        parsers.parse_test_plan(filename)
+    return (time.time() - start, suite.plans)
+
+
+def bind_directives(suite):
+    # Strings no earlier round used, so the registry's memo of lookups doesn't answer them
+    number = next(BIND_ROUNDS)
+    strings = ['Expect Page Title is "Title %d.%d"' % (number, index) for index in range(suite.operations / 10)]
+    start = time.time()
+    for string in strings:
+        Directive(string).bind()
+    return (time.time() - start, len(strings))
+
+
+def scope():
+    """ Builds a three level scope like the one a running task has """
+    (plan, task, local) = (Variables(), Variables(), Variables())
+    plan["Server"] = "http://localhost"
+    for (name, value) in GLOSSARY:
+        task.define_immutable(name, value)
+    local["Value"] = "value"
+    nested = NestedScope(plan)
+    nested.push_scope(task)
+    nested.push_scope(local)
+    return nested
+
+
+def run_directives(suite):
+    direction = Directive("Benchmark no-op [Value]")
+    direction.bind()
+    variables = scope()
+    start = time.time()
+    for _ in xrange(suite.operations):
+        direction.run(None, variables)
+    return (time.time() - start, suite.operations)
+
+
+def run_callbacks(suite):
+    direction = Directive("Benchmark no-op [Value]")
+    start = time.time()
+    for _ in xrange(suite.operations):
+        CALLBACK_REGISTRY.run_all(type="directive", callback="before", directive=direction)
+    return (time.time() - start, suite.operations)
+
+
+def run_four_callbacks(suite):
+    callbacks = CALLBACK_REGISTRY["directive"]["before"]
+    callbacks.extend([no_op_callback] * 4)
+    try:
+        return run_callbacks(suite)
+    finally:
+        del callbacks[-4:]
+
+
+def look_up_variables(suite):
+    variables = scope()
+    names = ["Value", "SearchBox", "Server", "Missing"]
+    start = time.time()
+    for index in xrange(suite.operations):
+        variables[names[index % 4]]
+    return (time.time() - start, suite.operations)
+
+
+def result_tree(suite):
+    """ Builds the results of running the suite, with one directive in ten failing """
+    results = []
+    for plan in range(suite.plans):
+        plan_result = Result("Synthetic plan %d" % plan)
+        for task in range(plan, suite.tasks, suite.plans):
+            task_result = plan_result[task] = Result("Task %d" % task)
+            for step in range(suite.steps):
+                step_result = task_result[step] = Result("Step %d" % step)
+                for index in range(suite.directives):
+                    direction = DIRECTIVES[(step + index) % len(DIRECTIVES)]
+                    directive_result = step_result[direction] = Result(direction)
+                    if (task + step + index) % 10 == 0:
+                        directive_result.exception = AssertionError("Synthetic failure")
+        results.append(plan_result)
+    return results
+
+
+def build_results(suite):
+    start = time.time()
+    result_tree(suite)
+    return (time.time() - start, suite.tasks * suite.steps * suite.directives)
+
+
+def analyze(suite):
+    results = result_tree(suite)
+    start = time.time()
+    analyze_results(results)
+    return (time.time() - start, suite.tasks * suite.steps * suite.directives)
+
+
+def run_tasks(suite):
+    FAKE_PAGES["http://localhost/search"] = SYNTHETIC_PAGE
+    tasks = [parsers.parse_task_file(filename) for filename in suite.task_files[:max(1, suite.tasks / 25)]]
+    browser = FakeBrowser()
+    start = time.time()
+    results = [task.run(browser, NestedScope(Variables())) for task in tasks]
+    elapsed = time.time() - start
+    # Failing directives would mostly time exception handling
+    failed = [result.name for result in results if result.failed()]
+    if failed:
+        raise AssertionError("Synthetic tasks failed in the fake browser: %s" % ", ".join(failed))
+    return (elapsed, len(tasks) * suite.steps * suite.directives)
+
+
+LAYERS = [
+    ("parse_task_file", parse_task_files),
+    ("parse_test_plan", parse_test_plans),
+    ("directive_bind", bind_directives),
+    ("directive_run", run_directives),
+    ("callbacks_empty", run_callbacks),
+    ("callbacks_four", run_four_callbacks),
+    ("scope_lookup", look_up_variables),
+    ("result_tree", build_results),
+    ("analyze_results", analyze),
+    ("task_run", run_tasks),
+]
+
+
+def measure(layers, scale, repeat):
+    """ Times each layer on a synthetic suite
+        Args:
+        layers: the names of the layers to time
+        scale: multiplies the size of the suite
+        repeat: the number of times to time each layer; the best time is kept
+
+        Returns: a map of layer name to {"seconds", "operations", "per_operation"}
+    """
+    suite = Suite(scale)
+    results = {}
+    try:
+        for (name, function) in LAYERS:
+            if name not in layers:
+                continue
+            (seconds, operations) = min(function(suite) for _ in range(repeat))
+            results[name] = {"seconds": seconds, "operations": operations,
+                             "per_operation": seconds / operations}
+    finally:
+        suite.close()
+    return results
+
+
+def compare(baseline, current, threshold):
+    """ Compares two runs layer by layer
+        Args:
+        baseline: the layers of the earlier run, as returned by ::func::measure
+        current: the layers of the run to check
+        threshold: how much slower per operation a layer may get, as a fraction
+
+        Returns: a list of (layer, baseline time, current time, ratio, regressed) tuples
+                 for the layers both runs measured
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        before = baseline[name]["per_operation"]
+        after = current[name]["per_operation"]
+        ratio = after / before if before else 1.0
+        rows.append((name, before, after, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def load(filename):
+    with open(filename) as filehandle:
+        return json.load(filehandle)["layers"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies the size of the synthetic suite")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times to time each layer")
+    parser.add_argument("--layers", nargs="+", default=[name for (name, _) in LAYERS],
+                        choices=[name for (name, _) in LAYERS], help="Layers to time")
+    parser.add_argument("--output", help="File to store the results in as JSON")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS",
+                        help="A baseline to compare this run against, or a baseline and the results to compare")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="How much slower a layer may get before --compare fails (0.25 is 25%%)")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a baseline and at most one other results file")
+
+    if args.compare and len(args.compare) == 2:
+        layers = load(args.compare[1])
+    else:
+        layers = measure(args.layers, args.scale, args.repeat)
+        for name in sorted(layers):
+            result = layers[name]
+            print "%-16s %8.3fs %9d ops %10.2fus/op" % (name, result["seconds"], result["operations"],
+                                                        result["per_operation"] * 1e6)
+
+    if args.output:
+        with open(args.output, "w") as filehandle:
+            json.dump({"python": platform.python_version(),
+                       "scale": args.scale,
+                       "repeat": args.repeat,
+                       "layers": layers}, filehandle, indent=2, sort_keys=True)
+
+    if args.compare:
+        rows = compare(load(args.compare[0]), layers, args.threshold)
+        for (name, before, after, ratio, regressed) in rows:
+            print "%-16s %10.2fus %10.2fus %+7.1f%%%s" % (name, before * 1e6, after * 1e6, (ratio - 1) * 100,
+                                                       "  REGRESSED" if regressed else "")
+        if any(regressed for (_, _, _, _, regressed) in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
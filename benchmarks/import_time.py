@@ -0,0 +1,46 @@
+""" Import time benchmark
+
+Measures how long importing harmonious modules takes in a fresh
+interpreter, and whether doing so pulls in selenium's browser drivers.
+
+"""
+import sys
+import argparse
+import subprocess
+
+MODULES = ["harmonious", "harmonious.parsers", "harmonious.bin", "selenium.webdriver"]
+
+SCRIPT = """
+import sys, time
+start = time.time()
+import %s
+print time.time() - start, 'selenium.webdriver' in sys.modules
+"""
+
+
+def measure(module, repeat):
+    """ Imports a module in repeat fresh interpreters
+        Returns: a (best time in seconds, whether selenium.webdriver was imported) tuple
+    """
+    timings = []
+    loaded = False
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", SCRIPT % module])
+        (elapsed, webdriver) = output.split()
+        timings.append(float(elapsed))
+        loaded = webdriver == "True"
+    return (min(timings), loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="Number of interpreters to time each import in")
+    args = parser.parse_args()
+
+    for module in MODULES:
+        (elapsed, loaded) = measure(module, args.repeat)
+        print "%-24s %8.1fms  selenium.webdriver imported: %s" % (module, elapsed * 1000, loaded)
+
+
+if __name__ == "__main__":
+    main()
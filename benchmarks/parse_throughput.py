@@ -0,0 +1,77 @@
+""" Parse throughput benchmark
+
+Measures how quickly task and plan files are parsed, comparing the
+pure-Python loader with a second key normalisation pass (how task files
+used to be parsed) against the parsers as they stand.
+
+"""
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+
+import yaml
+
+from harmonious import parsers, loader
+from benchmarks.synthetic import write_suite
+
+
+def lower_keys(dictionary):
+    if isinstance(dictionary, dict):
+        return dict((key.lower(), lower_keys(value)) for key, value in dictionary.iteritems())
+    return dictionary
+
+
+def legacy_load(filename):
+    with open(filename) as filehandle:
+        return lower_keys(yaml.load(filehandle, Loader=yaml.SafeLoader))
+
+
+def current_load(filename):
+    with open(filename) as filehandle:
+        return yaml.load(filehandle, Loader=parsers.TaskFileLoader)
+
+
+def measure(function, filenames):
+    """ Calls function on each file
+        Returns: the elapsed time in seconds
+    """
+    start = time.time()
+    for filename in filenames:
+        function(filename)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1000, help="Number of task files to generate")
+    parser.add_argument("--plans", type=int, default=100, help="Number of test plans to generate")
+    parser.add_argument("--steps", type=int, default=5, help="Steps per task")
+    parser.add_argument("--directives", type=int, default=8, help="Directives per step")
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        (plan_files, task_files) = write_suite(path, args.plans, args.tasks, args.steps, args.directives)
+
+        print "libyaml loader available: %s" % (parsers.SafeLoader is not yaml.SafeLoader)
+        print "Task files: %d, directives per file: %d" % (len(task_files), args.steps * args.directives)
+
+        results = [("legacy load + lower_keys", measure(legacy_load, task_files)),
+                   ("TaskFileLoader", measure(current_load, task_files)),
+                   ("parse_task_file (with binding)", measure(parsers.parse_task_file, task_files))]
+        start = time.time()
+        loader.parse_files(task_files)
+        results.append(("parse_files (%d processes)" % multiprocessing.cpu_count(), time.time() - start))
+        for (name, elapsed) in results:
+            print "%-32s %8.3fs %10.1f files/s" % (name, elapsed, len(task_files) / elapsed)
+
+        elapsed = measure(parsers.parse_test_plan, plan_files)
+        print "%-32s %8.3fs %10.1f plans/s" % ("parse_test_plan (stream)", elapsed, args.plans / elapsed)
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+""" Synthetic suite generation for benchmarks
+
+Writes test plan and task files shaped like real suites, so each layer of
+the engine can be measured at a size no checked in example reaches.
+
+"""
+import os
+
+GLOSSARY = [
+    ("SearchBox", 'name="q"'),
+    ("SubmitButton", 'id="submit"'),
+    ("ResultStats", 'id="resultStats"'),
+    ("Agree", 'id="agree"'),
+]
+
+DIRECTIVES = [
+    'Load http://localhost/search',
+    'Expect Exists [SearchBox]',
+    'Type "Testing" into [SearchBox]',
+    'Click [SubmitButton]',
+    'Expect Page Title is "Testing - Search"',
+    'Expect [ResultStats] contains "results"',
+    'Check [Agree]',
+    # select_single_item builds a CSS selector from its locator, so it takes CSS rather than a glossary entry
+    'Select "gb" from "#country"',
+    'Expect url to contain "search"',
+    'expect to see content "Testing" within 2 seconds',
+]
+
+
+def task_name(index):
+    return "SyntheticTask%05d" % index
+
+
+def task_document(index, steps=5, directives=8, setup_tasks=()):
+    """ Builds the YAML text of a synthetic task file
+        Args:
+        index: the task number, used for its name
+        steps: the number of steps in the task
+        directives: the number of directives in each step
+        setup_tasks: names of tasks this task depends on
+    """
+    lines = ["---",
+             "    Name: %s" % task_name(index),
+             "    Description: Synthetic task %d" % index]
+    if setup_tasks:
+        lines.append("    Prerequisites:")
+        lines.append("        SetupTasks:")
+        lines.extend("            - %s" % name for name in setup_tasks)
+    lines.append("    Glossary:")
+    lines.extend("        - %s: %s" % entry for entry in GLOSSARY)
+    lines.append("    Steps:")
+    for step in range(steps):
+        lines.append("        - Step %d:" % (step + 1))
+        for directive in range(directives):
+            lines.append("            - %s" % DIRECTIVES[(step + directive) % len(DIRECTIVES)])
+    return "\n".join(lines) + "\n"
+
+
+def plan_document(index, tasks, environment="fake"):
+    """ Builds the YAML text of one test plan document """
+    lines = ["---",
+             "- name: Synthetic plan %d" % index,
+             "  environment: %s" % environment,
+             "  tasks:"]
+    lines.extend("    - %s" % name for name in tasks)
+    return "\n".join(lines) + "\n"
+
+
+def write_suite(path, plans=10, tasks=1000, steps=5, directives=8, dependency_every=0, environment="fake"):
+    """ Writes a synthetic suite in the layout bin.main expects:
+        PATH/plans.yml holding one document per plan and PATH/testcases/*.yml.
+
+        Args:
+        path: the directory to write the suite to
+        plans: the number of test plans; tasks are shared out between them
+        tasks: the number of task files
+        steps: the number of steps per task
+        directives: the number of directives per step
+        dependency_every: if non-zero, every Nth task lists the previous task as a setup task
+        environment: the environment named by the generated plans
+
+        Returns: a (plan files, task files) tuple of the files written
+    """
+    testcases = os.path.join(path, "testcases")
+    if not os.path.isdir(testcases):
+        os.makedirs(testcases)
+
+    task_files = []
+    for index in range(tasks):
+        setup_tasks = ()
+        if dependency_every and index and index % dependency_every == 0:
+            setup_tasks = (task_name(index - 1),)
+        filename = os.path.join(testcases, "%s.yml" % task_name(index))
+        with open(filename, "w") as filehandle:
+            filehandle.write(task_document(index, steps, directives, setup_tasks))
+        task_files.append(filename)
+
+    plan_file = os.path.join(path, "plans.yml")
+    with open(plan_file, "w") as filehandle:
+        for index in range(plans):
+            names = [task_name(task) for task in range(index, tasks, plans)]
+            filehandle.write(plan_document(index, names, environment))
+
+    return ([plan_file], task_files)
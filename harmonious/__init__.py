@@ -1,27 +1,62 @@
 import platform
-from harmonious.core import CALLBACK_REGISTRY
+import importlib
+from harmonious.core import CALLBACK_REGISTRY, FAILURES
 
+# The directive expressions are needed to bind directives when parsing;
+# selenium itself is only imported once a browser is used
 import harmonious.directives.webdriver
 
-# A hack for windows
-if platform.system() == 'Windows':
-    import harmonious.output.win32fix
-    import harmonious.output.console
-else:
-    import harmonious.output.color_console
+LOADED_OUTPUT = []
+
+def load_output(name=None):
+    """ Loads an output module from harmonious.output, which registers its
+        callbacks. Loading the same module twice has no effect.
+
+        Args:
+        name: (optional) the output module to load. Defaults to the console
+              output for the current platform.
+    """
+    if name is None:
+        # A hack for windows
+        if platform.system() == 'Windows':
+            import harmonious.output.win32fix
+            name = 'console'
+        else:
+            name = 'color_console'
+
+    if name not in LOADED_OUTPUT:
+        importlib.import_module('harmonious.output.%s' % name)
+        LOADED_OUTPUT.append(name)
 
 class Runner(object):
     @staticmethod
-    def run(test_plans):
+    def run(test_plans, workers=1, greenlets=0):
+        """ Runs test plans, calling the registered callbacks along the way
+            Args:
+            test_plans: the test plans to run
+            workers: (optional) the number of processes to share the test plans between
+            greenlets: (optional) if set, the number of tasks to run at once as greenlets (needs gevent)
+        """
+        if not LOADED_OUTPUT:
+            load_output()
+
+        FAILURES.reset()
         CALLBACK_REGISTRY.run_all(type="all", callback="before")
         CALLBACK_REGISTRY.run_all(type="all", callback="before_output")
-        results = []
-        for test_plan in test_plans:
-            CALLBACK_REGISTRY.run_all(type="testplan", callback="before", test_plan=test_plan)
-            CALLBACK_REGISTRY.run_all(type="testplan", callback="before_output", test_plan=test_plan)
-            result = test_plan.run()
-            CALLBACK_REGISTRY.run_all(type="testplan", callback="after", test_plan=test_plan, result=result)
-            CALLBACK_REGISTRY.run_all(type="testplan", callback="after_output", test_plan=test_plan, result=result)
-            results.append(result)
+        if greenlets:
+            from harmonious.cooperative import run_cooperative
+            results = run_cooperative(test_plans, greenlets)
+        elif workers > 1:
+            from harmonious.workers import run_sharded
+            results = run_sharded(test_plans, workers)
+        else:
+            results = []
+            for test_plan in test_plans:
+                CALLBACK_REGISTRY.run_all(type="testplan", callback="before", test_plan=test_plan)
+                CALLBACK_REGISTRY.run_all(type="testplan", callback="before_output", test_plan=test_plan)
+                result = test_plan.run()
+                CALLBACK_REGISTRY.run_all(type="testplan", callback="after", test_plan=test_plan, result=result)
+                CALLBACK_REGISTRY.run_all(type="testplan", callback="after_output", test_plan=test_plan, result=result)
+                results.append(result)
         CALLBACK_REGISTRY.run_all(type="all", callback="after", results=results)
         CALLBACK_REGISTRY.run_all(type="all", callback="after_output", results=results)
\ No newline at end of file
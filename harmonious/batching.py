@@ -0,0 +1,95 @@
+""" Batched expectations
+
+Expectations that only read the page can describe themselves as a
+JavaScript condition (the script argument of the directive decorator).
+When a step has a run of two or more such expectations in a row, their
+conditions are all checked with one script, instead of each one finding
+its element and reading it with requests of its own.
+
+The script only ever confirms that an expectation holds. Any that it
+can't confirm, because the condition was false, threw, or the browser
+couldn't run the script at all, are run the usual way, so failures are
+reported exactly as they would be without batching. That also means a
+condition that holds where the directive would fail is a false pass, so
+only expectations JavaScript can check with exactly the same meaning have
+one: whether elements exist, titles, URLs, values and selections. Element
+text (innerText falls back to textContent for hidden elements, unlike
+WebDriver's text) and regular expressions (JavaScript reads Python
+expressions differently) are always checked the usual way.
+
+"""
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.waits import LOCATE_SCRIPT
+
+BATCH_SCRIPT = LOCATE_SCRIPT + """
+function element(locator) {
+    if (locator instanceof Array) { return locate(locator[0], locator[1]); }
+    return locate("css selector", locator);
+}
+
+var checks = arguments[0];
+var held = [];
+for (var i = 0; i < checks.length; i++) {
+    try {
+        held.push(new Function("args", "element", checks[i][0])(checks[i][1], element) === true);
+    } catch (e) {
+        held.push(false);
+    }
+}
+return held;
+"""
+
+
+def condition_of(directive):
+    """ Gets the JavaScript condition a directive can be checked by
+        Returns: the condition, or None if the directive has none or can't be bound
+    """
+    if directive.func is None:
+        try:
+            directive.bind()
+        except Exception:
+            # Running the directive reports this
+            return None
+    return getattr(directive.func, "script", None)
+
+
+def expectation_runs(directions):
+    """ Finds the runs of two or more directives in a row that have conditions
+        Args:
+        directions: the ::class::Directive objects of a step, in order
+
+        Returns: a map of the index each run starts at to the indexes in the run
+    """
+    runs = {}
+    run = []
+    for (index, directive) in enumerate(directions + [None]):
+        if directive is not None and condition_of(directive) is not None:
+            run.append(index)
+            continue
+        if len(run) > 1:
+            runs[run[0]] = run
+        run = []
+    return runs
+
+
+def check_in_browser(browser, directives, variables):
+    """ Checks the conditions of directives with one script
+        Args:
+        browser: the WebDriver
+        directives: the ::class::Directive objects to check, which all have conditions
+        variables: the ::class::NestedScope to resolve their arguments in
+
+        Returns: a list of whether each directive's condition held; all False
+                 if the browser couldn't run the script
+    """
+    checks = []
+    try:
+        for directive in directives:
+            checks.append([directive.func.script, directive.resolve(variables)])
+        held = browser.execute_script(BATCH_SCRIPT, checks)
+    except (WebDriverException, AttributeError, TypeError, ValueError):
+        return [False] * len(directives)
+    if type(held) != list or len(held) != len(directives):
+        return [False] * len(directives)
+    return [value is True for value in held]
@@ -4,40 +4,243 @@ Executes harmonious test cases given commandline arguments.
 
 """
 import os
+import sys
 import glob
 import argparse
-import imp
+import multiprocessing
+
+from harmonious import Runner, load_output
+from harmonious.core import FAIL_FAST_LEVELS
+from harmonious.registries import TASK_REGISTRY
+from harmonious.settings import SETTINGS
+from harmonious.scheduler import TaskGraph
+from harmonious.parsers import parse_test_plan
+from harmonious.cache import PlanCache
+from harmonious.loader import load_environment, discover_task_files, load_task_files, load_referenced_tasks, register_tasks
+
+def referenced_tasks(test_plan):
+    """ Generator over the names of every task a test plan uses, including
+        setup tasks and execute prerequisites, and the task that uses each.
+
+        Yields: (task name, name of the task using it or None) tuples
+    """
+    seen = set()
+    pending = [(name, None) for name in test_plan.tasks]
+    while pending:
+        (name, used_by) = pending.pop(0)
+        if name in seen:
+            continue
+        seen.add(name)
+        yield (name, used_by)
+        task = TASK_REGISTRY.get(name)
+        if task is not None:
+            pending.extend((dependency, name) for dependency in task.setup_tasks + task.execute_prerequisites)
+
+
+def validate(test_plans):
+    """ Checks that the tasks the test plans use were all loaded, that no
+        setup tasks depend on each other and that the settings are valid
+        Returns: a list of error messages
+    """
+    errors = []
+    for test_plan in test_plans:
+        if test_plan.setting("fail_fast") not in FAIL_FAST_LEVELS:
+            errors.append("Test plan '%s' has an unknown fail_fast setting '%s'" % (test_plan.name, test_plan.setting("fail_fast")))
+        cycle = TaskGraph(test_plan.tasks).find_cycle()
+        if cycle:
+            errors.append("Setup tasks in test plan '%s' depend on each other: %s" % (test_plan.name, " -> ".join(cycle)))
+        for (name, used_by) in referenced_tasks(test_plan):
+            if TASK_REGISTRY.get(name) is None:
+                if used_by is None:
+                    errors.append("Test plan '%s' uses unknown task '%s'" % (test_plan.name, name))
+                else:
+                    errors.append("Task '%s' in test plan '%s' uses unknown task '%s'" % (used_by, test_plan.name, name))
+    return errors
+
+
+def list_test_plans(test_plans):
+    """ Prints the test plans and the tasks they run """
+    for test_plan in test_plans:
+        print "%s (%s)" % (test_plan.name, test_plan.environment)
+        for (name, used_by) in referenced_tasks(test_plan):
+            if used_by is None:
+                print "\t%s" % name
+            else:
+                print "\t%s (used by %s)" % (name, used_by)
+
+
+def add_suite_arguments(parser):
+    """ Adds the arguments that select and load the test plans to run """
+    parser.add_argument("path", help="Path to test plans to run")
+    parser.add_argument("--cache-dir", help="Directory for the parsed plan cache (default: PATH/.harmonious_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every file instead of using the plan cache")
+    parser.add_argument("--jobs", type=int, help="Number of processes to parse task files with (default: one per CPU)")
+    parser.add_argument("--no-recursive", action="store_true", help="Only load task files directly in PATH/testcases")
+    parser.add_argument("--plan", action="append", dest="plans", metavar="NAME", help="Only run the named test plan (may be repeated)")
+    parser.add_argument("--all-tasks", action="store_true", help="Load every task file, not just those the test plans use")
+    parser.add_argument("--output", help="Output module from harmonious.output to use (default: console output)")
+    parser.add_argument("--reuse-browser", action="store_true", help="Keep one browser per test plan, reset between tasks")
+    parser.add_argument("--recycle-after", type=int, metavar="N", help="With --reuse-browser, replace the browser every N tasks")
+    parser.add_argument("--fail-fast", choices=FAIL_FAST_LEVELS[1:],
+                        help="After a failure, skip the rest of its step, task, dependent tasks or test plan")
+    parser.add_argument("--maxfail", type=int, metavar="N", help="Skip the remaining tasks once N tasks have failed")
+    parser.add_argument("--snapshot-prerequisites", action="store_true",
+                        help="Restore the state execute prerequisites leave instead of running them for every task")
+    parser.add_argument("--element-cache", action="store_true",
+                        help="Keep found elements so directives acting on the same element find it once")
+
+
+def load_suite(parser, args):
+    """ Loads the environment script, test plans and tasks the arguments select,
+        and applies the commandline settings.
+
+        Returns: the test plans
+    """
+    load_environment(args.path)
+
+    if args.reuse_browser:
+        SETTINGS["reuse_browser"] = True
+    if args.recycle_after is not None:
+        SETTINGS["recycle_after"] = args.recycle_after
+    if args.snapshot_prerequisites:
+        SETTINGS["snapshot_prerequisites"] = True
+    if args.element_cache:
+        SETTINGS["element_cache"] = True
+    if args.fail_fast is not None:
+        SETTINGS["fail_fast"] = args.fail_fast
+    if args.maxfail is not None:
+        SETTINGS["maxfail"] = args.maxfail
+
+    cache = None
+    if not args.no_cache:
+        cache = PlanCache(args.cache_dir or os.path.join(args.path, ".harmonious_cache"))
+
+    test_plan_files = sorted(glob.glob("%s/*.yml" % args.path))
+
+    test_plans = []
+    for filename in test_plan_files:
+        if cache is not None:
+            test_plans.extend(cache.load(filename, parse_test_plan))
+        else:
+            test_plans.extend(parse_test_plan(filename))
+
+    if args.plans:
+        unknown = set(args.plans).difference(test_plan.name for test_plan in test_plans)
+        if unknown:
+            parser.error("Unknown test plan(s): %s" % ", ".join(sorted(unknown)))
+        test_plans = [test_plan for test_plan in test_plans if test_plan.name in args.plans]
+
+    task_files = discover_task_files(args.path, recursive=not args.no_recursive)
+    if args.all_tasks:
+        register_tasks(load_task_files(task_files, cache, args.jobs, args.path))
+    else:
+        load_referenced_tasks(test_plans, task_files, cache, args.jobs, args.path)
+
+    return test_plans
+
+
+def check(test_plans):
+    """ Prints any problems with the test plans and exits if there are some """
+    errors = validate(test_plans)
+    for error in errors:
+        print >>sys.stderr, "ERROR: %s" % error
+    if errors:
+        sys.exit(1)
+
+
+def add_authkey_argument(parser):
+    parser.add_argument("--authkey", default=os.environ.get("HARMONIOUS_AUTHKEY"),
+                        help="Key workers authenticate with (default: $HARMONIOUS_AUTHKEY)")
+
+
+def coordinator_main(argv):
+    """ Runs test plans on workers that connect over a socket """
+    parser = argparse.ArgumentParser(prog="harmonious coordinator")
+    add_suite_arguments(parser)
+    parser.add_argument("--listen", required=True, metavar="ADDRESS", help="HOST:PORT or Unix socket path to listen on")
+    parser.add_argument("--local-workers", type=int, default=0, metavar="N", help="Also start N workers on this machine")
+    add_authkey_argument(parser)
+    args = parser.parse_args(argv)
+    if not args.authkey:
+        parser.error("--authkey or HARMONIOUS_AUTHKEY is required")
+
+    test_plans = load_suite(parser, args)
+    check(test_plans)
+
+    from harmonious.distributed import Coordinator, run_worker, parse_address
+    load_output(args.output)
+    coordinator = Coordinator(test_plans, parse_address(args.listen), args.authkey)
+    processes = []
+    for _ in range(args.local_workers):
+        process = multiprocessing.Process(target=run_worker, args=(coordinator.address, args.authkey))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+    coordinator.run()
+    for process in processes:
+        process.join(1)
+
+
+def worker_main(argv):
+    """ Runs tasks handed out by a coordinator """
+    parser = argparse.ArgumentParser(prog="harmonious worker")
+    parser.add_argument("address", help="HOST:PORT or Unix socket path of the coordinator")
+    parser.add_argument("--path", help="Test plan folder to load the environment script from")
+    add_authkey_argument(parser)
+    args = parser.parse_args(argv)
+    if not args.authkey:
+        parser.error("--authkey or HARMONIOUS_AUTHKEY is required")
+
+    from harmonious.distributed import run_worker, parse_address
+    run_worker(parse_address(args.address), args.authkey, args.path)
 
-from harmonious import Runner
-from harmonious.core import TASK_REGISTRY
-from harmonious.parsers import parse_test_plan, parse_task_file
 
 def main():
     """
     Executes harmonious test cases. Uses argparse, loads the environment script
     for a given folder by filename (to allow loading of callbacks and additional directives),
     and runs the test cases found.
+
+    "harmonious coordinator" and "harmonious worker" instead run the test cases
+    spread across worker processes, see ::mod::harmonious.distributed.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == "coordinator":
+        return coordinator_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        return worker_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser()
-    parser.add_argument("path", help="Path to test plans to run")
+    add_suite_arguments(parser)
+    parser.add_argument("--list", action="store_true", help="List the test plans and their tasks instead of running them")
+    parser.add_argument("--validate", action="store_true", help="Check the test plans and tasks load instead of running them")
+    parser.add_argument("--parallel", type=int, metavar="N", help="Run up to N tasks of a test plan at once, each in its own browser")
+    parser.add_argument("--workers", type=int, default=1, metavar="N", help="Share the test plans between N worker processes")
+    parser.add_argument("--greenlets", type=int, default=0, metavar="N",
+                        help="Run up to N tasks from any test plan at once as greenlets in one thread (needs gevent)")
 
     args = parser.parse_args()
+    if args.greenlets:
+        try:
+            import gevent
+        except ImportError:
+            parser.error("--greenlets needs gevent to be installed")
 
-    if os.path.exists("%s/environment.py"  % args.path):
-        imp.load_source("environment", "%s/environment.py" % args.path)
+    test_plans = load_suite(parser, args)
+    if args.parallel is not None:
+        SETTINGS["parallel"] = args.parallel
 
-    test_plan_files = glob.glob("%s/*.yml" % args.path)
+    if args.list:
+        list_test_plans(test_plans)
+        return
 
-    test_plans = []
-    for filename in test_plan_files:
-        test_plans.extend(parse_test_plan(filename))
+    check(test_plans)
 
-    task_files = glob.glob("%s/testcases/*.yml" % args.path)
-    for filename in task_files:
-        task = parse_task_file(filename)
-        TASK_REGISTRY[task.name] = task
+    if args.validate:
+        print "%d test plan(s) OK" % len(test_plans)
+        return
 
-    Runner.run(test_plans)
+    load_output(args.output)
+    Runner.run(test_plans, args.workers, args.greenlets)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,225 @@
+""" Browser options
+
+A test plan's environment is either the name of a browser or a block that
+also says how to launch it:
+
+    environment:
+      browser: chrome
+      headless: true
+      pageloadstrategy: eager
+      windowsize: 1280x800
+      block: [images, fonts, ads.example.com, "*.tracker.net"]
+
+The page load strategy decides when loading a page returns: once it has
+loaded in full ("normal"), once its document is ready ("eager"), or at
+once ("none"). Besides images and fonts, block takes host names, which may
+use * as a wildcard; requests to them fail without going to the network.
+
+Each option is applied the way the browser allows, and ignored by browsers
+that have no way to apply it: PhantomJS is always headless and can only
+block images, and the other drivers only take the page load strategy and
+window size.
+
+"""
+import base64
+
+from harmonious.exceptions import InvalidEnvironmentError
+
+PAGE_LOAD_STRATEGIES = ("normal", "eager", "none")
+
+# What block takes besides host names
+BLOCKABLE = ("images", "fonts")
+
+# The keyword argument each local driver takes its capabilities in
+CAPABILITY_ARGUMENTS = {
+    'ie': 'capabilities',
+    'chrome': 'desired_capabilities',
+    'firefox': 'capabilities',
+    'safari': 'desired_capabilities',
+    'opera': 'desired_capabilities',
+    'phantom': 'desired_capabilities',
+}
+
+# Blocked hosts are sent to a proxy that refuses connections
+BLOCKING_PAC = """function FindProxyForURL(url, host) {
+    var blocked = [%s];
+    for (var i = 0; i < blocked.length; i++) {
+        if (shExpMatch(host, blocked[i])) { return "PROXY 127.0.0.1:9"; }
+    }
+    return "DIRECT";
+}"""
+
+
+class BrowserOptions(object):
+    """ How to launch the browser of a test plan
+
+        Args:
+        headless: (optional) whether to run the browser without a window
+        page_load_strategy: (optional) one of PAGE_LOAD_STRATEGIES, or None for the driver's default
+        window_size: (optional) a (width, height) tuple
+        block: (optional) "images", "fonts" and host names to block
+
+        Attributes:
+        headless, page_load_strategy, window_size: as given
+        block_images: whether to block images
+        block_fonts: whether to block web fonts
+        blocked_hosts: the host names to block
+    """
+    def __init__(self, headless=False, page_load_strategy=None, window_size=None, block=()):
+        self.headless = headless
+        self.page_load_strategy = page_load_strategy
+        self.window_size = window_size
+        self.block_images = "images" in block
+        self.block_fonts = "fonts" in block
+        self.blocked_hosts = [entry for entry in block if entry not in BLOCKABLE]
+
+    def pac_url(self):
+        """ Gets a proxy auto-config URL that blocks the blocked hosts """
+        hosts = ", ".join('"%s"' % host.replace('"', '') for host in self.blocked_hosts)
+        return "data:application/x-ns-proxy-autoconfig;base64," + base64.b64encode(BLOCKING_PAC % hosts)
+
+
+def parse_window_size(value):
+    """ Parses a window size given as "WIDTHxHEIGHT" or a [width, height] list """
+    try:
+        if isinstance(value, basestring):
+            value = value.lower().split("x")
+        (width, height) = [int(part) for part in value]
+    except (TypeError, ValueError):
+        raise InvalidEnvironmentError("Window size should be WIDTHxHEIGHT, not '%s'" % (value,))
+    return (width, height)
+
+
+def parse_environment(value):
+    """ Parses the environment of a test plan
+        Args:
+        value: a browser name, or a mapping of options (see the module documentation)
+
+        Returns: a (browser name, ::class::BrowserOptions or None) tuple
+        Raises: ::class::InvalidEnvironmentError if an option isn't understood
+    """
+    if not isinstance(value, dict):
+        return (value, None)
+
+    entries = dict((key.lower(), entry) for (key, entry) in value.iteritems())
+    unknown = set(entries) - set(["browser", "headless", "pageloadstrategy", "windowsize", "block"])
+    if unknown:
+        raise InvalidEnvironmentError("Unknown environment options: %s" % ", ".join(sorted(unknown)))
+    if "browser" not in entries:
+        raise InvalidEnvironmentError("The environment doesn't name a browser")
+
+    strategy = entries.get("pageloadstrategy")
+    if strategy is not None and strategy not in PAGE_LOAD_STRATEGIES:
+        raise InvalidEnvironmentError("Unknown page load strategy '%s'" % strategy)
+    window_size = entries.get("windowsize")
+    if window_size is not None:
+        window_size = parse_window_size(window_size)
+    block = entries.get("block") or []
+    if isinstance(block, basestring):
+        block = [block]
+
+    options = BrowserOptions(bool(entries.get("headless")), strategy, window_size, list(block))
+    return (entries["browser"], options)
+
+
+def configure_chrome(options, capabilities):
+    from selenium.webdriver import ChromeOptions
+
+    chrome_options = ChromeOptions()
+    if options.headless:
+        chrome_options.add_argument("--headless")
+    if options.window_size:
+        chrome_options.add_argument("--window-size=%d,%d" % options.window_size)
+    if options.block_images:
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    if options.block_fonts:
+        chrome_options.add_argument("--disable-remote-fonts")
+    if options.blocked_hosts:
+        chrome_options.add_argument("--proxy-pac-url=%s" % options.pac_url())
+    # Remote servers read the options from the capabilities. The local driver
+    # replaces them in the capabilities with its chrome_options argument.
+    capabilities.update(chrome_options.to_capabilities())
+    return {"chrome_options": chrome_options}
+
+
+def configure_firefox(options, capabilities):
+    from selenium.webdriver import FirefoxProfile
+    from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
+
+    profile = FirefoxProfile()
+    if options.block_images:
+        profile.set_preference("permissions.default.image", 2)
+    if options.block_fonts:
+        profile.set_preference("browser.display.use_document_fonts", 0)
+    if options.blocked_hosts:
+        profile.set_preference("network.proxy.type", 2)
+        profile.set_preference("network.proxy.autoconfig_url", options.pac_url())
+    profile.update_preferences()
+    capabilities["firefox_profile"] = profile.encoded
+
+    arguments = {"firefox_profile": profile}
+    if options.headless:
+        capabilities["moz:firefoxOptions"] = {"args": ["-headless"]}
+        arguments["firefox_binary"] = FirefoxBinary()
+        arguments["firefox_binary"].add_command_line_options("-headless")
+    return arguments
+
+
+def configure_phantom(options, capabilities):
+    if options.block_images:
+        capabilities["phantomjs.page.settings.loadImages"] = False
+    return {}
+
+
+# Applies the options a browser has its own way of taking. Each function
+# adds to the capabilities, and returns any other arguments a local driver needs.
+CONFIGURE = {
+    'chrome': configure_chrome,
+    'firefox': configure_firefox,
+    'phantom': configure_phantom,
+}
+
+
+def capabilities_for(environment, options, capabilities):
+    """ Adds the options to the capabilities to ask for a browser with
+        Args:
+        environment: the browser name
+        options: the ::class::BrowserOptions
+        capabilities: the desired capabilities dict, which is changed
+
+        Returns: the other arguments a local driver needs for the options
+    """
+    if options.page_load_strategy is not None:
+        capabilities["pageLoadStrategy"] = options.page_load_strategy
+    configure = CONFIGURE.get(environment.lower())
+    if configure is None:
+        return {}
+    return configure(options, capabilities)
+
+
+def resize(browser, options):
+    """ Sets the window size of a browser that has just been launched """
+    if options is not None and options.window_size is not None:
+        browser.set_window_size(*options.window_size)
+    return browser
+
+
+def launch(factory, environment, options=None):
+    """ Launches a local browser
+        Args:
+        factory: the callable from ENVIRONMENT_MAPPING that launches the browser
+        environment: the browser name
+        options: (optional) the ::class::BrowserOptions to launch it with
+
+        Returns: the WebDriver
+    """
+    argument = CAPABILITY_ARGUMENTS.get(environment.lower())
+    if options is None or argument is None:
+        # Environments registered by test suites are launched as they are
+        return resize(factory(), options)
+
+    from harmonious.remote import desired_capabilities
+    capabilities = desired_capabilities(environment)
+    arguments = capabilities_for(environment, options, capabilities)
+    arguments[argument] = capabilities
+    return resize(factory(**arguments), options)
@@ -0,0 +1,109 @@
+""" Compiled plan cache
+
+Stores parsed test plans and tasks on disk, keyed by the content of the
+file they were parsed from, so unchanged files don't have to be parsed
+again on the next run.
+
+"""
+import os
+import hashlib
+import tempfile
+import cPickle as pickle
+
+from harmonious.registries import DIRECTIVE_REGISTRY
+
+# Bump this whenever the pickled structure of the core classes changes
+CACHE_VERSION = 6
+
+
+class PlanCache(object):
+    """ A persistent cache of parsed test plan and task files.
+        An entry is keyed by the file's path and content, the parser used and
+        the directives registered at the time, so editing a file or loading a
+        different set of directives invalidates it.
+
+        Args:
+        directory: the directory to store cache entries in
+
+        Attributes:
+        directory: the directory cache entries are stored in
+        hits: the number of files loaded from the cache
+        misses: the number of files that had to be parsed
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, filename, parser, content):
+        """ Gets the cache key for the given file content
+            Args:
+            filename: the file the content was read from
+            parser: the parse function for the file
+            content: the raw content of the file
+
+            Returns: a hex digest identifying the cache entry
+        """
+        digest = hashlib.sha1()
+        digest.update("%s\0%s\0%s\0" % (CACHE_VERSION, parser.__name__, DIRECTIVE_REGISTRY.fingerprint()))
+        digest.update(os.path.abspath(filename) + "\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+    def entry_path(self, filename, parser):
+        """ Gets the path of the cache entry for a file as it is now
+            Args:
+            filename: the file to look up
+            parser: the parse function for the file
+
+            Returns: the path of the (possibly missing) cache entry
+        """
+        with open(filename, "rb") as filehandle:
+            content = filehandle.read()
+        return os.path.join(self.directory, "%s.pickle" % self.key(filename, parser, content))
+
+    def get(self, path):
+        """ Reads a cache entry
+            Returns: the cached value, or None if there is no usable entry
+        """
+        try:
+            with open(path, "rb") as filehandle:
+                value = pickle.load(filehandle)
+            self.hits += 1
+            return value
+        except (IOError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+    def load(self, filename, parser):
+        """ Loads a parsed file from the cache, parsing (and storing) it if
+            there isn't an up to date entry.
+
+            Args:
+            filename: the file to load
+            parser: the parse function for the file (parse_test_plan or parse_task_file)
+
+            Returns: the result of parser(filename)
+        """
+        path = self.entry_path(filename, parser)
+        value = self.get(path)
+        if value is None:
+            value = parser(filename)
+            self.store(path, value)
+        return value
+
+    def store(self, path, value):
+        """ Writes a cache entry, replacing it atomically where the platform allows.
+            Failing to write the cache is not an error; the file is parsed again next time.
+        """
+        temp_path = None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            (handle, temp_path) = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(handle, "wb") as filehandle:
+                pickle.dump(value, filehandle, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, path)
+        except (IOError, OSError, TypeError, pickle.PicklingError):
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,82 @@
+""" Cooperative test plan execution
+
+Runs tasks from every test plan at once as greenlets in a single thread,
+using gevent. Driving a browser is almost all waiting on WebDriver HTTP
+requests, so with gevent's cooperative sockets one process can keep
+dozens of browser sessions busy without a thread for each.
+
+The directive functions are unchanged: patching the socket, select and
+time modules makes their blocking WebDriver calls and sleeps yield to the
+other greenlets instead. Threads are left unpatched.
+
+"""
+from gevent import monkey
+from gevent.pool import Pool
+from gevent.event import Event
+
+from harmonious.core import Result
+from harmonious.scheduler import SuiteScheduler
+
+
+def patch():
+    """ Makes blocking I/O and sleeps yield to other greenlets. Safe to call more than once. """
+    monkey.patch_all(thread=False)
+
+
+def run_cooperative(test_plans, greenlets):
+    """ Runs the tasks of test plans as greenlets, calling the test plan callbacks
+        as each test plan starts and finishes. Each task gets a browser from a
+        ::class::BrowserSession of its test plan that isn't in use.
+
+        Args:
+        test_plans: the test plans to run
+        greenlets: the number of tasks to run at once
+
+        Returns: the results of the test plans, in the same order
+    """
+    patch()
+    results = [Result(test_plan.name) for test_plan in test_plans]
+    schedule = SuiteScheduler(test_plans, results)
+    idle_sessions = [[] for _ in test_plans]
+    pool = Pool(greenlets)
+    changed = Event()
+
+    def run(item):
+        (index, task_name) = item
+        test_plan = test_plans[index]
+        task_results = Result(test_plan.name)
+        try:
+            session = None
+            try:
+                if idle_sessions[index]:
+                    session = idle_sessions[index].pop()
+                else:
+                    session = test_plan.browser_session()
+                test_plan.run_task(task_name, session, task_results)
+            except Exception as ex:
+                task_results[task_name] = Result(task_name)
+                task_results[task_name].exception = ex
+            if session is not None:
+                idle_sessions[index].append(session)
+            schedule.done(item, task_results)
+            if schedule.complete[index]:
+                for session in idle_sessions[index]:
+                    session.close()
+                del idle_sessions[index][:]
+        finally:
+            if task_name in schedule.schedulers[index].running:
+                # Marking the task done failed; hand it back rather than leave the run waiting on it
+                schedule.requeue(item)
+            changed.set()
+
+    schedule.start()
+    while not schedule.finished():
+        item = schedule.take()
+        if item is None:
+            # Wait for a running task to finish and make more ready
+            changed.clear()
+            changed.wait()
+            continue
+        pool.spawn(run, item)
+    pool.join()
+    return results
@@ -3,22 +3,100 @@
 This module provides core data types for harmonious test plans.
 
 """
+import sys
+import time
+import threading
 from collections import defaultdict
-from selenium import webdriver
 
 from harmonious.registries import DIRECTIVE_REGISTRY, TASK_REGISTRY, CALLBACK_REGISTRY
-from harmonious.utils import unquote_variable, is_substitution
+from harmonious.settings import SETTINGS
+from harmonious.session import BrowserSession
+from harmonious.snapshots import SNAPSHOTS
+from harmonious.batching import expectation_runs, check_in_browser
+from harmonious.browsers import launch
+from harmonious.scheduler import TaskGraph, TaskScheduler
+from harmonious.utils import unquote_variable, is_substitution, LazyFactory
 
 from harmonious.exceptions import ImmutableAccessError, StepReturnedFalseError, DirectionUsesReservedWordError
+from harmonious.exceptions import DependencyCycleError
 
 
+# The values of the fail_fast setting, each skipping more after a failure than the one before
+FAIL_FAST_LEVELS = (None, "directive", "step", "task", "plan")
+
+
+def fails_fast(setting, level):
+    """ Whether a fail_fast setting skips what follows a failure at the given level
+        Args:
+        setting: the value of the fail_fast setting
+        level: one of the ::data::FAIL_FAST_LEVELS
+    """
+    return setting is not None and FAIL_FAST_LEVELS.index(setting) >= FAIL_FAST_LEVELS.index(level)
+
+
+def skipped_result(name):
+    """ Creates the result of an item that was skipped rather than run """
+    result = Result(name)
+    result.skipped = True
+    return result
+
+
+class FailureCount(object):
+    """ Counts the tasks that have failed in this run, for the maxfail setting.
+        Worker processes count in a multiprocessing.Value shared with the
+        parent, so the limit holds across all of them.
+    """
+    def __init__(self):
+        self._count = 0
+        self.shared = None
+        self.lock = threading.Lock()
+
+    @property
+    def count(self):
+        if self.shared is not None:
+            return self.shared.value
+        return self._count
+
+    def add(self):
+        if self.shared is not None:
+            with self.shared.get_lock():
+                self.shared.value += 1
+        else:
+            with self.lock:
+                self._count += 1
+
+    def set(self, count):
+        if self.shared is not None:
+            with self.shared.get_lock():
+                self.shared.value = count
+        else:
+            with self.lock:
+                self._count = count
+
+    def reset(self):
+        self.set(0)
+
+    def share(self, value):
+        """ Counts in a multiprocessing.Value('i') from now on, or locally again if value is None """
+        self.shared = value
+
+    def reached(self, limit):
+        """ Whether limit tasks have failed. A limit of None is never reached. """
+        return limit is not None and self.count >= limit
+
+
+FAILURES = FailureCount()
+
+
+# Selenium's drivers are only imported when a browser is launched
 ENVIRONMENT_MAPPING = {
-                       'ie': webdriver.Ie,
-                       'chrome': webdriver.Chrome,
-                       'firefox': webdriver.Firefox,
-                       'safari': webdriver.Safari,
-                       'opera': webdriver.Opera,
-                       'phantom': webdriver.PhantomJS
+                       'ie': LazyFactory('selenium.webdriver.Ie'),
+                       'chrome': LazyFactory('selenium.webdriver.Chrome'),
+                       'firefox': LazyFactory('selenium.webdriver.Firefox'),
+                       'safari': LazyFactory('selenium.webdriver.Safari'),
+                       'opera': LazyFactory('selenium.webdriver.Opera'),
+                       'phantom': LazyFactory('selenium.webdriver.PhantomJS'),
+                       'fake': LazyFactory('harmonious.fake.FakeBrowser')
                        }
 
 
@@ -34,6 +112,15 @@ class Variables(object):
         self.mutable = defaultdict(lambda: None)
         self.immutable = defaultdict(lambda: None)
 
+    def __getstate__(self):
+        # The defaultdict factories can't be pickled, so store plain dicts
+        return {'mutable': dict(self.mutable), 'immutable': dict(self.immutable)}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.mutable.update(state['mutable'])
+        self.immutable.update(state['immutable'])
+
     def iterkeys(self):
         """ Generator to iterate over keys
             Yields: keys stored in mutable, then keys stored in immutable collections
@@ -176,10 +263,18 @@ class Result(dict):
         Attributes:
         name: Name of the item the result represetns
         exception: Any exception caught at this level of the test plan
+        skipped: Whether the item was skipped because of an earlier failure
+        elapsed: How long running the item took, in seconds (only set for directives)
     """
     def __init__(self, name):
         self.name = name
         self.exception = None
+        self.skipped = False
+        self.elapsed = None
+
+    def failed(self):
+        """ Whether this result, or any of its sub-results, has an exception """
+        return self.exception is not None or any(result.failed() for result in self.itervalues())
 
 class TestPlan(object):
     """ A class that represents a test plan
@@ -194,66 +289,214 @@ class TestPlan(object):
         Attributes:
         name: the name of the test plan
         tasks: a collection of tasks 
-        environment: a structure describing the environment to use for the test
+        environment: the name of the browser to use for the test
+        browser_options: (optional) the ::class::BrowserOptions to launch the browser with
+        remote: (optional) the URL of a WebDriver server to run the environment's browser on
         variables: a collection of variables (this is currently the global scope)
+        settings: values overriding the run settings in ::data::SETTINGS for this plan
     """
     def __init__(self, name):
         self.name = name
         self.tasks = []
         self.environment = None
+        self.browser_options = None
+        self.remote = None
         self.variables = Variables()
+        self.settings = {}
+
+    def setting(self, name):
+        """ Gets a run setting, as overridden by this test plan """
+        if name in self.settings:
+            return self.settings[name]
+        return SETTINGS[name]
+
+    def launch_browser(self):
+        """ Launches a browser for the test plan's environment """
+        if self.remote:
+            from harmonious.remote import launch_remote
+            return launch_remote(self.remote, self.environment, self.browser_options)
+        return launch(ENVIRONMENT_MAPPING[self.environment.lower()], self.environment, self.browser_options)
 
     def dependency_order(self):
-        """ A generator that determines the order of tasks to run given
-            the dependencies listed in the tasks
-            Yields: ::class::Task objects in order of dependencies
+        """ Determines the order to run the tasks in, so that every setup task
+            runs once, before the tasks that need it.
+
+            Returns: a list of task names
+            Raises: ::class::DependencyCycleError if setup tasks depend on each other
         """
-        dependents = defaultdict(set)
-        # If we build the dependencies in terms of tasks that depend
-        # upon a task in question, we can BFS it to build an execution
-        # order that executes things before something that depends on it
-        # requires it.
-        for task in self.tasks:
-            for dependency in TASK_REGISTRY[task].setup_tasks: 
-                dependents[dependency].add(task)
-
-
-        seen = defaultdict(lambda: False)
-        for task in self.tasks:
-            seen[task] = True
-            yield task
-
-            dependent_list = dependents[task]
-            while len(dependent_list) > 0:
-                current = dependent_list.pop(0)
-                if not seen[current]:
-                    yield current
-                    seen[current] = True
-                    dependent_list.extend(dependents[current])
+        return TaskGraph(self.tasks).topological_order()
 
     def run(self):
         """ Runs the Test plan """
         results = Result(self.name)
-        for task_name in self.dependency_order():
-            scope = NestedScope(self.variables)
-            browser = ENVIRONMENT_MAPPING[self.environment.lower()]()
-            task = TASK_REGISTRY[task_name] 
-            for prereq_name in task.execute_prerequisites:
-                prereq = TASK_REGISTRY[prereq_name]
-                CALLBACK_REGISTRY.run_all(type="task", callback="before", task=prereq)
-                CALLBACK_REGISTRY.run_all(type="task", callback="before_output", task=prereq)
-                results[prereq.name] = prereq.run(browser, scope)
-                CALLBACK_REGISTRY.run_all(type="task", callback="after", task=prereq, result=results[prereq.name])
-                CALLBACK_REGISTRY.run_all(type="task", callback="after_output", task=prereq, result=results[prereq.name])
-
-            CALLBACK_REGISTRY.run_all(type="task", callback="before", task=task)
-            CALLBACK_REGISTRY.run_all(type="task", callback="before_output", task=task)
-            results[task_name] = task.run(browser, scope)
-            CALLBACK_REGISTRY.run_all(type="task", callback="after", task=task, result=results[task_name])
-            CALLBACK_REGISTRY.run_all(type="task", callback="after_output", task=task, result=results[task_name])
-            browser.close()
+        if self.setting("parallel") > 1:
+            self.run_parallel(results, self.setting("parallel"))
+            return results
+
+        session = self.browser_session()
+        try:
+            for task_name in self.dependency_order():
+                self.run_task(task_name, session, results)
+        finally:
+            session.close()
         return results
 
+    def browser_session(self):
+        """ Creates a ::class::BrowserSession for this test plan's settings """
+        return BrowserSession(self.launch_browser, self.setting("reuse_browser"), self.setting("recycle_after"))
+
+    def run_parallel(self, results, workers):
+        """ Runs the test plan's tasks on a pool of worker threads, each with its
+            own browser. A task only starts once its setup tasks are done.
+
+            Args:
+            results: the test plan's ::class::Result to add results to
+            workers: the number of tasks to run at once
+        """
+        scheduler = TaskScheduler(TaskGraph(self.tasks))
+        condition = threading.Condition()
+        errors = []
+
+        def work():
+            session = self.browser_session()
+            try:
+                while True:
+                    with condition:
+                        while not scheduler.ready and scheduler.running and not errors:
+                            condition.wait()
+                        if errors or not scheduler.ready:
+                            if scheduler.stalled() and not errors:
+                                cycle = " -> ".join(scheduler.graph.find_cycle())
+                                error = DependencyCycleError("Setup tasks of '%s' depend on each other: %s" % (self.name, cycle))
+                                errors.append((DependencyCycleError, error, None))
+                            condition.notify_all()
+                            return
+                        task_name = scheduler.take()
+
+                    try:
+                        self.run_task(task_name, session, results)
+                    except Exception:
+                        with condition:
+                            errors.append(sys.exc_info())
+                            condition.notify_all()
+                        return
+
+                    with condition:
+                        scheduler.done(task_name)
+                        condition.notify_all()
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=work, name="%s-%d" % (self.name, index))
+                   for index in range(min(workers, len(scheduler.graph)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+
+        if errors:
+            (error_type, error, traceback) = errors[0]
+            raise error_type, error, traceback
+
+    def run_task(self, task_name, session, results):
+        """ Runs a task and its execute prerequisites in a browser from the session
+            Args:
+            task_name: the name of the task to run
+            session: the ::class::BrowserSession to get a browser from
+            results: the test plan's ::class::Result to add results to
+        """
+        if self.should_skip(task_name, results):
+            results[task_name] = skipped_result(task_name)
+            return
+
+        scope = NestedScope(self.variables)
+        browser = session.acquire()
+        task = TASK_REGISTRY[task_name] 
+        fail_fast = self.setting("fail_fast")
+        failed = True
+        try:
+            (_, prerequisites_failed) = self.run_prerequisites(task, browser, scope, results)
+
+            if fails_fast(fail_fast, "task") and prerequisites_failed:
+                result = results[task_name] = skipped_result(task_name)
+            else:
+                CALLBACK_REGISTRY.run_all(type="task", callback="before", task=task)
+                CALLBACK_REGISTRY.run_all(type="task", callback="before_output", task=task)
+                result = results[task_name] = task.run(browser, scope, fail_fast)
+                CALLBACK_REGISTRY.run_all(type="task", callback="after", task=task, result=result)
+                CALLBACK_REGISTRY.run_all(type="task", callback="after_output", task=task, result=result)
+            failed = result.failed() or prerequisites_failed
+        finally:
+            session.release(failed)
+        if failed:
+            FAILURES.add()
+
+    def should_skip(self, task_name, results):
+        """ Whether a task should be skipped because of earlier failures, as the
+            fail_fast and maxfail settings ask. With fail_fast at "task", tasks
+            are skipped when one of their setup tasks failed or was skipped; at
+            "plan", once any task of the test plan has failed.
+
+            Args:
+            task_name: the name of the task about to run
+            results: the test plan's ::class::Result so far
+        """
+        if FAILURES.reached(self.setting("maxfail")):
+            return True
+        fail_fast = self.setting("fail_fast")
+        # Other threads of a parallel test plan add to results while it is read, so read a copy
+        if fails_fast(fail_fast, "plan") and \
+                (results.exception is not None or any(result.failed() for result in results.values())):
+            return True
+        if fails_fast(fail_fast, "task"):
+            for name in TASK_REGISTRY[task_name].setup_tasks:
+                if name in results and (results[name].failed() or results[name].skipped):
+                    return True
+        return False
+
+    def run_prerequisites(self, task, browser, scope, results):
+        """ Runs the execute prerequisites of a task. With the snapshot_prerequisites
+            setting, the browser state left by the longest run of them that has
+            a snapshot is restored instead, and only the rest are run.
+
+            Args:
+            task: the ::class::Task about to run
+            browser: the browser to run them in
+            scope: the ::class::NestedScope the task runs in
+            results: the test plan's ::class::Result to add results to
+
+            Returns: a (results, failed) tuple of this run's results of the prerequisites
+                     by name, and whether any of them failed. Tasks running in parallel
+                     overwrite each other's prerequisite results in the test plan's.
+        """
+        prerequisites = [TASK_REGISTRY[name] for name in task.execute_prerequisites]
+        own = {}
+        snapshots = self.setting("snapshot_prerequisites")
+        start = 0
+        if snapshots:
+            for count in range(len(prerequisites), 0, -1):
+                snapshot = SNAPSHOTS.get(self, prerequisites[:count])
+                if snapshot is not None and snapshot.restore(browser):
+                    for prereq in prerequisites[:count]:
+                        results[prereq.name] = own[prereq.name] = Result(prereq.name)
+                    start = count
+                    break
+
+        failed = False
+        for index in range(start, len(prerequisites)):
+            prereq = prerequisites[index]
+            CALLBACK_REGISTRY.run_all(type="task", callback="before", task=prereq)
+            CALLBACK_REGISTRY.run_all(type="task", callback="before_output", task=prereq)
+            result = results[prereq.name] = own[prereq.name] = prereq.run(browser, scope, self.setting("fail_fast"))
+            CALLBACK_REGISTRY.run_all(type="task", callback="after", task=prereq, result=result)
+            CALLBACK_REGISTRY.run_all(type="task", callback="after_output", task=prereq, result=result)
+            failed = failed or result.failed()
+            if snapshots and not failed:
+                SNAPSHOTS.capture(self, prerequisites[:index + 1], browser)
+        return (own, failed)
+
 
 class Task(object):
     """ A class that represents a task
@@ -272,6 +515,7 @@ class Task(object):
         Attributes:
         name: the name of the task
         description: description of the task
+        filename: the file the task was parsed from, if any
         setup_tasks: pre-requisite tasks that must be run once
         execute_prerequisites: tasks that must be run every time before this one
         steps: a collection of steps to run 
@@ -280,21 +524,33 @@ class Task(object):
     def __init__(self, name, description=None):
         self.name = name
         self.description = description
+        self.filename = None
         self.setup_tasks = list()
         self.execute_prerequisites = list()
         self.variables = Variables()
         self.steps = list()
 
-    def run(self, browser, scope):
-        """ Runs the task """
+    def run(self, browser, scope, fail_fast=None):
+        """ Runs the task
+            Args:
+            browser: the browser to run the task in
+            scope: the ::class::NestedScope to resolve variables in
+            fail_fast: (optional) the fail_fast setting; from "step" up, the steps
+                       after a failed step are skipped
+        """
         results = Result(self.name)
         scope.push_scope(self.variables)
+        failed = False
         for step in self.steps:
+            if failed:
+                results[step.name] = skipped_result(step.name)
+                continue
             CALLBACK_REGISTRY.run_all(type="step", callback="before", step=step)
             CALLBACK_REGISTRY.run_all(type="step", callback="before_output", step=step)
-            results[step.name] = step.run(browser, scope)
+            results[step.name] = step.run(browser, scope, fail_fast)
             CALLBACK_REGISTRY.run_all(type="step", callback="after", step=step, result=results[step.name])
             CALLBACK_REGISTRY.run_all(type="step", callback="after_output", step=step, result=results[step.name])
+            failed = fails_fast(fail_fast, "step") and results[step.name].failed()
         scope.pop_scope()
         return results
 
@@ -316,17 +572,60 @@ class Step(object):
         self.name = name
         self.directions = list()
 
-    def run(self, browser, variables):
-        """ Runs the step """
+    def run(self, browser, variables, fail_fast=None):
+        """ Runs the step
+            Args:
+            browser: the browser to run the step in
+            variables: the ::class::NestedScope to resolve variables in
+            fail_fast: (optional) the fail_fast setting; from "directive" up, the
+                       directives after a failed directive are skipped
+
+            With the batch_expectations setting, a run of expectations is checked
+            with one script when its first directive is reached, see ::mod::harmonious.batching
+        """
         results = Result(self.name)
-        for directive in self.directions:
+        failed = False
+        runs = expectation_runs(self.directions) if SETTINGS["batch_expectations"] else {}
+        batched = {}
+        for (index, directive) in enumerate(self.directions):
+            if failed:
+                results[directive.string] = skipped_result(directive.string)
+                continue
             CALLBACK_REGISTRY.run_all(type="directive", callback="before", directive=directive)
             CALLBACK_REGISTRY.run_all(type="directive", callback="before_output", directive=directive)
-            results[directive.string] = directive.run(browser, variables)
+            if index in runs:
+                batched = self.check_run([self.directions[i] for i in runs[index]], runs[index], browser, variables)
+            if index in batched:
+                results[directive.string] = batched[index]
+            else:
+                results[directive.string] = directive.run(browser, variables)
             CALLBACK_REGISTRY.run_all(type="directive", callback="after", directive=directive, result=results[directive.string])
             CALLBACK_REGISTRY.run_all(type="directive", callback="after_output", directive=directive, result=results[directive.string])
+            failed = fails_fast(fail_fast, "directive") and results[directive.string].failed()
         return results
 
+    def check_run(self, directives, indexes, browser, variables):
+        """ Checks a run of expectations in the browser
+            Args:
+            directives: the ::class::Directive objects in the run
+            indexes: their indexes in the step
+            browser: the browser to check them in
+            variables: the ::class::NestedScope to resolve variables in
+
+            Returns: a map of the indexes of the directives that held to their
+                     passing results; the rest still have to be run
+        """
+        start = time.time()
+        held = check_in_browser(browser, directives, variables)
+        # The time is shared between the directives checked
+        elapsed = (time.time() - start) / len(directives)
+        batched = {}
+        for (index, directive, passed) in zip(indexes, directives, held):
+            if passed:
+                batched[index] = Result(directive.string)
+                batched[index].elapsed = elapsed
+        return batched
+
 class Directive(object):
     """ A class that represents a directive
         A directive is a string that will be bound (via regexp) to execute the individual item
@@ -336,35 +635,80 @@ class Directive(object):
 
         Attributes:
         string: the string for this directive 
+        func: the directive function bound to this directive (None until bound)
+        arguments: a map of argument name to (value, is_substitution) pairs
+                   captured from the string when it was bound
     """
     def __init__(self, string):
         self.string = string
+        self.func = None
+        self.arguments = None
+
+    def bind(self):
+        """ Resolves the directive string to its function and argument template.
+            This only has to happen once per directive, so running it does not
+            search the directive registry again.
+
+            Raises:
+                UnknownDirectiveError if no registered directive matches the string
+                DirectionUsesReservedWordError if the directive captures 'browser'
+        """
+        (func, match) = DIRECTIVE_REGISTRY.lookup(self.string)
+
+        # Remove quotes around strings as needed, and remember
+        # which values are variables to substitute at run time
+        arguments = {}
+        for (key, value) in match.groupdict().iteritems():
+            if value is None:
+                arguments[key] = (None, False)
+            else:
+                arguments[key] = (unquote_variable(value), is_substitution(value))
+
+        # browser is used internally, so let's throw a fit if we already have one
+        if "browser" in arguments:
+            raise DirectionUsesReservedWordError("Direction uses 'browser' which is reserved.")
+
+        self.func = func
+        self.arguments = arguments
+
+    def __getstate__(self):
+        # Directive functions are usually wrapped by decorators and can't be
+        # pickled, so a restored directive binds again the first time it runs
+        return {'string': self.string}
+
+    def __setstate__(self, state):
+        self.__init__(state['string'])
+
+    def resolve(self, variables):
+        """ Gets the arguments to call the directive function with, besides the browser
+            Args:
+            variables: the ::class::NestedScope to substitute variables from
+        """
+        if self.func is None:
+            self.bind()
+
+        kwargs = {}
+        for (key, (value, substitute)) in self.arguments.iteritems():
+            if substitute:
+                kwargs[key] = variables[value]
+            else:
+                kwargs[key] = value
+        return kwargs
 
     def run(self, browser, variables):
         """ Runs the directive """
+        if self.func is None:
+            self.bind()
+
         results = Result(self.string)
-        for (regexp, func) in DIRECTIVE_REGISTRY.iteritems():
-            match = regexp.search(self.string)
-            if match:
-                # Remove quotes around strings as needed,
-                # and substitute variables
-                kwargs = match.groupdict()
-                for (key, value) in kwargs.iteritems():
-                    unquoted = unquote_variable(value)
-                    if is_substitution(value):
-                        kwargs[key] = variables[unquoted]
-                    else:
-                        kwargs[key] = unquoted
-
-                # browser is used internally, so let's throw a fit if we already have one
-                if "browser" in kwargs:
-                    raise DirectionUsesReservedWordError("Direction uses 'browser' which is reserved.")
-
-                kwargs["browser"] = browser
-                try:
-                    result = func(**kwargs)
-                    if result is not None and not result:
-                        results.exception = StepReturnedFalseError()
-                except Exception as ex:
-                    results.exception = ex
-                return results
\ No newline at end of file
+        kwargs = self.resolve(variables)
+        kwargs["browser"] = browser
+        start = time.time()
+        try:
+            result = self.func(**kwargs)
+            if result is not None and not result:
+                results.exception = StepReturnedFalseError()
+        except Exception as ex:
+            results.exception = ex
+        results.elapsed = time.time() - start
+        return results
@@ -1,7 +1,7 @@
 from harmonious.core import DIRECTIVE_REGISTRY, CALLBACK_REGISTRY
 from harmonious.exceptions import ExpectedThrownError
 
-def directive(regexp, throws=None):
+def directive(regexp, throws=None, script=None):
     """ A decorator that maps a regular expression to a function
         for executing code (the wrapped function) that will be executed
         when encountering the appropriate line in a test case
@@ -11,6 +11,10 @@ def directive(regexp, throws=None):
         throws: (optional) If the function expects a raised exception
                 intercept it and consider it a success. Raises 
                 ExpectedThrownError if the expected exception is not thrown
+        script: (optional) for expectations that only read the page, the body
+                of a JavaScript function of the directive's arguments (args)
+                that returns true exactly when the expectation holds. element(locator)
+                is available to it. See ::mod::harmonious.batching
     """
     def _step(func):
         def wrapper(*args, **kwargs):
@@ -29,6 +33,7 @@ def directive(regexp, throws=None):
         # Add the wrapped function to the registry
         DIRECTIVE_REGISTRY.add_directive(regexp, wrapper)
         wrapper.regexp = regexp
+        wrapper.script = script
         return wrapper
 
     return _step
@@ -3,41 +3,209 @@ import time
 
 from harmonious.decorators import directive, expression
 from harmonious.utils import unquote_variable
+from harmonious.settings import SETTINGS
+from harmonious.waits import wait_for_result, wait_in_browser, wait_for_element, wait_for_idle, remaining
+from harmonious.elements import find_element, unwrap, ELEMENT_CACHE
 
-from selenium.webdriver.support.ui import Select
-from selenium.webdriver.common.alert import Alert
+# selenium.webdriver (which imports every browser's driver) is only imported
+# by the directives that need it, when they run
 from selenium.common.exceptions import NoSuchElementException, NoAlertPresentException, WebDriverException, StaleElementReferenceException
 
 
-def find_element(browser, element):
-    if type(element) == tuple:
-        return browser.find_element(by=element[0], value=element[1])
-    else:
-        return browser.find_element(by="css selector", value=element)
+# Finds the innermost elements whose text contains the content, as the XPath
+# in contains_xpath does, and returns whether any of them is displayed. The
+# elements found are kept for the page until it next changes, so polling for
+# content that hasn't appeared yet only checks their visibility again.
+# displayed() follows WebDriver's isDisplayed: hidden by display, opacity or
+# visibility, shown if it or (unless it hides overflow) a child has a size,
+# and hidden when an ancestor that hides overflow leaves it wholly outside.
+# Unlike isDisplayed it doesn't follow containing blocks for positioned
+# elements or scroll the page, so fixed and absolute elements clipped by a
+# container that isn't their containing block, and elements scrolled out of
+# a page that hides overflow, can differ from the XPath fallback.
+CONTAINS_CONTENT_SCRIPT = """
+var content = arguments[0];
+var reuse = arguments[1];
+
+function normalize(text) {
+    return text.replace(/[ \\t\\r\\n]+/g, " ").replace(/^ | $/g, "");
+}
+function contains(el) {
+    return normalize(el.textContent || "").indexOf(content) !== -1;
+}
+function innermost(el, found) {
+    var inner = false;
+    for (var child = el.firstElementChild; child; child = child.nextElementSibling) {
+        if (contains(child)) {
+            inner = true;
+            innermost(child, found);
+        }
+    }
+    if (!inner) { found.push(el); }
+    return found;
+}
+function displayed(el) {
+    if (el.tagName === "OPTION" || el.tagName === "OPTGROUP") {
+        el = el.parentNode.tagName === "SELECT" ? el.parentNode : el.parentNode.parentNode;
+    }
+    for (var node = el; node && node.nodeType === 1; node = node.parentNode) {
+        var style = window.getComputedStyle(node);
+        if (style.display === "none" || style.opacity === "0") { return false; }
+    }
+    var visibility = window.getComputedStyle(el).visibility;
+    if (visibility === "hidden" || visibility === "collapse") { return false; }
+    return positiveSize(el) && !clipped(el);
+}
+function positiveSize(el) {
+    var rect = el.getBoundingClientRect();
+    if (rect.width > 0 && rect.height > 0) { return true; }
+    if (window.getComputedStyle(el).overflow === "hidden") { return false; }
+    for (var child = el.firstChild; child; child = child.nextSibling) {
+        if (child.nodeType === 3 || (child.nodeType === 1 && positiveSize(child))) { return true; }
+    }
+    return false;
+}
+function hides(overflow) {
+    return overflow === "hidden" || overflow === "clip";
+}
+function clipped(el) {
+    var rect = el.getBoundingClientRect();
+    for (var node = el.parentElement; node && node !== root; node = node.parentElement) {
+        var style = window.getComputedStyle(node);
+        var box = node.getBoundingClientRect();
+        if (hides(style.overflowX) && (rect.right <= box.left || rect.left >= box.right)) { return true; }
+        if (hides(style.overflowY) && (rect.bottom <= box.top || rect.top >= box.bottom)) { return true; }
+    }
+    return false;
+}
+
+var root = document.documentElement;
+var found = null;
+var cache = window.__harmoniousText;
+if (reuse && window.MutationObserver) {
+    if (!cache) {
+        cache = window.__harmoniousText = {found: {}};
+        new MutationObserver(function () { cache.found = {}; })
+            .observe(document, {childList: true, subtree: true, characterData: true});
+    }
+    found = cache.found["text:" + content];
+}
+if (!found) {
+    found = root && contains(root) ? innermost(root, []) : [];
+    if (cache) { cache.found["text:" + content] = found; }
+}
+for (var i = 0; i < found.length; i++) {
+    if (displayed(found[i])) { return true; }
+}
+return false;
+"""
+
+
+# The id, name, value, text and selection of each option directly in a select
+OPTION_STATES_SCRIPT = """
+var states = [];
+for (var option = arguments[0].firstElementChild; option; option = option.nextElementSibling) {
+    if (option.tagName === "OPTION") {
+        states.push({id: option.id, name: option.getAttribute("name"), value: option.value,
+                     text: option.text, selected: option.selected});
+    }
+}
+return states;
+"""
+
+# Selects the options of a multiple select that have one of the given values
+# or, failing that, visible text, and deselects the rest. Nothing is changed
+# if the select isn't multiple (null is returned) or a value matches no
+# option (the values that didn't are returned).
+SELECT_OPTIONS_SCRIPT = """
+var select = arguments[0];
+var wanted = arguments[1];
+if (!select.multiple) { return null; }
+
+function normalize(text) {
+    return text.replace(/[ \\t\\r\\n]+/g, " ").replace(/^ | $/g, "");
+}
+function matching(wanted, read) {
+    var found = [];
+    for (var j = 0; j < options.length; j++) {
+        if (read(options[j]) === wanted) { found.push(j); }
+    }
+    return found;
+}
+var options = select.options;
+var chosen = [];
+var missing = [];
+for (var i = 0; i < wanted.length; i++) {
+    var found = matching(wanted[i], function (option) { return option.value; });
+    if (!found.length) {
+        found = matching(wanted[i], function (option) { return normalize(option.textContent); });
+    }
+    if (!found.length) { missing.push(wanted[i]); }
+    for (var j = 0; j < found.length; j++) { chosen[found[j]] = true; }
+}
+if (missing.length) { return missing; }
+
+var changed = false;
+for (var j = 0; j < options.length; j++) {
+    if (options[j].selected !== !!chosen[j]) {
+        options[j].selected = !!chosen[j];
+        changed = true;
+    }
+}
+if (changed) {
+    var events = ["input", "change"];
+    for (var i = 0; i < events.length; i++) {
+        var event = document.createEvent("HTMLEvents");
+        event.initEvent(events[i], true, false);
+        select.dispatchEvent(event);
+    }
+}
+return [];
+"""
+
+
+def option_states(browser, select_box):
+    """ Gets the options directly in a select
+        Args:
+        browser: the WebDriver
+        select_box: the select element
+
+        Returns: a list of dicts with the "id", "name", "value", "text" and
+                 whether each option is "selected"
+    """
+    try:
+        return browser.execute_script(OPTION_STATES_SCRIPT, unwrap(select_box))
+    except WebDriverException:
+        # Browsers that can't run scripts are asked about each option
+        return [{"id": option.get_attribute('id'), "name": option.get_attribute('name'),
+                 "value": option.get_attribute('value'), "text": option.text, "selected": option.is_selected()}
+                for option in select_box.find_elements_by_xpath(str('./option'))]
 
 
-def wait_for_result(function, args, seconds):
-    start = time.time()
-    exception = None
-    while time.time() - start < float(seconds):
-        try:
-            return function(*args)
-        except Exception as ex:
-            exception = ex
-            time.sleep(0.2)
-    raise exception
+def contains_xpath(content):
+    """ The XPath of the innermost elements whose text contains content """
+    return str('//*[contains(normalize-space(.),"{content}") '
+               'and not(./*[contains(normalize-space(.),"{content}")])]'
+               .format(content=content))
+
 
-# This function is from lettuce-webdriver: 
+# This function is from lettuce-webdriver:
 # https://github.com/bbangert/lettuce_webdriver/blob/master/lettuce_webdriver/webdriver.py
 def contains_content(browser, content):
     # Search for an element that contains the whole of the text we're looking
     #  for in it or its subelements, but whose children do NOT contain that
     #  text - otherwise matches <body> or <html> or other similarly useless
     #  things.
-    for elem in browser.find_elements_by_xpath(str(
-            '//*[contains(normalize-space(.),"{content}") '
-            'and not(./*[contains(normalize-space(.),"{content}")])]'
-            .format(content=content))):
+    try:
+        found = browser.execute_script(CONTAINS_CONTENT_SCRIPT, content, SETTINGS["reuse_page_text"])
+        if type(found) == bool:
+            return found
+    except WebDriverException:
+        # Browsers that can't run scripts search with XPath, then ask about
+        # each element found
+        pass
+
+    for elem in browser.find_elements_by_xpath(contains_xpath(content)):
 
         try:
             if elem.is_displayed():
@@ -50,6 +218,7 @@ def contains_content(browser, content):
 
 @directive(r'load (?P<url>.+)')
 def load_url(browser, url):
+    ELEMENT_CACHE.invalidate(browser)
     browser.get(url)
 
 #Interaction
@@ -62,12 +231,14 @@ def type_into_element(browser, elem, keys):
 @directive(r'click (?P<elem>.+)')
 def click_element(browser, elem):
     find_element(browser, elem).click()
+    ELEMENT_CACHE.invalidate(browser)
 
 
 @directive(r'Follow link (?P<elem>.+)')
 def follow_link(browser, elem):
     element = find_element(browser, elem)
     destination = element.get_attribute("href")
+    ELEMENT_CACHE.invalidate(browser)
     browser.get(destination)
 
 
@@ -80,23 +251,45 @@ def wait(browser, seconds):
         # time elapsed
         time.sleep(0.2) 
 
+@directive(r'Wait until the page is idle(?: for (?P<quiet>\d+) ?ms)?(?: within (?P<seconds>\d+(\.\d+)?) seconds)?')
+def wait_until_idle(browser, quiet=None, seconds=None):
+    if quiet is None:
+        quiet = SETTINGS["idle_quiet_ms"]
+    if seconds is None:
+        seconds = SETTINGS["idle_timeout"]
+    state = wait_for_idle(browser, quiet, seconds)
+    assert state["idle"], "Page not idle after %s seconds (readyState %s, %s requests in flight)" % \
+        (seconds, state["readyState"], state["pending"])
+
 @directive(r'Check (?P<elem>.+)')
 def check_checkbox(browser, elem):
     element = find_element(browser, elem)
     if not element.is_selected():
         element.click()
+        ELEMENT_CACHE.invalidate(browser)
 
 @directive(r'Uncheck (?P<elem>.+)')
 def uncheck_checkbox(browser, elem):
     element = find_element(browser, elem)
     if element.is_selected():
         element.click()
+        ELEMENT_CACHE.invalidate(browser)
 
 @directive('Select \[(?P<list>.+)\] from (?P<elem>.+)')
 def select_multi_items(browser, list, elem):
+        from selenium.webdriver.support.ui import Select
+
         options = [unquote_variable(i.strip()) for i in list.split(",")]
         select_box = find_element(browser, elem)
 
+        try:
+            if browser.execute_script(SELECT_OPTIONS_SCRIPT, unwrap(select_box), options) == []:
+                return
+        except WebDriverException:
+            pass
+
+        # Selects that aren't multiple, options that can't be found and
+        # browsers that can't run scripts get the errors Select raises
         select = Select(select_box)
         select.deselect_all()
 
@@ -106,7 +299,7 @@ def select_multi_items(browser, list, elem):
             except NoSuchElementException:
                 select.select_by_visible_text(option)
 
-@directive('Select "(?P<value>.*?)" from (?P<select>.*?)')
+@directive('Select "(?P<value>.*?)" from (?P<select>.+)')
 def select_single_item(browser, select, value):
     option = None
     try:
@@ -115,12 +308,14 @@ def select_single_item(browser, select, value):
         option = find_element(browser,  "%s> option[value='%s']" % (select, value))
 
     option.click()
+    ELEMENT_CACHE.invalidate(browser)
 
 
 @directive('Choose radio with value "(?P<value>.+)"')
 def choose_radio(browser, value):
     radio = find_element(browser, ('css selector', 'input[type="radio"][value="%s"]' % value))
     radio.click()
+    ELEMENT_CACHE.invalidate(browser)
 
 
 #expect statements
@@ -131,26 +326,32 @@ def expect_content(browser, content):
 
 @directive(r'expect to see content (?P<content>.+) within (?P<seconds>\d+(\.\d+)?) seconds')
 def expect_content_within(browser, content, seconds):
-    wait_for_result(expect_content, [browser, content], seconds)
+    start = time.time()
+    wait_in_browser(browser, CONTAINS_CONTENT_SCRIPT, [content, SETTINGS["reuse_page_text"]], seconds)
+    wait_for_result(expect_content, [browser, content], remaining(start, seconds))
 
 
-@directive(r'expect exists (?P<elem>.+)')
+@directive(r'expect exists (?P<elem>.+)', script="return element(args.elem) !== null;")
 def expect_exists(browser, elem):
-    assert find_element(browser, elem) is not None, "Element does not exist."
+    assert find_element(browser, elem, cached=False) is not None, "Element does not exist."
 
 
 @directive(r'expect exists (?P<elem>.+) within (?P<seconds>\d+(\.\d+)?) seconds')
 def expect_exists_within(browser, elem, seconds):
-    return wait_for_result(expect_exists, [browser, elem], seconds)
+    start = time.time()
+    wait_for_element(browser, elem, seconds)
+    return wait_for_result(expect_exists, [browser, elem], remaining(start, seconds))
 
 
-@directive(r'Expect Page Title is "(?P<title>.+)"')
+@directive(r'Expect Page Title is "(?P<title>.+)"', script="return window.top.document.title === args.title;")
 def expect_page_title(browser, title):
     assert browser.title == title, "Title was '%s'" % browser.title
 
 @directive(r'Expect Page Title is "(?P<title>.+)" within (?P<seconds>\d+(\.\d+)?) seconds')
 def expect_page_title_within(browser, title, seconds):
-    return wait_for_result(expect_page_title, [browser, title], seconds)
+    start = time.time()
+    wait_in_browser(browser, "return document.title === arguments[0];", [title], seconds)
+    return wait_for_result(expect_page_title, [browser, title], remaining(start, seconds))
 
 
 @directive(r'Expect (?P<elem>.+) contains "(?P<regexp>.+)"')
@@ -166,26 +367,39 @@ def expect_elem_match_regexp_within(browser, elem, regexp, seconds):
 def expect_elem_should_not_match_regexp(browser, elem, regexp):
     assert re.search(regexp, find_element(browser, elem).text) is None, "Value was in element."
 
-@directive(r'Expect (?P<elem>.+) does not contain "(?P<regexp>.+) within (?P<seconds>\d+(\.\d+)?) seconds')
+@directive(r'Expect (?P<elem>.+) does not contain "(?P<regexp>.+)" within (?P<seconds>\d+(\.\d+)?) seconds')
 def expect_elem_should_not_match_regexp_within(browser, elem, regexp, seconds):
-    return wait_for_result(expect_elem_should_not_match_regexp, [browser, regexp, elem], seconds)
+    return wait_for_result(expect_elem_should_not_match_regexp, [browser, elem, regexp], seconds)
 
 
-@directive(r'Expect (?P<elem>.+) to not exist', throws=NoSuchElementException)
+@directive(r'Expect (?P<elem>.+) to not exist', throws=NoSuchElementException,
+           script="return element(args.elem) === null;")
 def expect_not_exist(browser, elem):
-    return find_element(browser, elem) is None
+    return find_element(browser, elem, cached=False) is None
 
 
 @directive(r'Expect (?P<elem>.+) to not exist within (?P<seconds>\d+(\.\d+)?) seconds', throws=NoSuchElementException)
 def expect_not_exist_within(browser, elem, seconds):
-    return wait_for_result(expect_not_exist, [browser, elem], seconds)
+    def absent():
+        # Passes the wait by finding nothing, then raises that for the decorator
+        try:
+            find_element(browser, elem, cached=False)
+        except NoSuchElementException as ex:
+            return ex
+        raise AssertionError("Element exists.")
+
+    start = time.time()
+    wait_for_element(browser, elem, seconds, present=False)
+    raise wait_for_result(absent, [], remaining(start, seconds))
 
 
-@directive(r'Expect (?P<elem>.+) is selected')
+@directive(r'Expect (?P<elem>.+) is selected',
+           script="var el = element(args.elem); return el !== null && !!(el.checked || el.selected);")
 def expect_checkbox_selected(browser, elem):
     assert find_element(browser, elem).is_selected(), "Element is not selected"
 
-@directive(r'Expect (?P<elem>.+) is not selected')
+@directive(r'Expect (?P<elem>.+) is not selected',
+           script="var el = element(args.elem); return el !== null && !(el.checked || el.selected);")
 def expect_checkbox_not_selected(browser, elem):
     assert not find_element(browser, elem).is_selected(), "Element is not selected"
 
@@ -199,27 +413,32 @@ def expect_link_with_url_and_text(browser, url, text):
     assert browser.find_element_by_xpath(str('//a[@href="%s"][contains(., %s)]' % (url, text))) is not None, "No link found"
 
 
-@directive(r'Expect url to be "(?P<url>.+)"')
+@directive(r'Expect url to be "(?P<url>.+)"', script="return window.top.location.href === args.url;")
 def expect_browser_url_to_be(browser, url):
     assert browser.current_url == url, "URL was %s" % browser.current_url
 
 
 @directive(r'Expect url to be "(?P<url>.+)" within (?P<seconds>\d+(\.\d+)?) seconds')
 def eexpect_browser_url_to_be_within(browser, url, seconds):
-    return wait_for_result(expect_browser_url_to_be, [browser, url], seconds)
+    start = time.time()
+    wait_in_browser(browser, "return window.location.href === arguments[0];", [url], seconds)
+    return wait_for_result(expect_browser_url_to_be, [browser, url], remaining(start, seconds))
 
 
-@directive(r'Expect url to contain "(?P<url>.+)')
+@directive(r'Expect url to contain "(?P<url>.+)"', script="return window.top.location.href.indexOf(args.url) !== -1;")
 def expect_browser_url_to_contain(browser, url):
     assert url in browser.current_url, "URL was %s" % browser.current_url
 
 
-@directive(r'Expect url to contain "(?P<url>.+) within (?P<seconds>\d+(\.\d+)?) seconds')
+@directive(r'Expect url to contain "(?P<url>.+)" within (?P<seconds>\d+(\.\d+)?) seconds')
 def expect_browser_url_to_contain_within(browser, url, seconds):
-    return wait_for_result(expect_browser_url_to_contain, [browser, url], seconds)
+    start = time.time()
+    wait_in_browser(browser, "return window.location.href.indexOf(arguments[0]) !== -1;", [url], seconds)
+    return wait_for_result(expect_browser_url_to_contain, [browser, url], remaining(start, seconds))
 
 
-@directive(r'Expect (?P<elem>.+) to have a value equal to "(?P<value>.+)"')
+@directive(r'Expect (?P<elem>.+) to have a value equal to "(?P<value>.+)"',
+           script="var el = element(args.elem); return el !== null && el.value === args.value;")
 def expect_element_to_have_value(browser, elem, value):
     element = find_element(browser, elem)
     assert element.get_attribute("value") == value, "Value was %s " % element.get_attribute("value")
@@ -255,31 +474,30 @@ def assert_single_selected(browser, select, value):
 def assert_multi_selected(browser, select, list):
         options = list.split(',')
         select_box = find_element(browser, select)
-        option_elems = select_box.find_elements_by_xpath(str('./option'))
-        for option in option_elems:
-            if option.get_attribute('id') in options or \
-               option.get_attribute('name') in options or \
-               option.get_attribute('value') in options or \
-               option.text in options:
-                assert option.is_selected(), "Option %s was not selected" % option
+        for option in option_states(browser, select_box):
+            if option["id"] in options or \
+               option["name"] in options or \
+               option["value"] in options or \
+               option["text"] in options:
+                assert option["selected"], "Option %s was not selected" % option["text"]
             else:
-                assert not option.is_selected(), "Option %s was selected" % option
+                assert not option["selected"], "Option %s was selected" % option["text"]
 
 
 @directive(r'Expect option "(?P<value>.+)" in selector (?P<select>.+)')
 def select_contains(browser, select, value):
     try:
-        option = find_element(browser, "select[name='%s'] > option[value='%s']" % (select, value))
+        option = find_element(browser, "select[name='%s'] > option[value='%s']" % (select, value), cached=False)
     except NoSuchElementException:
-        option = find_element(browser, "select[id='%s'] > option[value='%s']" % (select, value))
+        option = find_element(browser, "select[id='%s'] > option[value='%s']" % (select, value), cached=False)
     assert option is not None, "Could not find option"
 
 @directive(r'Expect option "(?P<value>.+)" not in selector (?P<select>.+)', throws=NoSuchElementException)
 def select_does_not_contain(browser, select, value):
     try:
-        option = find_element(browser, "select[name='%s'] > option[value='%s']" % (select, value))
+        option = find_element(browser, "select[name='%s'] > option[value='%s']" % (select, value), cached=False)
     except NoSuchElementException:
-        option = find_element(browser, "select[id='%s'] > option[value='%s']" % (select, value))
+        option = find_element(browser, "select[id='%s'] > option[value='%s']" % (select, value), cached=False)
     assert option is None, "Found option"
 
 
@@ -297,6 +515,8 @@ def assert_radio_not_selected(browser, value):
 
 @directive('Accept the alert')
 def accept_alert(browser):
+    from selenium.webdriver.common.alert import Alert
+
     try:
         alert = Alert(browser)
         alert.accept()
@@ -306,6 +526,8 @@ def accept_alert(browser):
 
 @directive('Dismiss the alert')
 def dismiss_alert(browser):
+    from selenium.webdriver.common.alert import Alert
+
     try:
         alert = Alert(browser)
         alert.dismiss()
@@ -315,6 +537,8 @@ def dismiss_alert(browser):
 
 @directive(r'Expect an alert with text "(?P<text>.+)"')
 def expect_alert(browser, text):
+    from selenium.webdriver.common.alert import Alert
+
     try:
         alert = Alert(browser)
         assert alert.text == text, "Alert text is %s" % alert.text
@@ -324,6 +548,8 @@ def expect_alert(browser, text):
 
 @directive('Expect no alert displayed')
 def expect_no_alert(browser):
+    from selenium.webdriver.common.alert import Alert
+
     try:
         alert = Alert(browser) 
         assert alert is None, "Alert '%s' shown." % alert.text
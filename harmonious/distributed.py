@@ -0,0 +1,304 @@
+""" Distributed test plan execution
+
+A coordinator owns the parsed test plans and hands their tasks out, one
+at a time and in dependency order, to worker processes that connect to
+it over a TCP or Unix socket. Workers run each task in a browser of
+their own and stream its results and output callbacks back; the
+coordinator replays the output and collects the results. A task whose
+worker disconnects or stops sending heartbeats is handed to another
+worker, up to MAX_ATTEMPTS times; after that it fails with a
+::class::WorkerError. The run stops with a ::class::WorkerError if no
+worker is connected for WORKER_TIMEOUT seconds.
+
+Connections are authenticated with a shared key, which is required:
+test plans and results are sent pickled, so only trusted workers may
+connect.
+
+"""
+import time
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from harmonious.core import Result, FAILURES
+from harmonious.registries import CALLBACK_REGISTRY, TASK_REGISTRY
+from harmonious.settings import SETTINGS
+from harmonious.scheduler import SuiteScheduler
+from harmonious.workers import make_portable
+from harmonious.exceptions import WorkerError
+
+# Seconds between the heartbeats a busy worker sends
+HEARTBEAT_INTERVAL = 5
+# Seconds without hearing from a busy worker before its task is reassigned
+HEARTBEAT_TIMEOUT = 30
+# Times a task is handed out before it is failed, so a task that crashes its worker can't take them all down
+MAX_ATTEMPTS = 3
+# Seconds the coordinator waits while no worker is connected before giving up
+WORKER_TIMEOUT = 120
+
+
+def parse_address(address):
+    """ Parses a coordinator address given on the commandline
+        Args:
+        address: "host:port" for a TCP socket, otherwise the path of a Unix socket
+
+        Returns: an address for ::mod::multiprocessing.connection
+    """
+    (host, _, port) = address.rpartition(":")
+    if host and port.isdigit():
+        return (host, int(port))
+    return address
+
+
+def connect(address, authkey, timeout=30):
+    """ Connects to a coordinator, retrying until it is listening
+        Args:
+        address: the coordinator's address
+        authkey: the shared authentication key
+        timeout: (optional) seconds to keep retrying for
+
+        Returns: the ::class::Connection
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except (IOError, OSError):
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+class Coordinator(object):
+    """ Hands the tasks of test plans out to connecting workers and collects their results.
+
+        Args:
+        test_plans: the test plans to run
+        address: the address to listen on
+        authkey: the key workers must authenticate with
+        heartbeat_timeout: (optional) seconds of silence after which a worker is considered dead
+        max_attempts: (optional) times a task is handed out before it is failed
+        worker_timeout: (optional) seconds without any connected worker before the run stops
+
+        Attributes:
+        address: the address being listened on, with any port 0 resolved
+        results: the result of each test plan, in the same order
+    """
+    def __init__(self, test_plans, address, authkey, heartbeat_timeout=HEARTBEAT_TIMEOUT,
+                 max_attempts=MAX_ATTEMPTS, worker_timeout=WORKER_TIMEOUT):
+        self.test_plans = test_plans
+        self.authkey = authkey
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.worker_timeout = worker_timeout
+        self.attempts = {}
+        self.connected = 0
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.results = [Result(test_plan.name) for test_plan in test_plans]
+        self.schedule = SuiteScheduler(test_plans, self.results)
+        self.condition = threading.Condition()
+        self.closing = False
+
+    def run(self):
+        """ Runs the test plans on whichever workers connect, calling the registered callbacks along the way
+            Returns: the results of the test plans, in the same order
+            Raises: ::class::WorkerError if no worker is connected for worker_timeout seconds
+        """
+        from harmonious import LOADED_OUTPUT, load_output
+        if not LOADED_OUTPUT:
+            load_output()
+
+        FAILURES.reset()
+        CALLBACK_REGISTRY.run_all(type="all", callback="before")
+        CALLBACK_REGISTRY.run_all(type="all", callback="before_output")
+
+        accepting = threading.Thread(target=self.accept, name="coordinator")
+        accepting.daemon = True
+        accepting.start()
+        try:
+            with self.condition:
+                self.schedule.start()
+                unattended = time.time()
+                while not self.schedule.finished():
+                    self.condition.wait(0.5)
+                    if self.connected:
+                        unattended = time.time()
+                    elif time.time() - unattended > self.worker_timeout:
+                        raise WorkerError("No worker connected for %d seconds" % self.worker_timeout)
+        finally:
+            self.close()
+
+        CALLBACK_REGISTRY.run_all(type="all", callback="after", results=self.results)
+        CALLBACK_REGISTRY.run_all(type="all", callback="after_output", results=self.results)
+        return self.results
+
+    def close(self):
+        """ Stops accepting workers """
+        self.closing = True
+        try:
+            # Wake the accepting thread up, as closing the listener doesn't
+            Client(self.address, authkey=self.authkey).close()
+        except Exception:
+            pass
+        self.listener.close()
+
+    def accept(self):
+        """ Accepts workers until closed, serving each on its own thread """
+        while not self.closing:
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError:
+                continue
+            except (IOError, OSError, EOFError):
+                if self.closing:
+                    break
+                continue
+            if self.closing:
+                connection.close()
+                break
+            with self.condition:
+                self.connected += 1
+            thread = threading.Thread(target=self.serve, args=(connection,), name="coordinator-worker")
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, connection):
+        """ Hands tasks to one worker until every test plan is complete or the worker is lost """
+        item = None
+        try:
+            connection.send(("hello", self.test_plans, dict(TASK_REGISTRY), dict(SETTINGS)))
+            while True:
+                with self.condition:
+                    while not self.schedule.finished():
+                        item = self.schedule.take()
+                        if item is not None:
+                            break
+                        self.condition.wait(0.5)
+                if item is None:
+                    connection.send(("stop",))
+                    return
+
+                # Workers count failures too, but only their own
+                connection.send(("run",) + item + (FAILURES.count,))
+                results = self.receive(connection)
+                if any(result.failed() for result in results.itervalues()):
+                    FAILURES.add()
+
+                with self.condition:
+                    self.schedule.done(item, results)
+                    item = None
+                    self.condition.notify_all()
+        except Exception as ex:
+            # The worker is gone, or can't be understood; give its task to another one
+            if item is not None:
+                self.lost(item, ex)
+        finally:
+            connection.close()
+            with self.condition:
+                self.connected -= 1
+                self.condition.notify_all()
+
+    def lost(self, item, ex):
+        """ Hands a task whose worker was lost to another worker, or fails it
+            once it has been handed out max_attempts times
+            Args:
+            item: the (test plan index, task name) tuple of the task
+            ex: the exception the worker was lost with
+        """
+        with self.condition:
+            self.attempts[item] = self.attempts.get(item, 0) + 1
+            if self.attempts[item] < self.max_attempts:
+                self.schedule.requeue(item)
+            else:
+                task_name = item[1]
+                result = Result(task_name)
+                result.exception = WorkerError("Task was lost with its worker %d times, last by %s: %s" %
+                                               (self.attempts[item], type(ex).__name__, ex))
+                FAILURES.add()
+                self.schedule.done(item, {task_name: result})
+            self.condition.notify_all()
+
+    def receive(self, connection):
+        """ Replays a worker's output callbacks until it reports the task done
+            Returns: a map of task name to ::class::Result for the task and its execute prerequisites
+        """
+        while True:
+            if not connection.poll(self.heartbeat_timeout):
+                raise WorkerError("Worker stopped responding")
+            message = connection.recv()
+            if message[0] == "done":
+                return message[1]
+            elif message[0] == "callback":
+                (_, type, callback, kwargs) = message
+                CALLBACK_REGISTRY.run_all(type=type, callback=callback, **kwargs)
+
+
+def run_worker(address, authkey, path=None):
+    """ Connects to a coordinator and runs the tasks it hands out until told to stop
+        Args:
+        address: the coordinator's address
+        authkey: the shared authentication key
+        path: (optional) the test plan folder whose environment script to load
+    """
+    if path is not None:
+        from harmonious.loader import load_environment
+        load_environment(path)
+
+    connection = connect(address, authkey)
+    (_, test_plans, tasks, settings) = connection.recv()
+    TASK_REGISTRY.update(tasks)
+    SETTINGS.update(settings)
+
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def send(*message):
+        with lock:
+            connection.send(message)
+
+    def forward(type, callback, kwargs):
+        if "result" in kwargs:
+            make_portable(kwargs["result"])
+        send("callback", type, callback, kwargs)
+
+    def heartbeat():
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                send("heartbeat",)
+            except (IOError, OSError):
+                return
+
+    CALLBACK_REGISTRY.forward = forward
+    beating = threading.Thread(target=heartbeat, name="heartbeat")
+    beating.daemon = True
+    beating.start()
+
+    sessions = {}
+    try:
+        while True:
+            message = connection.recv()
+            if message[0] == "stop":
+                break
+            (_, index, task_name, failures) = message
+            FAILURES.set(failures)
+            test_plan = test_plans[index]
+            if index not in sessions:
+                sessions[index] = test_plan.browser_session()
+            results = Result(test_plan.name)
+            try:
+                test_plan.run_task(task_name, sessions[index], results)
+            except Exception as ex:
+                results[task_name] = Result(task_name)
+                results[task_name].exception = ex
+            make_portable(results)
+            send("done", dict(results))
+    except EOFError:
+        # The coordinator went away
+        pass
+    finally:
+        stopped.set()
+        CALLBACK_REGISTRY.forward = None
+        for session in sessions.itervalues():
+            session.close()
+        connection.close()
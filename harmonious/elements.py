@@ -0,0 +1,163 @@
+""" Element cache
+
+With the element_cache setting, the elements directives find are kept by
+browser and locator, so that directives in a row that act on the same
+element only ask the browser to find it once. The cache is emptied when
+a directive navigates or clicks (which can submit a form or follow a
+link, leaving the page, or change which element a locator finds). An
+element that has gone stale since it was found (the page changed it, or
+navigated without a directive knowing) is found again and the operation
+retried, so directives never see the cached handle.
+
+Checks for whether an element exists always ask the browser. Cached
+elements refer to their browser, so the browser sessions empty the cache
+of a browser once they are done with it.
+
+"""
+import threading
+import weakref
+
+from selenium.common.exceptions import StaleElementReferenceException
+
+from harmonious.settings import SETTINGS
+
+
+def locate(browser, locator):
+    """ Asks the browser for an element
+        Args:
+        browser: the WebDriver
+        locator: a CSS selector, or a (by, value) tuple
+
+        Raises: NoSuchElementException if there's no such element
+    """
+    if type(locator) == tuple:
+        return browser.find_element(by=locator[0], value=locator[1])
+    else:
+        return browser.find_element(by="css selector", value=locator)
+
+
+class CachedElement(object):
+    """ Stands in for a cached WebElement, finding it again if it has gone stale
+
+        Args:
+        cache: the ::class::ElementCache it was found through
+        browser: the WebDriver it was found in
+        locator: the locator it was found by
+        element: the WebElement
+    """
+    def __init__(self, cache, browser, locator, element):
+        self._cache = cache
+        self._browser = browser
+        self._locator = locator
+        self._element = element
+
+    def _refind(self):
+        self._cache.forget(self._browser, self._locator)
+        self._element = locate(self._browser, self._locator)
+        self._cache.remember(self._browser, self._locator, self)
+
+    def __getattr__(self, name):
+        try:
+            value = getattr(self._element, name)
+        except StaleElementReferenceException:
+            # Properties like text ask the browser as soon as they are read
+            self._refind()
+            value = getattr(self._element, name)
+        if not callable(value):
+            return value
+
+        def retried(*args, **kwargs):
+            try:
+                return getattr(self._element, name)(*args, **kwargs)
+            except StaleElementReferenceException:
+                self._refind()
+                return getattr(self._element, name)(*args, **kwargs)
+        return retried
+
+    def __eq__(self, other):
+        if isinstance(other, CachedElement):
+            other = other._element
+        return self._element == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._element)
+
+
+def unwrap(element):
+    """ Gets the WebElement behind what find_element returned, to pass to a script """
+    if isinstance(element, CachedElement):
+        return element._element
+    return element
+
+
+class ElementCache(object):
+    """ Elements by browser and locator
+
+        Attributes:
+        hits: how many times an element was found in the cache
+        misses: how many times the browser had to be asked for an element
+    """
+    def __init__(self):
+        self.elements = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def find(self, browser, locator):
+        """ Finds an element, through the cache
+            Args:
+            browser: the WebDriver
+            locator: a CSS selector, or a (by, value) tuple
+
+            Returns: a ::class::CachedElement
+            Raises: NoSuchElementException if there's no such element
+        """
+        with self.lock:
+            element = self.elements.get(browser, {}).get(locator)
+            if element is not None:
+                self.hits += 1
+                return element
+            self.misses += 1
+        element = CachedElement(self, browser, locator, locate(browser, locator))
+        self.remember(browser, locator, element)
+        return element
+
+    def remember(self, browser, locator, element):
+        with self.lock:
+            self.elements.setdefault(browser, {})[locator] = element
+
+    def forget(self, browser, locator):
+        with self.lock:
+            self.elements.get(browser, {}).pop(locator, None)
+
+    def invalidate(self, browser):
+        """ Forgets the elements of a browser, once it has left the page they were on """
+        with self.lock:
+            self.elements.pop(browser, None)
+
+    def clear(self):
+        """ Forgets every element and resets the counters """
+        with self.lock:
+            self.elements.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+ELEMENT_CACHE = ElementCache()
+
+
+def find_element(browser, locator, cached=True):
+    """ Finds an element, through ELEMENT_CACHE when the element_cache setting is on
+        Args:
+        browser: the WebDriver
+        locator: a CSS selector, or a (by, value) tuple
+        cached: (optional) whether the cache may be used; existence checks pass False
+
+        Raises: NoSuchElementException if there's no such element
+    """
+    if cached and SETTINGS["element_cache"] and type(locator) in (str, unicode, tuple):
+        return ELEMENT_CACHE.find(browser, locator)
+    return locate(browser, locator)
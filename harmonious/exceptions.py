@@ -12,3 +12,23 @@ class StepReturnedFalseError(Exception):
 
 class DirectionUsesReservedWordError(Exception):
     pass
+
+
+class UnknownDirectiveError(Exception):
+    pass
+
+
+class DependencyCycleError(Exception):
+    pass
+
+
+class WorkerError(Exception):
+    pass
+
+
+class InvalidEnvironmentError(Exception):
+    pass
+
+
+class InvalidSettingError(Exception):
+    pass
@@ -0,0 +1,988 @@
+""" Fake browser
+
+An in-process stand-in for a WebDriver, for running test plans without
+launching a browser: to test the engine, or to measure its overhead. Use
+it with "environment: fake".
+
+It loads static HTML from file:// URLs (and from FAKE_PAGES, for pages
+that aren't files), and implements the part of the WebDriver API the
+directives use: finding elements by id, name, class, tag, link text, a
+subset of CSS (compound selectors joined by descendant, >, + and ~) and a
+subset of XPath (paths with predicates, comparisons, and, or and the
+contains, starts-with, normalize-space, not, string, concat, count,
+position and last functions), reading their text and attributes, typing,
+and clicking checkboxes, radio buttons, options and links.
+
+It doesn't run JavaScript. execute_script raises WebDriverException, so
+directives take the paths they take for browsers that can't run scripts.
+Alerts don't open by themselves; set the alert attribute to open one.
+
+"""
+import re
+import urllib
+import urlparse
+from HTMLParser import HTMLParser
+from htmlentitydefs import name2codepoint
+
+from selenium.common.exceptions import NoSuchElementException, NoAlertPresentException, WebDriverException
+from selenium.common.exceptions import StaleElementReferenceException, ElementNotVisibleException
+from selenium.common.exceptions import InvalidSelectorException
+
+# Pages to serve by URL, as HTML strings
+FAKE_PAGES = {}
+
+VOID_ELEMENTS = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+                           "param", "source", "track", "wbr"])
+
+# Elements whose start tag closes an open element of one of these kinds
+IMPLIED_ENDS = {
+    "option": ("option",),
+    "li": ("li",),
+    "p": ("p",),
+    "tr": ("tr", "td", "th"),
+    "td": ("td", "th"),
+    "th": ("td", "th"),
+}
+
+# Elements whose content is never shown
+UNRENDERED = frozenset(["head", "script", "style", "title", "template", "noscript"])
+
+# Elements whose text starts on a new line
+BLOCK_ELEMENTS = frozenset(["address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "fieldset",
+                            "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr",
+                            "li", "main", "nav", "ol", "option", "p", "pre", "section", "table", "tr", "ul"])
+
+BOOLEAN_ATTRIBUTES = frozenset(["multiple", "disabled", "readonly", "required", "autofocus", "hidden"])
+
+WHITESPACE = re.compile(r"[ \t\r\n]+")
+
+
+def normalize_space(text):
+    return WHITESPACE.sub(" ", text).strip(" ")
+
+
+class Text(object):
+    """ A text node """
+    def __init__(self, data, parent):
+        self.data = data
+        self.parent = parent
+        self.order = 0
+
+    def string_value(self):
+        return self.data
+
+
+class Attribute(object):
+    """ An attribute, as XPath selects it """
+    def __init__(self, name, value, parent):
+        self.name = name
+        self.value = value
+        self.parent = parent
+        self.order = parent.order
+
+    def string_value(self):
+        return self.value
+
+
+class Node(object):
+    """ An element of a parsed page, or the document itself (tag "#document")
+
+        Attributes:
+        tag: the lower case tag name
+        attributes: a map of attribute names to values
+        parent: the parent node, None for the document
+        children: the child elements and ::class::Text nodes
+        order: the position of the node in the document
+        value, checked, selected: the state of form controls
+    """
+    def __init__(self, tag, attributes, parent):
+        self.tag = tag
+        self.attributes = attributes
+        self.parent = parent
+        self.children = []
+        self.order = 0
+        self.value = None
+        self.checked = "checked" in attributes
+        self.selected = "selected" in attributes
+
+    def elements(self):
+        return [child for child in self.children if isinstance(child, Node)]
+
+    def descendants(self):
+        """ A generator over the elements below this one, in document order """
+        for child in self.children:
+            if isinstance(child, Node):
+                yield child
+                for descendant in child.descendants():
+                    yield descendant
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None and node.tag != "#document":
+            yield node
+            node = node.parent
+
+    def string_value(self):
+        return u"".join(child.string_value() for child in self.children)
+
+    def classes(self):
+        return self.attributes.get("class", "").split()
+
+    def hidden(self):
+        """ Whether this element itself hides its content """
+        style = self.attributes.get("style", "").replace(" ", "").lower()
+        return (self.tag in UNRENDERED or "hidden" in self.attributes
+                or "display:none" in style or "visibility:hidden" in style
+                or (self.tag == "input" and self.attributes.get("type", "").lower() == "hidden"))
+
+    def displayed(self):
+        return not self.hidden() and not any(ancestor.hidden() for ancestor in self.ancestors())
+
+    def form_type(self):
+        return self.attributes.get("type", "text").lower() if self.tag == "input" else None
+
+    def select(self):
+        """ The select an option belongs to, if any """
+        for ancestor in self.ancestors():
+            if ancestor.tag == "select":
+                return ancestor
+        return None
+
+
+class DocumentParser(HTMLParser):
+    """ Parses HTML into a tree of ::class::Node objects, forgiving missing end tags """
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.document = Node("#document", {}, None)
+        self.current = self.document
+
+    def handle_starttag(self, tag, attrs):
+        node = self.open(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.open(tag, attrs)
+
+    def open(self, tag, attrs):
+        if tag in IMPLIED_ENDS:
+            for node in [self.current] + list(self.current.ancestors()):
+                if node.tag in IMPLIED_ENDS[tag]:
+                    self.current = node.parent
+                    break
+                if node.tag in ("table", "select", "ul", "ol", "body"):
+                    break
+        node = Node(tag, dict((name, value if value is not None else "") for (name, value) in attrs), self.current)
+        self.current.children.append(node)
+        return node
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        for node in [self.current] + list(self.current.ancestors()):
+            if node.tag == tag:
+                self.current = node.parent
+                return
+
+    def handle_data(self, data):
+        self.current.children.append(Text(data, self.current))
+
+    def handle_entityref(self, name):
+        if name in name2codepoint:
+            self.handle_data(unichr(name2codepoint[name]))
+        else:
+            self.handle_data(u"&%s;" % name)
+
+    def handle_charref(self, name):
+        if name.lower().startswith("x"):
+            self.handle_data(unichr(int(name[1:], 16)))
+        else:
+            self.handle_data(unichr(int(name)))
+
+
+def parse_html(html):
+    """ Parses a page
+        Returns: the document ::class::Node, with form controls in their initial state
+    """
+    parser = DocumentParser()
+    if isinstance(html, str):
+        html = html.decode("utf-8", "replace")
+    parser.feed(html)
+    parser.close()
+    document = parser.document
+
+    order = 1
+    for node in document.descendants():
+        node.order = order
+        order += 1
+        for child in node.children:
+            if isinstance(child, Text):
+                child.order = order
+                order += 1
+        if node.tag == "textarea":
+            node.value = node.string_value()
+        elif node.tag == "option":
+            node.value = node.attributes.get("value", normalize_space(node.string_value()))
+        elif node.tag == "input":
+            node.value = node.attributes.get("value", "on" if node.form_type() in ("checkbox", "radio") else "")
+    for select in (node for node in document.descendants() if node.tag == "select"):
+        options = [node for node in select.descendants() if node.tag == "option"]
+        if options and "multiple" not in select.attributes and not any(option.selected for option in options):
+            # A single select always has an option selected
+            options[0].selected = True
+    return document
+
+
+# CSS selectors
+
+CSS_TOKEN = re.compile(r"""
+      \s*(?P<combinator>[>+~])\s*
+    | (?P<space>\s+)
+    | (?P<tag>[\w-]+|\*)
+    | \#(?P<id>[\w-]+)
+    | \.(?P<class>[\w-]+)
+    | \[\s*(?P<attribute>[\w-]+)\s*(?:(?P<operator>[~^$*|]?=)\s*(?:"(?P<double>[^"]*)"|'(?P<single>[^']*)'|(?P<bare>[^\]\s]+)))?\s*\]
+    | :(?P<pseudo>first-child|last-child|checked|disabled|enabled)
+""", re.VERBOSE)
+
+
+def split_selector_group(selector):
+    """ Splits a selector group on the commas outside brackets and quotes """
+    (parts, depth, quote, start) = ([], 0, None, 0)
+    for (index, char) in enumerate(selector):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(selector[start:index])
+            start = index + 1
+    parts.append(selector[start:])
+    return parts
+
+
+def parse_css(selector):
+    """ Parses a CSS selector (without commas)
+        Returns: a list of (combinator, compound) pairs, the first combinator None;
+                 each compound is a list of (kind, ...) tests
+        Raises: InvalidSelectorException for selectors outside the subset
+    """
+    selector = selector.strip()
+    (parts, compound, combinator, position) = ([], [], None, 0)
+    while position < len(selector):
+        match = CSS_TOKEN.match(selector, position)
+        if match is None or match.end() == position:
+            raise InvalidSelectorException("The fake browser doesn't understand the selector '%s'" % selector)
+        position = match.end()
+        groups = match.groupdict()
+        if groups["combinator"] or groups["space"]:
+            if not compound:
+                raise InvalidSelectorException("The fake browser doesn't understand the selector '%s'" % selector)
+            parts.append((combinator, compound))
+            (compound, combinator) = ([], groups["combinator"] or " ")
+        elif groups["tag"]:
+            compound.append(("tag", groups["tag"].lower()))
+        elif groups["id"]:
+            compound.append(("attribute", "id", "=", groups["id"]))
+        elif groups["class"]:
+            compound.append(("attribute", "class", "~=", groups["class"]))
+        elif groups["attribute"]:
+            value = [groups[name] for name in ("double", "single", "bare") if groups[name] is not None]
+            compound.append(("attribute", groups["attribute"].lower(), groups["operator"], value[0] if value else None))
+        else:
+            compound.append(("pseudo", groups["pseudo"]))
+    if not compound:
+        raise InvalidSelectorException("The fake browser doesn't understand the selector '%s'" % selector)
+    parts.append((combinator, compound))
+    return parts
+
+
+def attribute_matches(node, name, operator, expected):
+    if name not in node.attributes:
+        return False
+    actual = node.attributes[name]
+    if operator is None:
+        return True
+    if operator == "=":
+        return actual == expected
+    if operator == "~=":
+        return expected in actual.split()
+    if operator == "^=":
+        return bool(expected) and actual.startswith(expected)
+    if operator == "$=":
+        return bool(expected) and actual.endswith(expected)
+    if operator == "*=":
+        return bool(expected) and expected in actual
+    return actual == expected or actual.startswith(expected + "-")
+
+
+def compound_matches(node, compound):
+    for test in compound:
+        if test[0] == "tag":
+            if test[1] != "*" and node.tag != test[1]:
+                return False
+        elif test[0] == "attribute":
+            if not attribute_matches(node, *test[1:]):
+                return False
+        else:
+            siblings = node.parent.elements()
+            if test[1] == "first-child" and siblings[0] is not node:
+                return False
+            if test[1] == "last-child" and siblings[-1] is not node:
+                return False
+            if test[1] == "checked" and not (node.checked if node.tag == "input" else node.selected):
+                return False
+            if test[1] == "disabled" and "disabled" not in node.attributes:
+                return False
+            if test[1] == "enabled" and "disabled" in node.attributes:
+                return False
+    return True
+
+
+def css_matches(node, parts, index=None):
+    """ Whether a node matches parts[:index + 1] of a parsed selector, matching right to left """
+    if index is None:
+        index = len(parts) - 1
+    (combinator, compound) = parts[index]
+    if not compound_matches(node, compound):
+        return False
+    if index == 0:
+        return True
+    if combinator == ">":
+        return node.parent is not None and node.parent.tag != "#document" and css_matches(node.parent, parts, index - 1)
+    if combinator == " ":
+        return any(css_matches(ancestor, parts, index - 1) for ancestor in node.ancestors())
+    siblings = node.parent.elements()
+    earlier = siblings[:siblings.index(node)]
+    if combinator == "+":
+        return bool(earlier) and css_matches(earlier[-1], parts, index - 1)
+    return any(css_matches(sibling, parts, index - 1) for sibling in earlier)
+
+
+def select_css(context, selector):
+    """ Finds the elements below context that match a CSS selector, in document order """
+    groups = [parse_css(part) for part in split_selector_group(selector)]
+    return [node for node in context.descendants() if any(css_matches(node, parts) for parts in groups)]
+
+
+# XPath
+
+XPATH_TOKEN = re.compile(r"""\s*(?:
+      (?P<operator>//|/|\.\.|\.|@|\*|\(|\)|\[|\]|,|!=|<=|>=|=|<|>|\|)
+    | "(?P<double>[^"]*)"
+    | '(?P<single>[^']*)'
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<name>[A-Za-z_][\w-]*)
+    )""", re.VERBOSE)
+
+XPATH_FUNCTIONS = frozenset(["contains", "starts-with", "normalize-space", "not", "string", "concat",
+                             "count", "position", "last", "true", "false"])
+
+
+def tokenize_xpath(expression):
+    (tokens, position) = ([], 0)
+    expression = expression.strip()
+    while position < len(expression):
+        match = XPATH_TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise InvalidSelectorException("The fake browser doesn't understand the XPath '%s'" % expression)
+        position = match.end()
+        groups = match.groupdict()
+        if groups["operator"] is not None:
+            tokens.append(("operator", groups["operator"]))
+        elif groups["double"] is not None or groups["single"] is not None:
+            tokens.append(("literal", groups["double"] if groups["double"] is not None else groups["single"]))
+        elif groups["number"] is not None:
+            tokens.append(("number", float(groups["number"])))
+        else:
+            tokens.append(("name", groups["name"]))
+    return tokens
+
+
+class XPathParser(object):
+    """ Parses the XPath subset into nested tuples for ::func::evaluate """
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = tokenize_xpath(expression)
+        self.position = 0
+
+    def parse(self):
+        tree = self.union()
+        if self.position != len(self.tokens):
+            self.fail()
+        return tree
+
+    def fail(self):
+        raise InvalidSelectorException("The fake browser doesn't understand the XPath '%s'" % self.expression)
+
+    def peek(self, offset=0):
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return (None, None)
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return token
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            self.fail()
+        return token
+
+    def union(self):
+        tree = self.disjunction()
+        while self.accept("operator", "|"):
+            tree = ("union", tree, self.disjunction())
+        return tree
+
+    def disjunction(self):
+        tree = self.conjunction()
+        while self.accept("name", "or"):
+            tree = ("or", tree, self.conjunction())
+        return tree
+
+    def conjunction(self):
+        tree = self.comparison()
+        while self.accept("name", "and"):
+            tree = ("and", tree, self.comparison())
+        return tree
+
+    def comparison(self):
+        tree = self.primary()
+        token = self.peek()
+        if token[0] == "operator" and token[1] in ("=", "!=", "<", ">", "<=", ">="):
+            self.position += 1
+            tree = ("compare", token[1], tree, self.primary())
+        return tree
+
+    def primary(self):
+        token = self.peek()
+        if self.accept("literal"):
+            return ("literal", token[1])
+        if self.accept("number"):
+            return ("number", token[1])
+        if self.accept("operator", "("):
+            tree = self.union()
+            self.expect("operator", ")")
+            return tree
+        if token[0] == "name" and self.peek(1) == ("operator", "(") and token[1] not in ("text", "node"):
+            if token[1] not in XPATH_FUNCTIONS:
+                self.fail()
+            self.position += 2
+            arguments = []
+            if not self.accept("operator", ")"):
+                arguments.append(self.union())
+                while self.accept("operator", ","):
+                    arguments.append(self.union())
+                self.expect("operator", ")")
+            return ("function", token[1], arguments)
+        return self.path()
+
+    def path(self):
+        steps = []
+        absolute = False
+        if self.accept("operator", "//"):
+            (absolute, descendant) = (True, True)
+        elif self.accept("operator", "/"):
+            (absolute, descendant) = (True, False)
+            if self.peek()[0] is None or self.peek() in (("operator", ")"), ("operator", "]")):
+                return ("path", True, [])
+        else:
+            descendant = False
+        while True:
+            steps.append(self.step(descendant))
+            if self.accept("operator", "//"):
+                descendant = True
+            elif self.accept("operator", "/"):
+                descendant = False
+            else:
+                return ("path", absolute, steps)
+
+    def step(self, descendant):
+        if self.accept("operator", "."):
+            return ("self", descendant, None, [])
+        if self.accept("operator", ".."):
+            return ("parent", descendant, None, [])
+        if self.accept("operator", "@"):
+            token = self.accept("operator", "*") or self.expect("name")
+            return ("attribute", descendant, token[1], self.predicates())
+        if self.accept("operator", "*"):
+            return ("element", descendant, "*", self.predicates())
+        token = self.expect("name")
+        if token[1] in ("text", "node") and self.accept("operator", "("):
+            self.expect("operator", ")")
+            return (token[1], descendant, None, self.predicates())
+        return ("element", descendant, token[1].lower(), self.predicates())
+
+    def predicates(self):
+        predicates = []
+        while self.accept("operator", "["):
+            predicates.append(self.union())
+            self.expect("operator", "]")
+        return predicates
+
+
+def string_of(value):
+    if isinstance(value, list):
+        return value[0].string_value() if value else u""
+    if isinstance(value, bool):
+        return u"true" if value else u"false"
+    if isinstance(value, float):
+        return unicode(int(value)) if value == int(value) else unicode(value)
+    return value
+
+
+def boolean_of(value):
+    return bool(value)
+
+
+def number_of(value):
+    try:
+        return float(string_of(value))
+    except ValueError:
+        return float("nan")
+
+
+def compare(operator, left, right):
+    if isinstance(left, list) or isinstance(right, list):
+        # A node set compares true if any of its nodes does
+        lefts = [node.string_value() for node in left] if isinstance(left, list) else [left]
+        rights = [node.string_value() for node in right] if isinstance(right, list) else [right]
+        return any(compare(operator, a, b) for a in lefts for b in rights)
+    if operator in ("=", "!="):
+        if isinstance(left, bool) or isinstance(right, bool):
+            (left, right) = (boolean_of(left), boolean_of(right))
+        elif isinstance(left, float) or isinstance(right, float):
+            (left, right) = (number_of(left), number_of(right))
+        else:
+            (left, right) = (string_of(left), string_of(right))
+        return left == right if operator == "=" else left != right
+    (left, right) = (number_of(left), number_of(right))
+    return {"<": left < right, ">": left > right, "<=": left <= right, ">=": left >= right}[operator]
+
+
+def step_candidates(node, step):
+    (kind, descendant, name, _) = step
+    if descendant:
+        sources = [node] + list(node.descendants()) if isinstance(node, Node) else []
+    else:
+        sources = [node]
+    found = []
+    for source in sources:
+        if kind == "self":
+            found.append(source)
+        elif kind == "parent":
+            if source.parent is not None:
+                found.append(source.parent)
+        elif kind == "attribute":
+            if isinstance(source, Node):
+                found.extend(Attribute(key, value, source) for (key, value) in sorted(source.attributes.items())
+                             if name == "*" or key == name)
+        elif isinstance(source, Node):
+            for child in source.children:
+                if kind == "node" or (kind == "text" and isinstance(child, Text)) or \
+                   (kind == "element" and isinstance(child, Node) and name in ("*", child.tag)):
+                    found.append(child)
+    return found
+
+
+def evaluate(tree, node, position=1, size=1):
+    """ Evaluates a parsed XPath expression
+        Returns: a list of nodes, a string, a float or a bool
+    """
+    kind = tree[0]
+    if kind == "literal":
+        return tree[1]
+    if kind == "number":
+        return tree[1]
+    if kind == "or":
+        return boolean_of(evaluate(tree[1], node, position, size)) or boolean_of(evaluate(tree[2], node, position, size))
+    if kind == "and":
+        return boolean_of(evaluate(tree[1], node, position, size)) and boolean_of(evaluate(tree[2], node, position, size))
+    if kind == "compare":
+        return compare(tree[1], evaluate(tree[2], node, position, size), evaluate(tree[3], node, position, size))
+    if kind == "union":
+        nodes = evaluate(tree[1], node) + evaluate(tree[2], node)
+        return document_order(nodes)
+    if kind == "function":
+        return call_function(tree[1], [evaluate(argument, node, position, size) for argument in tree[2]],
+                             node, position, size)
+
+    (_, absolute, steps) = tree
+    if absolute:
+        while node.parent is not None:
+            node = node.parent
+    nodes = [node]
+    for step in steps:
+        found = []
+        for context in nodes:
+            candidates = step_candidates(context, step)
+            for predicate in step[3]:
+                kept = []
+                for (index, candidate) in enumerate(candidates):
+                    value = evaluate(predicate, candidate, index + 1, len(candidates))
+                    if (value == index + 1) if isinstance(value, float) else boolean_of(value):
+                        kept.append(candidate)
+                candidates = kept
+            found.extend(candidates)
+        nodes = document_order(found)
+    return nodes
+
+
+def document_order(nodes):
+    unique = dict((id(node), node) for node in nodes)
+    return sorted(unique.values(), key=lambda node: (node.order, getattr(node, "name", "")))
+
+
+def call_function(name, arguments, node, position, size):
+    if name == "contains":
+        return string_of(arguments[1]) in string_of(arguments[0])
+    if name == "starts-with":
+        return string_of(arguments[0]).startswith(string_of(arguments[1]))
+    if name == "normalize-space":
+        return normalize_space(string_of(arguments[0]) if arguments else node.string_value())
+    if name == "not":
+        return not boolean_of(arguments[0])
+    if name == "string":
+        return string_of(arguments[0]) if arguments else node.string_value()
+    if name == "concat":
+        return u"".join(string_of(argument) for argument in arguments)
+    if name == "count":
+        return float(len(arguments[0]))
+    if name == "position":
+        return float(position)
+    if name == "last":
+        return float(size)
+    return name == "true"
+
+
+def select_xpath(context, expression):
+    """ Finds the elements an XPath expression selects from context """
+    result = evaluate(XPathParser(expression).parse(), context)
+    if not isinstance(result, list):
+        raise InvalidSelectorException("The XPath '%s' doesn't select elements" % expression)
+    return [node for node in result if isinstance(node, Node) and node.tag != "#document"]
+
+
+# WebDriver
+
+def visible_text(node):
+    """ The text of an element as WebDriver shows it: only what is displayed,
+        with block elements on lines of their own
+    """
+    if not node.displayed():
+        return u""
+    lines = [[]]
+
+    def collect(current):
+        if current.hidden():
+            return
+        if current.tag == "br":
+            lines.append([])
+        block = current.tag in BLOCK_ELEMENTS
+        if block:
+            lines.append([])
+        for child in current.children:
+            if isinstance(child, Text):
+                lines[-1].append(child.data)
+            else:
+                collect(child)
+        if block:
+            lines.append([])
+
+    collect(node)
+    text = [normalize_space(u"".join(line)) for line in lines]
+    return u"\n".join(line for line in text if line)
+
+
+class Finders(object):
+    """ The element finding methods shared by ::class::FakeBrowser and ::class::FakeElement """
+    def find_element(self, by="id", value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException("Unable to locate element: {\"method\":\"%s\",\"selector\":\"%s\"}" % (by, value))
+        return found[0]
+
+    def find_elements(self, by="id", value=None):
+        context = self._context()
+        if by == "css selector":
+            nodes = select_css(context, value)
+        elif by == "xpath":
+            nodes = select_xpath(context, value)
+        elif by == "id":
+            nodes = [node for node in context.descendants() if node.attributes.get("id") == value]
+        elif by == "name":
+            nodes = [node for node in context.descendants() if node.attributes.get("name") == value]
+        elif by == "class name":
+            nodes = [node for node in context.descendants() if value in node.classes()]
+        elif by == "tag name":
+            nodes = [node for node in context.descendants() if node.tag == value.lower()]
+        elif by in ("link text", "partial link text"):
+            links = [node for node in context.descendants() if node.tag == "a"]
+            if by == "link text":
+                nodes = [node for node in links if visible_text(node) == value]
+            else:
+                nodes = [node for node in links if value in visible_text(node)]
+        else:
+            raise InvalidSelectorException("Unknown locator strategy '%s'" % by)
+        return [FakeElement(self._browser(), node) for node in nodes]
+
+    def find_element_by_id(self, id_):
+        return self.find_element("id", id_)
+
+    def find_element_by_name(self, name):
+        return self.find_element("name", name)
+
+    def find_element_by_tag_name(self, name):
+        return self.find_element("tag name", name)
+
+    def find_element_by_css_selector(self, css_selector):
+        return self.find_element("css selector", css_selector)
+
+    def find_elements_by_css_selector(self, css_selector):
+        return self.find_elements("css selector", css_selector)
+
+    def find_element_by_xpath(self, xpath):
+        return self.find_element("xpath", xpath)
+
+    def find_elements_by_xpath(self, xpath):
+        return self.find_elements("xpath", xpath)
+
+    def find_element_by_link_text(self, link_text):
+        return self.find_element("link text", link_text)
+
+
+class FakeElement(Finders):
+    """ An element of the page a ::class::FakeBrowser has loaded. Like a real
+        element, it goes stale once the browser loads another page.
+    """
+    def __init__(self, browser, node):
+        self.browser = browser
+        self.node = node
+        self.document = browser.document
+        self.id = "%x" % id(node)
+
+    def _browser(self):
+        return self.browser
+
+    def _context(self):
+        if self.browser.document is not self.document:
+            raise StaleElementReferenceException("Element is no longer attached to the DOM")
+        return self.node
+
+    def __eq__(self, other):
+        return isinstance(other, FakeElement) and other.node is self.node
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.node)
+
+    @property
+    def tag_name(self):
+        return self._context().tag
+
+    @property
+    def text(self):
+        return visible_text(self._context())
+
+    def get_attribute(self, name):
+        node = self._context()
+        if name == "value" and node.value is not None:
+            return node.value
+        if name == "value" and node.tag == "select":
+            selected = [option for option in node.descendants() if option.tag == "option" and option.selected]
+            return selected[0].value if selected else None
+        if name == "checked":
+            return "true" if node.checked and node.tag == "input" else None
+        if name == "selected":
+            return "true" if (node.selected if node.tag == "option" else node.checked) else None
+        if name == "index" and node.tag == "option" and node.select() is not None:
+            options = [option for option in node.select().descendants() if option.tag == "option"]
+            return str(options.index(node))
+        if name in BOOLEAN_ATTRIBUTES:
+            return "true" if name in node.attributes else None
+        if name in ("href", "src") and name in node.attributes:
+            return urlparse.urljoin(self.browser.current_url, node.attributes[name])
+        if name == "id":
+            return node.attributes.get("id", "")
+        return node.attributes.get(name)
+
+    def is_displayed(self):
+        node = self._context()
+        if node.tag == "option" and node.select() is not None:
+            return node.select().displayed()
+        return node.displayed()
+
+    def is_enabled(self):
+        node = self._context()
+        return "disabled" not in node.attributes and not any("disabled" in ancestor.attributes
+                                                              for ancestor in node.ancestors()
+                                                              if ancestor.tag in ("fieldset", "select"))
+
+    def is_selected(self):
+        node = self._context()
+        return node.selected if node.tag == "option" else node.checked
+
+    def clear(self):
+        node = self._context()
+        if node.value is not None:
+            node.value = u""
+
+    def send_keys(self, *values):
+        node = self._context()
+        if not self.is_displayed():
+            raise ElementNotVisibleException("Element is not currently visible and so may not be interacted with")
+        if node.tag not in ("input", "textarea"):
+            return
+        typed = u"".join(unicode(value) for value in values)
+        # Keys like Keys.ENTER are in the private use area
+        node.value = (node.value or u"") + u"".join(char for char in typed if not u"\ue000" <= char <= u"\uf8ff")
+
+    def click(self):
+        node = self._context()
+        if not self.is_displayed():
+            raise ElementNotVisibleException("Element is not currently visible and so may not be interacted with")
+        if not self.is_enabled():
+            return
+        form_type = node.form_type()
+        if form_type == "checkbox":
+            node.checked = not node.checked
+        elif form_type == "radio":
+            name = node.attributes.get("name")
+            if name is not None:
+                for other in self.document.descendants():
+                    if other.form_type() == "radio" and other.attributes.get("name") == name:
+                        other.checked = False
+            node.checked = True
+        elif node.tag == "option" and node.select() is not None:
+            if "multiple" in node.select().attributes:
+                node.selected = not node.selected
+            else:
+                for option in node.select().descendants():
+                    option.selected = False
+                node.selected = True
+        else:
+            link = node if node.tag == "a" else next((ancestor for ancestor in node.ancestors() if ancestor.tag == "a"), None)
+            if link is not None and "href" in link.attributes:
+                href = link.attributes["href"]
+                if not href.startswith("#") and not href.lower().startswith("javascript:"):
+                    self.browser.get(urlparse.urljoin(self.browser.current_url, href))
+
+    def submit(self):
+        self._context()
+
+
+def read_page(url):
+    """ Gets the HTML of a page the fake browser can load """
+    if url in FAKE_PAGES:
+        return FAKE_PAGES[url]
+    address = url.split("#", 1)[0]
+    if address in FAKE_PAGES:
+        return FAKE_PAGES[address]
+    if address == "about:blank":
+        return ""
+    if address.startswith("file://"):
+        try:
+            with open(urllib.url2pathname(address[len("file://"):])) as filehandle:
+                return filehandle.read()
+        except IOError as ex:
+            raise WebDriverException("Can't load %s: %s" % (url, ex))
+    raise WebDriverException("The fake browser only loads file:// URLs and pages in FAKE_PAGES, not %s" % url)
+
+
+class FakeBrowser(Finders):
+    """ A WebDriver stand-in that loads static pages in-process
+
+        Attributes:
+        capabilities: what the browser supports, like a WebDriver's; it doesn't run JavaScript
+        current_url: the URL of the page loaded
+        document: the parsed page
+        alert: the text of the open alert, or None
+        window_size: the size set with set_window_size
+    """
+    def __init__(self, *args, **kwargs):
+        self.capabilities = {"browserName": "fake", "javascriptEnabled": False}
+        self.current_url = "about:blank"
+        self.document = parse_html("")
+        self.alert = None
+        self.cookies = []
+        self.window_size = (1024, 768)
+        self.window_handles = ["main"]
+
+    def _browser(self):
+        return self
+
+    def _context(self):
+        return self.document
+
+    def get(self, url):
+        html = read_page(url)
+        self.current_url = url
+        self.document = parse_html(html)
+
+    @property
+    def title(self):
+        titles = [node for node in self.document.descendants() if node.tag == "title"]
+        return normalize_space(titles[0].string_value()) if titles else u""
+
+    @property
+    def page_source(self):
+        return read_page(self.current_url)
+
+    def execute(self, command, params=None):
+        """ Runs the WebDriver commands selenium's Alert sends """
+        from selenium.webdriver.remote.command import Command
+
+        if command not in (Command.GET_ALERT_TEXT, Command.ACCEPT_ALERT, Command.DISMISS_ALERT, Command.SET_ALERT_VALUE):
+            raise WebDriverException("The fake browser doesn't support the %s command" % command)
+        if self.alert is None:
+            raise NoAlertPresentException("No alert is present")
+        if command == Command.GET_ALERT_TEXT:
+            return {"value": self.alert}
+        if command != Command.SET_ALERT_VALUE:
+            self.alert = None
+        return {"value": None}
+
+    def execute_script(self, script, *args):
+        raise WebDriverException("The fake browser doesn't run JavaScript")
+
+    def execute_async_script(self, script, *args):
+        raise WebDriverException("The fake browser doesn't run JavaScript")
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_window_size(self, width, height, windowHandle="current"):
+        self.window_size = (width, height)
+
+    def switch_to_window(self, handle):
+        pass
+
+    def get_cookies(self):
+        return list(self.cookies)
+
+    def add_cookie(self, cookie):
+        self.cookies = [existing for existing in self.cookies if existing["name"] != cookie["name"]] + [dict(cookie)]
+
+    def delete_all_cookies(self):
+        self.cookies = []
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
@@ -0,0 +1,189 @@
+""" Test suite loading
+
+Finds and parses the task files of a test suite, spreading the parsing
+across worker processes when there are enough files to make it worthwhile.
+
+"""
+import os
+import re
+import sys
+import imp
+import fnmatch
+import multiprocessing
+from collections import defaultdict
+
+from harmonious.utils import unquote_variable
+from harmonious.parsers import parse_task_file
+from harmonious.registries import TASK_REGISTRY
+
+# Below this many files, starting worker processes costs more than it saves
+MIN_PARALLEL_FILES = 64
+
+# The first "Name:" key that isn't a list item; used to index task files without parsing them
+TASK_NAME_PATTERN = re.compile(r'^[ \t]*name[ \t]*:[ \t]*(\S.*?)[ \t]*$', re.IGNORECASE | re.MULTILINE)
+
+
+def load_environment(path):
+    """ Loads the environment script of a test suite, if it has one, so its
+        directives and callbacks are registered. Loading is skipped when the
+        script is already loaded (such as in a forked worker process).
+
+        Args:
+        path: the test suite directory
+    """
+    filename = os.path.join(path, "environment.py")
+    if "environment" not in sys.modules and os.path.exists(filename):
+        imp.load_source("environment", filename)
+
+
+def discover_task_files(path, recursive=True):
+    """ Finds the task files of a test suite
+        Args:
+        path: the test suite directory; task files live under PATH/testcases
+        recursive: whether to search subdirectories of testcases too
+
+        Returns: a sorted list of task file names
+    """
+    testcases = os.path.join(path, "testcases")
+    filenames = []
+    for (directory, subdirectories, files) in os.walk(testcases):
+        filenames.extend(os.path.join(directory, name) for name in fnmatch.filter(files, "*.yml"))
+        if not recursive:
+            break
+    return sorted(filenames)
+
+
+def parse_files(filenames, processes=None, environment=None):
+    """ Parses task files, in a pool of worker processes if there are enough of them
+        Args:
+        filenames: the task files to parse
+        processes: the number of worker processes (default: one per CPU)
+        environment: the test suite directory, so workers that don't inherit
+                     the parent's directives can load its environment script
+
+        Returns: the parsed tasks, in the same order as filenames
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(filenames) // MIN_PARALLEL_FILES)
+    if processes <= 1:
+        return [parse_task_file(filename) for filename in filenames]
+
+    initializer = None
+    if environment is not None:
+        initializer = load_environment
+    pool = multiprocessing.Pool(processes, initializer, (environment,))
+    try:
+        chunksize = max(1, len(filenames) // (processes * 4))
+        tasks = pool.map(parse_task_file, filenames, chunksize)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return tasks
+
+
+def load_task_files(filenames, cache=None, processes=None, environment=None):
+    """ Loads task files, taking unchanged ones from the plan cache and
+        parsing the rest in parallel.
+
+        Args:
+        filenames: the task files to load
+        cache: (optional) a ::class::PlanCache to read and update
+        processes: the number of worker processes to parse with
+        environment: the test suite directory (see ::func::parse_files)
+
+        Returns: the tasks, in the same order as filenames
+    """
+    tasks = [None] * len(filenames)
+    missing = []
+    entries = {}
+    for (index, filename) in enumerate(filenames):
+        if cache is not None:
+            entries[index] = cache.entry_path(filename, parse_task_file)
+            tasks[index] = cache.get(entries[index])
+        if tasks[index] is None:
+            missing.append(index)
+
+    parsed = parse_files([filenames[index] for index in missing], processes, environment)
+    for (index, task) in zip(missing, parsed):
+        tasks[index] = task
+        if cache is not None:
+            cache.store(entries[index], task)
+    return tasks
+
+
+def register_tasks(tasks):
+    """ Adds tasks to the task registry in order. When two files define the same
+        task, the later one (in file name order) replaces the earlier one.
+    """
+    for task in tasks:
+        existing = TASK_REGISTRY.get(task.name)
+        if existing is not None and existing.filename != task.filename:
+            print "WARNING: Task '%s' in %s replaces the one in %s" % (task.name, task.filename, existing.filename)
+        TASK_REGISTRY[task.name] = task
+
+
+
+def index_task_files(filenames):
+    """ Maps task names to the files that define them by scanning each file
+        for its name, without parsing the YAML.
+
+        Args:
+        filenames: the task files to index
+
+        Returns: a (index, unindexed) tuple of a map of task name to a list of
+                 files, and a list of files no name could be found in
+    """
+    index = defaultdict(list)
+    unindexed = []
+    for filename in filenames:
+        with open(filename) as filehandle:
+            match = TASK_NAME_PATTERN.search(filehandle.read())
+        if match:
+            index[unquote_variable(match.group(1))].append(filename)
+        else:
+            unindexed.append(filename)
+    return (index, unindexed)
+
+
+def load_referenced_tasks(test_plans, filenames, cache=None, processes=None, environment=None):
+    """ Loads only the tasks that the test plans use: their tasks, and the
+        setup tasks and execute prerequisites of those, transitively.
+
+        Files are found through ::func::index_task_files. If a task can't be
+        found that way (or a file turns out to define a different task than
+        the index says), every remaining file is loaded.
+
+        Args:
+        test_plans: the test plans that will run
+        filenames: all task files of the test suite
+        cache, processes, environment: as for ::func::load_task_files
+
+        Returns: the number of task files loaded
+    """
+    (index, unindexed) = index_task_files(filenames)
+    remaining = set(filenames)
+    requested = set()
+    pending = set(name for test_plan in test_plans for name in test_plan.tasks)
+
+    while pending:
+        requested.update(pending)
+        files = set(filename for name in pending for filename in index.get(name, []))
+        files.intersection_update(remaining)
+        tasks = load_task_files(sorted(files), cache, processes, environment)
+        register_tasks(tasks)
+        remaining.difference_update(files)
+
+        if remaining and any(TASK_REGISTRY.get(name) is None for name in pending):
+            tasks.extend(load_task_files(sorted(remaining), cache, processes, environment))
+            register_tasks(tasks[len(files):])
+            remaining.clear()
+
+        pending = set()
+        for task in tasks:
+            pending.update(task.setup_tasks)
+            pending.update(task.execute_prerequisites)
+        pending.difference_update(requested)
+
+    return len(filenames) - len(remaining)
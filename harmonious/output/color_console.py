@@ -1,5 +1,5 @@
 from harmonious.decorators import Before, After
-from harmonious.output.results import analyze_results
+from harmonious.output.results import analyze_results, SLOW_DIRECTIVE
 
 class bgcolor:
     BLACK = '\033[30m'
@@ -46,6 +46,8 @@ def output_directive_status(directive, result):
         print bgcolor.GREEN,
     print "\t\t-",
     print directive.string,
+    if result.elapsed is not None and result.elapsed >= SLOW_DIRECTIVE:
+        print "(%.1fs)" % result.elapsed,
     if result.exception is not None:
         print " ... FAIL" + bgcolor.OFF
     else:
@@ -56,7 +58,7 @@ def output_summary(results):
     summary = analyze_results(results)
 
     print bgcolor.BOLD + "Results:" + bgcolor.OFF
-    print bgcolor.BOLD + "Test plans run: " + bgcolor.OFF + str(summary.plan_count) + bgcolor.BOLD + " Test plans in error: "  + bgcolor.OFF + str(summary.in_error)
+    print bgcolor.BOLD + "Test plans run: " + bgcolor.OFF + str(summary.plan_count) + bgcolor.BOLD + " Test plans in error: "  + bgcolor.OFF + str(summary.in_error) + bgcolor.BOLD + " Skipped: " + bgcolor.OFF + str(summary.skipped)
     print bgcolor.BOLD + "Errors:" + bgcolor.OFF
     for error in summary.errors:
         print bgcolor.RED + error[0] + bgcolor.OFF
@@ -1,5 +1,5 @@
 from harmonious.decorators import Before, After
-from harmonious.output.results import analyze_results
+from harmonious.output.results import analyze_results, SLOW_DIRECTIVE
 
 @Before.Output.all
 def output_runner():
@@ -21,6 +21,8 @@ def output_step_name(step):
 def output_directive_status(directive, result):
     print "\t\t-",
     print directive.string,
+    if result.elapsed is not None and result.elapsed >= SLOW_DIRECTIVE:
+        print "(%.1fs)" % result.elapsed,
     if result.exception is not None:
         print " ... FAIL"
     else:
@@ -31,7 +33,7 @@ def output_summary(results):
     summary = analyze_results(results)
 
     print "Results:"
-    print "Test plans run: %s, Test plans in error: %s" % (summary.plan_count, summary.in_error)
+    print "Test plans run: %s, Test plans in error: %s, Skipped: %s" % (summary.plan_count, summary.in_error, summary.skipped)
     print "Errors:"
     for error in summary.errors:
         print error[0]
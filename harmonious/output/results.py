@@ -4,44 +4,39 @@ from harmonious.exceptions import ExpectedThrownError
 
 from collections import namedtuple
 
-Summary = namedtuple("Summary", ['plan_count', 'in_error', 'errors'])
+# Directives that take at least this many seconds, usually waits, have their time shown
+SLOW_DIRECTIVE = 1.0
+
+Summary = namedtuple("Summary", ['plan_count', 'in_error', 'errors', 'skipped'])
+
+
+def count_skipped(result):
+    """ Counts the items in a result tree that were skipped after a failure """
+    return int(result.skipped) + sum(count_skipped(child) for child in result.itervalues())
+
 
 def analyze_results(result):
     plan_count = 0
     error_plan = 0
+    skipped = 0
     for test_plan in result:
         plan_count += 1
-        if test_plan.exception is not None:
+        if test_plan.failed():
             error_plan += 1
-            break
-        else:
-            for (case_name, test_case) in test_plan.iteritems():
-                if test_case.exception is not None:
-                    error_plan += 1
-                    break
-                else:
-                    for (step_name, step) in test_case.iteritems():
-                        if step.exception is not None:
-                            error_plan += 1
-                            break
-                        else:
-                            for (directive_str, directive) in step.iteritems():
-                                if directive.exception is not None:
-                                    error_plan += 1
-                                    break
+        skipped += count_skipped(test_plan)
 
     errors = []
     for test_plan in result:
         if test_plan.exception is not None:
-            errors.append(test_plan.name, translate_exception_to_reason(test_plan.exception))
+            errors.append((test_plan.name, [translate_exception_to_reason(test_plan.exception)]))
         else:
             for (case_name, test_case) in test_plan.iteritems():
                 if test_case.exception is not None:
-                    errors.append(("%s - %s" % (test_plan.name, case_name), translate_exception_to_reason(test_case.exception)))
+                    errors.append(("%s - %s" % (test_plan.name, case_name), [translate_exception_to_reason(test_case.exception)]))
                 else:
                     for (step_name, step) in test_case.iteritems():
                         if step.exception is not None:
-                            errors.append(("%s - %s(%s)" % (test_plan.name, case_name, step_name), translate_exception_to_reason(step.exception)))
+                            errors.append(("%s - %s(%s)" % (test_plan.name, case_name, step_name), [translate_exception_to_reason(step.exception)]))
                         else:
                             location = "%s - %s(%s)" % (test_plan.name, case_name, step_name)
                             directives = []
@@ -53,7 +48,7 @@ def analyze_results(result):
                             if in_error:
                                 errors.append((location,directives))
 
-    return Summary(plan_count=plan_count, in_error=error_plan, errors=errors)
+    return Summary(plan_count=plan_count, in_error=error_plan, errors=errors, skipped=skipped)
 
 
 def translate_exception_to_reason(ex):
@@ -2,11 +2,37 @@ import yaml
 
 from harmonious.utils import unquote_variable
 from harmonious.core import TestPlan, Task, Step, Directive
+from harmonious.exceptions import UnknownDirectiveError, InvalidSettingError
+from harmonious.settings import SETTINGS, RUN_SETTINGS
+from harmonious.browsers import parse_environment
+
+# Use the libyaml based loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def lower_node_keys(node):
+    """ Lower cases the keys of a mapping node and of the mappings nested
+        directly in its values. Mappings inside lists (steps, glossary entries)
+        keep their keys as written.
+    """
+    if isinstance(node, yaml.MappingNode):
+        for (key_node, value_node) in node.value:
+            if isinstance(key_node, yaml.ScalarNode):
+                key_node.value = key_node.value.lower()
+            lower_node_keys(value_node)
+
+
+class TaskFileLoader(SafeLoader):
+    """ A safe YAML loader for task files that normalises the case of keys
+        while the document is constructed, rather than copying it afterwards.
+    """
+    def construct_document(self, node):
+        lower_node_keys(node)
+        return SafeLoader.construct_document(self, node)
 
-def lower_keys(dictionary):
-    if isinstance(dictionary, dict):
-        return dict((key.lower(), lower_keys(value)) for key, value in dictionary.iteritems())
-    return dictionary
 
 def parse_variable(var):
     parts = var.split("=")
@@ -16,10 +42,11 @@ def parse_variable(var):
         return var
 
 def parse_task_file(filename):
-    filehandle = open(filename)
-    raw_file = lower_keys(yaml.load(filehandle))
+    with open(filename) as filehandle:
+        raw_file = yaml.load(filehandle, Loader=TaskFileLoader)
 
     task = Task(raw_file["name"])
+    task.filename = filename
     if "description" in raw_file:
         task.description = raw_file["description"]
 
@@ -41,29 +68,53 @@ def parse_task_file(filename):
     for raw_step in raw_file["steps"]:
         step = Step(raw_step.keys()[0])
         for direction in raw_step.values()[0]:
-            step.directions.append(Directive(string=direction))
+            directive = Directive(string=direction)
+            try:
+                directive.bind()
+            except UnknownDirectiveError as ex:
+                raise UnknownDirectiveError("%s: %s" % (filename, ex))
+            step.directions.append(directive)
         task.steps.append(step)
 
     return task
 
 
-def parse_test_plan(filename):
-    filehandle = open(filename)
-    raw_file = yaml.load(filehandle)
+def parse_test_plan_items(filehandle):
+    """ Generator over the test plan entries in a plan file.
+        A plan file may hold several YAML documents, each either a list of
+        test plans or a single test plan.
+    """
+    for document in yaml.load_all(filehandle, Loader=SafeLoader):
+        if isinstance(document, dict):
+            yield document
+        elif document is not None:
+            for item in document:
+                yield item
 
+
+def parse_test_plan(filename):
     test_plans = []
-    for item in raw_file:
-        testplan = TestPlan(item["name"])
-        testplan.tasks = item["tasks"]
-        testplan.environment = item["environment"]
-        if "variables" in item:
-            for entry in item["variables"]:
-                for key, value in entry.iteritems():
-                    testplan.variables[key] = parse_variable(value)
-        if "glossary" in item:
-            for entry in item["glossary"]:
-                for key, value in entry.iteritems():
-                    testplan.variables.define_immutable(key, parse_variable(value))
-        test_plans.append(testplan)
+    with open(filename) as filehandle:
+        for item in parse_test_plan_items(filehandle):
+            testplan = TestPlan(item["name"])
+            testplan.tasks = item["tasks"]
+            (testplan.environment, testplan.browser_options) = parse_environment(item["environment"])
+            testplan.remote = item.get("remote")
+            if "variables" in item:
+                for entry in item["variables"]:
+                    for key, value in entry.iteritems():
+                        testplan.variables[key] = parse_variable(value)
+            if "glossary" in item:
+                for entry in item["glossary"]:
+                    for key, value in entry.iteritems():
+                        testplan.variables.define_immutable(key, parse_variable(value))
+            overridden = RUN_SETTINGS.intersection(item)
+            if overridden:
+                raise InvalidSettingError("Test plan '%s' sets %s, which can only be set for the whole run" %
+                                          (testplan.name, ", ".join(sorted(overridden))))
+            for name in SETTINGS:
+                if name in item:
+                    testplan.settings[name] = item[name]
+            test_plans.append(testplan)
 
     return test_plans
\ No newline at end of file
@@ -1,14 +1,166 @@
 import re
-from collections import defaultdict
+import hashlib
+import threading
+import sre_parse
+import sre_constants
+from collections import defaultdict, OrderedDict
+
+from harmonious.exceptions import UnknownDirectiveError
+
+# How many directive strings a registry remembers the lookup of. Strings with
+# substituted values can be unique, so the least recently used are forgotten.
+LOOKUP_CACHE_SIZE = 1024
+
+
+def literal_prefix(regexp):
+    """ Gets the literal text a compiled expression must start with
+        Args:
+        regexp: a compiled regular expression
+
+        Returns: the lower cased literal prefix (which may be empty)
+    """
+    prefix = []
+    for (op, value) in sre_parse.parse(regexp.pattern, regexp.flags):
+        if op == sre_constants.LITERAL:
+            prefix.append(unichr(value).lower())
+        elif op == sre_constants.AT and value == sre_constants.AT_BEGINNING and not prefix:
+            continue
+        else:
+            break
+    return u"".join(prefix)
+
+
+def specificity(regexp):
+    """ Gets the number of literal characters outside of groups in an expression,
+        used to prefer the most specific directive when several match.
+    """
+    return sum(1 for (op, value) in sre_parse.parse(regexp.pattern, regexp.flags)
+               if op == sre_constants.LITERAL)
+
 
 class DirectiveRegistry(dict):
+    """ A map of compiled directive expressions to directive functions.
+        Expressions are indexed in a trie by their literal prefix (usually the
+        leading verb, like "load" or "expect"), so a lookup only tries the
+        expressions whose prefix the directive string starts with, plus the
+        expressions that have no literal prefix at all.
+
+        When several expressions match a string, the most specific one wins:
+        the one with the most literal characters, then the one with the
+        longest literal prefix, then the one registered first.
+    """
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self)
+        self._index = {}
+        self._priority = {}
+        self._lookups = OrderedDict()
+        self._lookups_lock = threading.Lock()
+        self._fingerprint = None
+        self.update(*args, **kwargs)
+
     def add_directive(self, regexp, dir_func):
         self[re.compile(regexp, flags=re.IGNORECASE)] = dir_func
 
+    def __setitem__(self, regexp, dir_func):
+        if regexp not in self:
+            prefix = literal_prefix(regexp)
+            node = self._index
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(regexp)
+            self._priority[regexp] = (specificity(regexp), len(prefix), -len(self._priority))
+        dict.__setitem__(self, regexp, dir_func)
+        self._lookups.clear()
+        self._fingerprint = None
+
+    def __delitem__(self, regexp):
+        dict.__delitem__(self, regexp)
+        remaining = [(key, self[key]) for key in sorted(self, key=lambda key: -self._priority[key][2])]
+        dict.clear(self)
+        self._index = {}
+        self._priority = {}
+        self._lookups.clear()
+        self._fingerprint = None
+        for (key, func) in remaining:
+            self[key] = func
+
+    def update(self, *args, **kwargs):
+        for (regexp, dir_func) in dict(*args, **kwargs).iteritems():
+            self[regexp] = dir_func
+
+    def fingerprint(self):
+        """ Gets a digest of the registered expressions, which changes whenever
+            a directive is added or removed.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            for pattern in sorted(regexp.pattern for regexp in self):
+                digest.update(pattern.encode("utf-8") + "\0")
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def candidates(self, string):
+        """ Gets the expressions that could match a directive string
+            Args:
+            string: the directive string
+
+            Returns: a list of (is_prefixed, regexp) pairs, most specific first
+        """
+        found = [(False, regexp) for regexp in self._index.get(None, [])]
+        node = self._index
+        for char in string.lower():
+            node = node.get(char)
+            if node is None:
+                break
+            found.extend((True, regexp) for regexp in node.get(None, []))
+        return sorted(found, key=lambda item: self._priority[item[1]], reverse=True)
+
+    def lookup(self, string):
+        """ Finds the directive function bound to a directive string
+            Args:
+            string: the directive string to resolve
+
+            Returns: a (function, match) tuple for the most specific matching directive
+
+            Raises:
+                UnknownDirectiveError if no registered expression matches
+        """
+        with self._lookups_lock:
+            if string in self._lookups:
+                found = self._lookups[string] = self._lookups.pop(string)
+                return found
+
+        for (prefixed, regexp) in self.candidates(string):
+            # Expressions with a literal prefix are anchored by it; the
+            # rest can still match anywhere in the string
+            if prefixed:
+                match = regexp.match(string)
+            else:
+                match = regexp.search(string)
+            if match:
+                with self._lookups_lock:
+                    self._lookups[string] = (self[regexp], match)
+                    if len(self._lookups) > LOOKUP_CACHE_SIZE:
+                        self._lookups.popitem(last=False)
+                return (self[regexp], match)
+        raise UnknownDirectiveError("No directive matches '%s'" % string)
+
 class CallbackRegistry(dict):
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        # Tasks may run on several threads; callbacks (and their output) run one at a time
+        self.lock = threading.RLock()
+        # When set, output callbacks aren't run; forward(type, callback, kwargs)
+        # is called instead (worker processes send them to the parent this way)
+        self.forward = None
+
     def run_all(self, type, callback, **kwargs):
-        for cb in self[type][callback]:
-            cb(**kwargs)
+        with self.lock:
+            if self.forward is not None and callback.endswith("_output"):
+                self.forward(type, callback, kwargs)
+                return
+            for cb in self[type][callback]:
+                cb(**kwargs)
 
 TASK_REGISTRY = defaultdict(lambda: None)
 DIRECTIVE_REGISTRY = DirectiveRegistry()
@@ -0,0 +1,158 @@
+""" Remote WebDriver backend
+
+Launches browsers on a remote WebDriver server (such as a Selenium grid
+hub) for test plans that name one with a "remote" key. Every WebDriver
+command is an HTTP request, so instead of opening a new connection per
+command the requests go over kept-alive connections from a pool shared
+by every remote browser talking to the same server.
+
+"""
+import socket
+import httplib
+import threading
+import urlparse
+from collections import defaultdict
+
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+# The desired capabilities to ask for, by harmonious environment name
+CAPABILITIES = {
+    'ie': 'INTERNETEXPLORER',
+    'chrome': 'CHROME',
+    'firefox': 'FIREFOX',
+    'safari': 'SAFARI',
+    'opera': 'OPERA',
+    'phantom': 'PHANTOMJS',
+}
+
+# The connection class and default port for each scheme a server URL may use
+CONNECTION_TYPES = {
+    'http': (httplib.HTTPConnection, 80),
+    'https': (httplib.HTTPSConnection, 443),
+}
+
+
+class ConnectionPool(object):
+    """ Idle HTTP connections, kept open for reuse, by server.
+
+        Args:
+        max_idle: (optional) the number of idle connections to keep per server
+
+        Attributes:
+        connects: the number of connections the pool has opened
+    """
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self.idle = defaultdict(list)
+        self.lock = threading.Lock()
+        self.connects = 0
+
+    def acquire(self, server):
+        """ Gets a connection to a server, reusing an idle one if there is one
+            Args:
+            server: a (scheme, host, port) tuple, where scheme is one of CONNECTION_TYPES
+
+            Returns: a (connection, whether it was reused) tuple
+        """
+        with self.lock:
+            if self.idle[server]:
+                return (self.idle[server].pop(), True)
+            self.connects += 1
+        (scheme, host, port) = server
+        return (CONNECTION_TYPES[scheme][0](host, port), False)
+
+    def release(self, server, connection):
+        """ Hands back a connection whose response has been read in full """
+        with self.lock:
+            if len(self.idle[server]) < self.max_idle:
+                self.idle[server].append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        """ Closes every idle connection """
+        with self.lock:
+            for connections in self.idle.itervalues():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+CONNECTION_POOL = ConnectionPool()
+
+
+class PooledConnection(RemoteConnection):
+    """ A WebDriver command executor that sends its requests over kept-alive
+        connections from a ::class::ConnectionPool.
+
+        Args:
+        remote_server_addr: the http:// or https:// URL of the WebDriver server
+        pool: (optional) the pool to take connections from
+
+        Raises: ValueError if the URL uses another scheme
+    """
+    def __init__(self, remote_server_addr, pool=CONNECTION_POOL):
+        RemoteConnection.__init__(self, remote_server_addr)
+        parsed_url = urlparse.urlparse(self._url)
+        scheme = parsed_url.scheme.lower()
+        if scheme not in CONNECTION_TYPES:
+            raise ValueError("WebDriver server URLs must be http:// or https://, not '%s'" % remote_server_addr)
+        self.server = (scheme, parsed_url.hostname, parsed_url.port or CONNECTION_TYPES[scheme][1])
+        self.pool = pool
+        self.keep_alive = True
+
+    def _request(self, method, url, body=None):
+        (connection, reused) = self.pool.acquire(self.server)
+        try:
+            return self._send(connection, method, url, body)
+        except (httplib.HTTPException, socket.error):
+            connection.close()
+            if not reused:
+                raise
+        # The server closed the idle connection; try once on a new one
+        (connection, _) = self.pool.acquire(self.server)
+        try:
+            return self._send(connection, method, url, body)
+        except (httplib.HTTPException, socket.error):
+            connection.close()
+            raise
+
+    def _send(self, connection, method, url, body):
+        # The keep-alive branch of RemoteConnection._request sends over self._conn.
+        # Redirects call _request again, which takes a connection of its own.
+        self._conn = connection
+        response = RemoteConnection._request(self, method, url, body)
+        self.pool.release(self.server, connection)
+        return response
+
+
+def desired_capabilities(environment):
+    """ Gets the capabilities to ask a WebDriver server for
+        Args:
+        environment: the name of the browser, as used for local environments
+
+        Returns: a dict of desired capabilities
+    """
+    from selenium.webdriver import DesiredCapabilities
+    name = CAPABILITIES.get(environment.lower())
+    if name is None:
+        return {'browserName': environment.lower()}
+    return dict(getattr(DesiredCapabilities, name))
+
+
+def launch_remote(url, environment, options=None):
+    """ Starts a browser session on a remote WebDriver server
+        Args:
+        url: the URL of the server
+        environment: the name of the browser to ask for
+        options: (optional) the ::class::BrowserOptions to launch it with
+
+        Returns: the WebDriver
+    """
+    from selenium.webdriver.remote.webdriver import WebDriver
+    from harmonious.browsers import capabilities_for, resize
+
+    capabilities = desired_capabilities(environment)
+    if options is not None:
+        capabilities_for(environment, options, capabilities)
+    return resize(WebDriver(command_executor=PooledConnection(url), desired_capabilities=capabilities), options)
@@ -0,0 +1,241 @@
+""" Task scheduling
+
+Works out which tasks of a test plan can run, given the setup tasks each
+one has to wait for.
+
+"""
+from collections import defaultdict, deque
+
+from harmonious.registries import TASK_REGISTRY, CALLBACK_REGISTRY
+from harmonious.exceptions import DependencyCycleError
+
+
+class TaskGraph(object):
+    """ The tasks a test plan runs and the setup task dependencies between them.
+        Setup tasks are included even when the test plan doesn't list them.
+
+        Args:
+        names: the names of the tasks to include
+
+        Attributes:
+        order: the task names, in the order they were found
+        dependencies: a map of task name to the names of its setup tasks
+        dependents: a map of task name to the names of tasks that list it as a setup task
+    """
+    def __init__(self, names):
+        self.order = []
+        self.dependencies = {}
+        self.dependents = defaultdict(list)
+
+        pending = deque(names)
+        while pending:
+            name = pending.popleft()
+            if name in self.dependencies:
+                continue
+            task = TASK_REGISTRY.get(name)
+            setup_tasks = []
+            if task is not None:
+                for dependency in task.setup_tasks:
+                    if dependency not in setup_tasks:
+                        setup_tasks.append(dependency)
+            self.order.append(name)
+            self.dependencies[name] = setup_tasks
+            for dependency in setup_tasks:
+                self.dependents[dependency].append(name)
+                pending.append(dependency)
+
+    def __len__(self):
+        return len(self.order)
+
+    def topological_order(self):
+        """ Orders the tasks so each comes after its setup tasks. Otherwise the
+            order they were found in is kept, with setup tasks just before the
+            first task that needs them.
+
+            Returns: a list of task names
+        """
+        (order, cycle) = self.depth_first()
+        if cycle:
+            raise DependencyCycleError("Setup tasks depend on each other: %s" % " -> ".join(cycle))
+        return order
+
+    def ready_sets(self):
+        """ Groups the tasks into sets that can each run at once: the tasks in a
+            set only depend on tasks in earlier sets.
+
+            Returns: a list of lists of task names
+        """
+        scheduler = TaskScheduler(self)
+        sets = []
+        while scheduler.ready:
+            ready = [scheduler.take() for _ in range(len(scheduler.ready))]
+            for name in ready:
+                scheduler.done(name)
+            sets.append(ready)
+        if not scheduler.finished():
+            raise DependencyCycleError("Setup tasks depend on each other: %s" % " -> ".join(self.find_cycle()))
+        return sets
+
+    def find_cycle(self):
+        """ Finds setup tasks that depend on each other
+            Returns: the task names around a cycle, starting and ending with the same one,
+                     or an empty list if there are no cycles
+        """
+        return self.depth_first()[1]
+
+    def depth_first(self):
+        """ Walks the graph depth first from each task in turn
+            Returns: a (task names in post-order, first cycle found or an empty list) tuple
+        """
+        state = {}
+        order = []
+        for start in self.order:
+            if start in state:
+                continue
+            # The path to the current task, and the setup tasks left to visit for each
+            path = [start]
+            remaining = [iter(self.dependencies[start])]
+            state[start] = "visiting"
+            while path:
+                dependency = next(remaining[-1], None)
+                if dependency is None:
+                    name = path.pop()
+                    remaining.pop()
+                    state[name] = "done"
+                    order.append(name)
+                elif state.get(dependency) == "visiting":
+                    return (order, path[path.index(dependency):] + [dependency])
+                elif dependency not in state:
+                    state[dependency] = "visiting"
+                    path.append(dependency)
+                    remaining.append(iter(self.dependencies[dependency]))
+        return (order, [])
+
+
+class TaskScheduler(object):
+    """ Hands out the tasks of a ::class::TaskGraph as they become ready, that is
+        once all of their setup tasks are done.
+
+        Args:
+        graph: the ::class::TaskGraph to schedule
+
+        Attributes:
+        graph: the graph being scheduled
+        ready: the names of tasks that can run now, in order
+        running: the names of tasks that have been taken but aren't done
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.waiting = dict((name, len(graph.dependencies[name])) for name in graph.order)
+        self.ready = deque(name for name in graph.order if self.waiting[name] == 0)
+        self.running = set()
+        self.completed = 0
+
+    def take(self):
+        """ Takes the next ready task
+            Returns: the name of the task
+        """
+        name = self.ready.popleft()
+        self.running.add(name)
+        return name
+
+    def done(self, name):
+        """ Marks a task as done, making any tasks waiting only on it ready """
+        self.running.remove(name)
+        self.completed += 1
+        for dependent in self.graph.dependents[name]:
+            self.waiting[dependent] -= 1
+            if self.waiting[dependent] == 0:
+                self.ready.append(dependent)
+
+    def finished(self):
+        """ Whether every task has been done """
+        return self.completed == len(self.graph)
+
+    def stalled(self):
+        """ Whether tasks remain but none can ever become ready, which
+            happens when setup tasks depend on each other in a cycle.
+        """
+        return not self.ready and not self.running and not self.finished()
+
+
+class SuiteScheduler(object):
+    """ Hands out the tasks of several test plans at once, earlier test plans first.
+        The test plan callbacks are run as each test plan starts and finishes.
+
+        Args:
+        test_plans: the test plans to schedule
+        results: a ::class::Result for each test plan, that the results of its tasks are added to
+    """
+    def __init__(self, test_plans, results):
+        self.test_plans = test_plans
+        self.results = results
+        self.schedulers = [TaskScheduler(TaskGraph(test_plan.tasks)) for test_plan in test_plans]
+        self.started = [False] * len(test_plans)
+        self.complete = [False] * len(test_plans)
+        self.requeued = deque()
+
+    def start(self):
+        """ Finishes test plans that have no tasks to run """
+        for index in range(len(self.test_plans)):
+            self.check_complete(index)
+
+    def take(self):
+        """ Takes the next task that can run, handed back tasks first. Tasks that
+            earlier failures mean should be skipped are marked as done instead.
+            Returns: a (test plan index, task name) tuple, or None if no task is ready
+        """
+        # core imports this module
+        from harmonious.core import skipped_result
+        if self.requeued:
+            return self.requeued.popleft()
+        for (index, scheduler) in enumerate(self.schedulers):
+            while scheduler.ready:
+                if not self.started[index]:
+                    self.start_plan(index)
+                name = scheduler.take()
+                if not self.test_plans[index].should_skip(name, self.results[index]):
+                    return (index, name)
+                self.done((index, name), {name: skipped_result(name)})
+        return None
+
+    def requeue(self, item):
+        """ Hands back a task that was taken but couldn't be run """
+        self.requeued.append(item)
+
+    def done(self, item, results):
+        """ Marks a task as done
+            Args:
+            item: the (test plan index, task name) tuple the task was taken as
+            results: a map of task name to ::class::Result for the task and its execute prerequisites
+        """
+        (index, task_name) = item
+        self.results[index].update(results)
+        self.schedulers[index].done(task_name)
+        self.check_complete(index)
+
+    def finished(self):
+        """ Whether every test plan is complete """
+        return all(self.complete)
+
+    def start_plan(self, index):
+        test_plan = self.test_plans[index]
+        self.started[index] = True
+        CALLBACK_REGISTRY.run_all(type="testplan", callback="before", test_plan=test_plan)
+        CALLBACK_REGISTRY.run_all(type="testplan", callback="before_output", test_plan=test_plan)
+
+    def check_complete(self, index):
+        """ Finishes a test plan once all of its tasks are done """
+        scheduler = self.schedulers[index]
+        if self.complete[index] or not (scheduler.finished() or scheduler.stalled()):
+            return
+        test_plan = self.test_plans[index]
+        result = self.results[index]
+        if not self.started[index]:
+            self.start_plan(index)
+        if scheduler.stalled():
+            cycle = " -> ".join(scheduler.graph.find_cycle())
+            result.exception = DependencyCycleError("Setup tasks of '%s' depend on each other: %s" % (test_plan.name, cycle))
+        self.complete[index] = True
+        CALLBACK_REGISTRY.run_all(type="testplan", callback="after", test_plan=test_plan, result=result)
+        CALLBACK_REGISTRY.run_all(type="testplan", callback="after_output", test_plan=test_plan, result=result)
@@ -0,0 +1,100 @@
+""" Browser sessions
+
+Hands out the browsers tasks run in, optionally keeping one browser alive
+across tasks so the cost of launching it is only paid once.
+
+"""
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.elements import ELEMENT_CACHE
+
+RESET_STORAGE_SCRIPT = """
+try { window.localStorage.clear(); } catch (e) {}
+try { window.sessionStorage.clear(); } catch (e) {}
+"""
+
+
+def reset_browser(browser):
+    """ Returns a browser to a clean state between tasks: closes every window
+        but the first, deletes the cookies and web storage of the current site
+        and navigates to about:blank.
+
+        Args:
+        browser: the WebDriver to reset
+    """
+    handles = browser.window_handles
+    for handle in handles[1:]:
+        browser.switch_to_window(handle)
+        browser.close()
+    browser.switch_to_window(handles[0])
+    ELEMENT_CACHE.invalidate(browser)
+    browser.delete_all_cookies()
+    browser.execute_script(RESET_STORAGE_SCRIPT)
+    browser.get("about:blank")
+
+
+class BrowserSession(object):
+    """ Provides browsers for a sequence of tasks.
+        Without reuse, every task gets a newly launched browser that is closed
+        once the task is done. With reuse, the browser is kept and reset between
+        tasks, and replaced after recycle_after tasks or when a task fails.
+
+        Args:
+        launch: a callable that launches a new browser
+        reuse: whether to keep the browser between tasks
+        recycle_after: (optional) the number of tasks to use a kept browser for
+
+        Attributes:
+        browser: the current browser, if one is running
+        uses: the number of tasks the current browser has been used for
+        launches: the number of browsers launched by this session
+    """
+    def __init__(self, launch, reuse=False, recycle_after=None):
+        self.launch = launch
+        self.reuse = reuse
+        self.recycle_after = recycle_after
+        self.browser = None
+        self.uses = 0
+        self.launches = 0
+
+    def acquire(self):
+        """ Gets the browser for the next task, launching one if needed """
+        if self.browser is None:
+            self.browser = self.launch()
+            self.launches += 1
+            self.uses = 0
+        self.uses += 1
+        return self.browser
+
+    def release(self, failed=False):
+        """ Hands back the browser once a task is done with it
+            Args:
+            failed: whether the task failed, in which case a kept browser is replaced
+        """
+        if self.browser is None:
+            return
+
+        if not self.reuse:
+            ELEMENT_CACHE.invalidate(self.browser)
+            self.browser.close()
+            self.browser = None
+        elif failed or (self.recycle_after and self.uses >= self.recycle_after):
+            self.close()
+        else:
+            try:
+                reset_browser(self.browser)
+            except WebDriverException:
+                # A browser that can't be reset is replaced
+                self.close()
+
+    def close(self):
+        """ Shuts down the kept browser, if there is one """
+        if self.browser is not None:
+            browser = self.browser
+            self.browser = None
+            # The cache would otherwise keep the browser alive through its elements
+            ELEMENT_CACHE.invalidate(browser)
+            try:
+                browser.quit()
+            except WebDriverException:
+                pass
@@ -0,0 +1,76 @@
+""" Run settings
+
+Options that control how test plans are run. The values here apply to
+every test plan; a test plan can override any of them with a key of the
+same name in its entry in the test plan file, except for the
+RUN_SETTINGS, which directives read while they run and so apply to the
+whole run.
+
+"""
+
+
+class Settings(dict):
+    """ A map of setting names to values that also allows attribute access """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+SETTINGS = Settings(
+    # Keep one browser per test plan and reset it between tasks, instead
+    # of launching a new browser for every task
+    reuse_browser=False,
+    # When reusing browsers, replace the browser after this many tasks
+    # (None to keep it for the whole test plan)
+    recycle_after=None,
+    # The number of tasks of a test plan to run at once, each in its own
+    # browser. Tasks still wait for their setup tasks to finish.
+    parallel=1,
+    # Restore the browser state execute prerequisites left behind the first
+    # time they ran, instead of running their steps again for every task
+    snapshot_prerequisites=False,
+    # What to skip after a failure: None to run everything, "directive" for
+    # the rest of the step, "step" for the rest of the task too, "task" for
+    # the tasks that need the failed one as a setup task too, or "plan" for
+    # the rest of the test plan
+    fail_fast=None,
+    # Skip every remaining task once this many tasks have failed
+    # (None for no limit)
+    maxfail=None,
+    # How often "within N seconds" directives check their condition: first
+    # after wait_initial_delay seconds, then wait_backoff times longer each
+    # time, up to wait_max_delay seconds.
+    wait_initial_delay=0.02,
+    wait_backoff=2.0,
+    wait_max_delay=0.5,
+    # Wait for conditions inside the browser where possible, returning as
+    # soon as the page changes to meet them
+    browser_waits=True,
+    # The defaults for "Wait until the page is idle": how long the page must
+    # go without changing, in milliseconds, and how long to wait in total
+    idle_quiet_ms=500,
+    idle_timeout=10,
+    # Check runs of expectations in a step with one script in the browser,
+    # running only the ones the script couldn't confirm the usual way
+    batch_expectations=True,
+    # Keep the elements directives find, so directives in a row that act on
+    # the same element only find it once. Elements are found again after the
+    # page is navigated away from or changes them.
+    element_cache=False,
+    # Keep the elements "expect to see content" finds until the page
+    # changes, so polling for content only checks their visibility again
+    reuse_page_text=True,
+    # The script timeout browsers are set back to after waiting in the
+    # browser, in seconds. WebDriver starts browsers with 0; set this to
+    # the timeout your own directives give browsers, if they set one.
+    script_timeout=0,
+)
+
+# Settings read by directives, which don't know their test plan; test plans can't override these
+RUN_SETTINGS = frozenset([
+    "wait_initial_delay", "wait_backoff", "wait_max_delay", "browser_waits",
+    "idle_quiet_ms", "idle_timeout", "batch_expectations", "element_cache", "reuse_page_text",
+    "script_timeout",
+])
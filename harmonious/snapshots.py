@@ -0,0 +1,145 @@
+""" Execute prerequisite snapshots
+
+Captures the browser state an execute prerequisite leaves behind (its
+cookies, local and session storage and the page it finished on), so that
+later tasks can restore that state instead of running the prerequisite's
+steps again. A snapshot is discarded when the file of any prerequisite it
+covers changes.
+
+"""
+import os
+import threading
+
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.elements import ELEMENT_CACHE
+
+CAPTURE_STORAGE_SCRIPT = """
+function dump(storage) {
+    var values = {};
+    for (var i = 0; i < storage.length; i++) {
+        var key = storage.key(i);
+        values[key] = storage.getItem(key);
+    }
+    return values;
+}
+var state = {local: {}, session: {}};
+try { state.local = dump(window.localStorage); } catch (e) {}
+try { state.session = dump(window.sessionStorage); } catch (e) {}
+return state;
+"""
+
+RESTORE_STORAGE_SCRIPT = """
+function fill(storage, values) {
+    storage.clear();
+    for (var key in values) {
+        storage.setItem(key, values[key]);
+    }
+}
+try { fill(window.localStorage, arguments[0]); } catch (e) {}
+try { fill(window.sessionStorage, arguments[1]); } catch (e) {}
+"""
+
+
+def file_version(task):
+    """ Gets what identifies the version of the file a task was parsed from
+        Returns: a (modification time, size) tuple, or None if the task has no file
+    """
+    if task.filename is None:
+        return None
+    try:
+        stat = os.stat(task.filename)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+class Snapshot(object):
+    """ The state of a browser after running some execute prerequisites
+
+        Args:
+        browser: the WebDriver to capture the state of
+        versions: the file versions of the prerequisites run, see ::func::file_version
+
+        Attributes:
+        url: the page the browser was on
+        cookies: the cookies of that page, as returned by get_cookies
+        local_storage: a map of the page's local storage keys to values
+        session_storage: a map of the page's session storage keys to values
+        versions: the file versions of the prerequisites
+    """
+    def __init__(self, browser, versions):
+        self.versions = versions
+        self.url = browser.current_url
+        self.cookies = browser.get_cookies()
+        storage = browser.execute_script(CAPTURE_STORAGE_SCRIPT) or {}
+        self.local_storage = storage.get("local", {})
+        self.session_storage = storage.get("session", {})
+
+    def restore(self, browser):
+        """ Puts a browser into the captured state. Cookies can only be set
+            for the page being shown, so the page is loaded, the state set and
+            the page loaded again.
+
+            Returns: whether the state could be restored
+        """
+        ELEMENT_CACHE.invalidate(browser)
+        try:
+            browser.get(self.url)
+            browser.delete_all_cookies()
+            for cookie in self.cookies:
+                browser.add_cookie(cookie)
+            browser.execute_script(RESTORE_STORAGE_SCRIPT, self.local_storage, self.session_storage)
+            browser.get(self.url)
+        except WebDriverException:
+            return False
+        return True
+
+
+class SnapshotStore(object):
+    """ Snapshots by test plan and the execute prerequisites they cover.
+        The prerequisites of a task are run in order, so a snapshot is kept
+        for each run of prerequisites starting from the first.
+    """
+    def __init__(self):
+        self.snapshots = {}
+        self.lock = threading.Lock()
+
+    def key(self, test_plan, prerequisites):
+        return (test_plan.name, tuple(task.name for task in prerequisites))
+
+    def get(self, test_plan, prerequisites):
+        """ Gets the snapshot taken after running prerequisites, if it is still current
+            Args:
+            test_plan: the test plan the prerequisites run in
+            prerequisites: the ::class::Task objects run, in order
+
+            Returns: the ::class::Snapshot, or None
+        """
+        key = self.key(test_plan, prerequisites)
+        with self.lock:
+            snapshot = self.snapshots.get(key)
+            if snapshot is not None and snapshot.versions != [file_version(task) for task in prerequisites]:
+                # A prerequisite has been edited since
+                del self.snapshots[key]
+                snapshot = None
+        return snapshot
+
+    def capture(self, test_plan, prerequisites, browser):
+        """ Takes a snapshot of a browser that has just run prerequisites.
+            Browsers that can't report their state are ignored.
+        """
+        versions = [file_version(task) for task in prerequisites]
+        try:
+            snapshot = Snapshot(browser, versions)
+        except WebDriverException:
+            return
+        with self.lock:
+            self.snapshots[self.key(test_plan, prerequisites)] = snapshot
+
+    def clear(self):
+        with self.lock:
+            self.snapshots.clear()
+
+
+SNAPSHOTS = SnapshotStore()
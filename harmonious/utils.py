@@ -1,10 +1,36 @@
+import importlib
+
+
 def unquote_variable(name):
     unquotable_chars = ["\"", "'", "[", "]"]
-    if name[0] in unquotable_chars and name[-1] in unquotable_chars:
+    if len(name) > 0 and name[0] in unquotable_chars and name[-1] in unquotable_chars:
         return name[1:-1]
     else:
         return name
 
 
 def is_substitution(name):
-    return name[0] == "[" and name[-1] == "]"
\ No newline at end of file
+    return len(name) > 0 and name[0] == "[" and name[-1] == "]"
+
+
+def import_object(path):
+    """ Imports an object given its dotted path, like 'selenium.webdriver.Chrome' """
+    (module_name, name) = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), name)
+
+
+class LazyFactory(object):
+    """ A callable that stands in for a class (or other callable) that is
+        expensive to import. The target is imported the first time it is called.
+
+        Args:
+        path: the dotted path of the target
+
+        Attributes:
+        path: the dotted path of the target
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, *args, **kwargs):
+        return import_object(self.path)(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,276 @@
+""" Waiting for conditions
+
+The "within N seconds" directives wait for their condition in one of two
+ways. Where the condition can be written in JavaScript, a script waits
+for it inside the browser, woken by DOM mutations, and returns as soon
+as it holds. Otherwise, and whenever the browser can't run the script,
+the condition is checked from here, with the delay between checks
+growing by the backoff policy in the run settings.
+
+Waiting for a page to be idle, rather than for a fixed time, is also
+done in the browser, by counting the requests the page makes.
+
+"""
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.settings import SETTINGS
+
+# How many more seconds than the wait itself to let the browser run the script for
+SCRIPT_TIMEOUT_MARGIN = 1
+
+BROWSER_WAIT_SCRIPT = """
+var condition = new Function(arguments[0]);
+var args = arguments[1];
+var timeout = arguments[2];
+var done = arguments[arguments.length - 1];
+
+function check() {
+    try { return !!condition.apply(null, args); } catch (e) { return false; }
+}
+if (check()) {
+    done(true);
+    return;
+}
+
+var finished = false;
+var observer = null;
+var timer = null;
+var expiry = null;
+function finish(value) {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    clearInterval(timer);
+    clearTimeout(expiry);
+    done(value);
+}
+if (window.MutationObserver) {
+    observer = new MutationObserver(function () { if (check()) { finish(true); } });
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+// Titles, URLs and styles can change without a DOM mutation
+timer = setInterval(function () { if (check()) { finish(true); } }, 100);
+expiry = setTimeout(function () { finish(false); }, timeout);
+"""
+
+# JavaScript that finds an element by a WebDriver locator, or returns null
+LOCATE_SCRIPT = """
+function locate(by, value) {
+    if (by === "css selector") { return document.querySelector(value); }
+    if (by === "id") { return document.getElementById(value); }
+    if (by === "name") { return document.getElementsByName(value)[0] || null; }
+    if (by === "class name") { return document.getElementsByClassName(value)[0] || null; }
+    if (by === "tag name") { return document.getElementsByTagName(value)[0] || null; }
+    if (by === "xpath") { return document.evaluate(value, document, null, 9, null).singleNodeValue; }
+    throw new Error("Unknown locator " + by);
+}
+"""
+
+# The locator strategies LOCATE_SCRIPT understands
+LOCATABLE = ("css selector", "id", "name", "class name", "tag name", "xpath")
+
+
+# Waits until the page has loaded, has no XMLHttpRequest or fetch requests
+# in flight and hasn't changed for a while. Requests are counted from the
+# first time this runs on a page, so ones already in flight then are missed.
+IDLE_SCRIPT = """
+var quiet = arguments[0];
+var timeout = arguments[1];
+var done = arguments[arguments.length - 1];
+
+var state = window.__harmoniousIdle;
+if (!state) {
+    state = window.__harmoniousIdle = {pending: 0, changed: new Date().getTime()};
+    var touch = function () { state.changed = new Date().getTime(); };
+    var started = function () {
+        var ended = false;
+        state.pending++;
+        touch();
+        return function () {
+            if (!ended) { ended = true; state.pending--; touch(); }
+        };
+    };
+    if (window.XMLHttpRequest) {
+        var send = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function () {
+            var end = started();
+            this.addEventListener("loadend", end);
+            try { return send.apply(this, arguments); } catch (e) { end(); throw e; }
+        };
+    }
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function () {
+            var end = started();
+            return fetch.apply(this, arguments).then(
+                function (response) { end(); return response; },
+                function (error) { end(); throw error; });
+        };
+    }
+    if (window.MutationObserver) {
+        new MutationObserver(touch).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    }
+}
+
+var start = new Date().getTime();
+(function check() {
+    var now = new Date().getTime();
+    var idle = document.readyState === "complete" && state.pending === 0 && now - state.changed >= quiet;
+    if (idle || now - start >= timeout) {
+        done({idle: idle, readyState: document.readyState, pending: state.pending});
+    } else {
+        setTimeout(check, 25);
+    }
+})();
+"""
+
+
+class BackoffPolicy(object):
+    """ The delays between checks of a condition: the first delay, multiplied
+        by factor after every check, up to the maximum.
+
+        Args:
+        initial: the first delay, in seconds
+        factor: how much longer each delay is than the one before
+        maximum: the longest delay, in seconds
+    """
+    def __init__(self, initial, factor, maximum):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+
+    def delays(self):
+        """ A generator over the delays between checks """
+        delay = self.initial
+        while True:
+            yield min(delay, self.maximum)
+            delay *= self.factor
+
+
+def current_policy():
+    """ Gets the ::class::BackoffPolicy the run settings describe """
+    return BackoffPolicy(SETTINGS["wait_initial_delay"], SETTINGS["wait_backoff"], SETTINGS["wait_max_delay"])
+
+
+def wait_for_result(function, args, seconds, policy=None):
+    """ Calls a function until it doesn't raise, checking once more when the time is up.
+        Args:
+        function: the function to call
+        args: the arguments to call it with
+        seconds: how long to keep trying
+        policy: (optional) the ::class::BackoffPolicy to wait by, instead of the one in the run settings
+
+        Returns: what the function returned
+        Raises: the exception from the last call, if none succeeded
+    """
+    deadline = time.time() + float(seconds)
+    delays = (policy or current_policy()).delays()
+    while True:
+        try:
+            return function(*args)
+        except Exception:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise
+            time.sleep(min(next(delays), remaining))
+
+
+def run_async_script(browser, seconds, script, *args):
+    """ Runs an asynchronous script, letting it run for seconds plus SCRIPT_TIMEOUT_MARGIN.
+        WebDriver can't tell us the browser's script timeout, so afterwards it is set to
+        the script_timeout run setting, and scripts run later don't inherit the wait's.
+
+        Returns: what the script passed to its callback
+    """
+    browser.set_script_timeout(float(seconds) + SCRIPT_TIMEOUT_MARGIN)
+    try:
+        return browser.execute_async_script(script, *args)
+    finally:
+        try:
+            browser.set_script_timeout(SETTINGS["script_timeout"])
+        except WebDriverException:
+            pass
+
+
+def wait_in_browser(browser, condition, args, seconds):
+    """ Waits inside the browser for a JavaScript condition to hold
+        Args:
+        browser: the WebDriver
+        condition: the body of a JavaScript function that returns whether the condition holds
+        args: the arguments to pass that function
+        seconds: how long to wait for
+
+        Returns: True if the condition held, False if it didn't in time, or None if
+                 the browser couldn't wait (browser waits are turned off, the browser
+                 can't run the script, or the page was navigated away from)
+    """
+    if not SETTINGS["browser_waits"]:
+        return None
+    try:
+        return bool(run_async_script(browser, seconds, BROWSER_WAIT_SCRIPT, condition, args, int(float(seconds) * 1000)))
+    except WebDriverException:
+        return None
+
+
+def wait_for_element(browser, locator, seconds, present=True):
+    """ Waits inside the browser for an element to be present, or absent
+        Args:
+        browser: the WebDriver
+        locator: a CSS selector, or a (by, value) tuple
+        seconds: how long to wait for
+        present: (optional) whether to wait for the element to be present or absent
+
+        Returns: as ::func::wait_in_browser, also None if the locator can't be used in the browser
+    """
+    if type(locator) != tuple:
+        locator = ("css selector", locator)
+    if locator[0] not in LOCATABLE:
+        return None
+    comparison = "!==" if present else "==="
+    condition = LOCATE_SCRIPT + "return locate(arguments[0], arguments[1]) %s null;" % comparison
+    return wait_in_browser(browser, condition, list(locator), seconds)
+
+
+def remaining(start, seconds):
+    """ The seconds left of a wait that started at start, never less than 0 """
+    return max(0, float(seconds) - (time.time() - start))
+
+
+def runs_scripts(browser):
+    """ Whether a browser runs JavaScript, going by its javascriptEnabled capability """
+    return getattr(browser, "capabilities", {}).get("javascriptEnabled") is not False
+
+
+def wait_for_idle(browser, quiet, seconds):
+    """ Waits for a page to finish loading, have no requests in flight and
+        then not change for a while.
+
+        Args:
+        browser: the WebDriver
+        quiet: how long the page must go without changing, in milliseconds
+        seconds: how long to wait for
+
+        Returns: a dict with whether the page became idle ("idle"), and its
+                 "readyState" and number of "pending" requests when the wait ended
+        Raises: WebDriverException if the browser kept failing to run scripts
+    """
+    if not runs_scripts(browser):
+        # The page has loaded when get returns, and nothing on it can change
+        return {"idle": True, "readyState": "complete", "pending": 0}
+    try:
+        return run_async_script(browser, seconds, IDLE_SCRIPT, int(quiet), int(float(seconds) * 1000))
+    except WebDriverException:
+        pass
+
+    # Without async scripts, settle for the page having loaded
+    def loaded():
+        ready_state = browser.execute_script("return document.readyState;")
+        assert ready_state == "complete", ready_state
+        return ready_state
+
+    try:
+        return {"idle": True, "readyState": wait_for_result(loaded, [], seconds), "pending": 0}
+    except AssertionError as ex:
+        return {"idle": False, "readyState": str(ex), "pending": 0}
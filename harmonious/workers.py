@@ -0,0 +1,175 @@
+""" Multi-process test plan execution
+
+Shares test plans out between worker processes, each running plans with
+its own browsers. Output callbacks are not run in the workers; their
+calls are sent back to the parent process and replayed there, one test
+plan at a time in the original order, so the output reads the same as a
+serial run.
+
+Other callbacks (before and after, from test plans down to directives)
+run in the worker process running the plan, as they have to happen while
+it runs. State they keep stays in that worker, so callbacks that count or
+collect things across plans see only their own worker's share; a warning
+is printed when any are registered.
+
+"""
+import multiprocessing
+import cPickle as pickle
+from Queue import Empty
+
+from harmonious.core import Result, FAILURES
+from harmonious.registries import CALLBACK_REGISTRY, TASK_REGISTRY
+from harmonious.settings import SETTINGS
+from harmonious.exceptions import WorkerError
+
+
+def portable_exception(ex):
+    """ Gets an exception that can be sent to another process: the exception
+        itself if it survives pickling, otherwise a ::class::WorkerError describing it.
+    """
+    try:
+        pickle.loads(pickle.dumps(ex, pickle.HIGHEST_PROTOCOL))
+        return ex
+    except Exception:
+        return WorkerError("%s: %s" % (type(ex).__name__, ex))
+
+
+def make_portable(result):
+    """ Replaces exceptions in a result tree that can't be pickled """
+    if result.exception is not None:
+        result.exception = portable_exception(result.exception)
+    for child in result.itervalues():
+        make_portable(child)
+
+
+def send(queue, *event):
+    # Pickle here rather than in the queue's feeder thread, so a value that
+    # can't be pickled raises in the worker instead of being dropped
+    queue.put(pickle.dumps(event, pickle.HIGHEST_PROTOCOL))
+
+
+def work(plan_queue, event_queue, test_plans, tasks, settings, failures):
+    """ Worker process main loop: runs the test plans whose indexes arrive on
+        plan_queue until it receives None.
+
+        Args:
+        plan_queue: a queue of indexes into test_plans
+        event_queue: the queue to send callback and result events to
+        test_plans: the test plans being run
+        tasks: the contents of the parent's task registry
+        settings: the parent's run settings
+        failures: the multiprocessing.Value the failed tasks of every worker are counted in
+    """
+    TASK_REGISTRY.update(tasks)
+    SETTINGS.update(settings)
+    FAILURES.share(failures)
+    current = [None]
+
+    def forward(type, callback, kwargs):
+        if "result" in kwargs:
+            make_portable(kwargs["result"])
+        send(event_queue, "callback", current[0], type, callback, kwargs)
+    CALLBACK_REGISTRY.forward = forward
+
+    while True:
+        index = plan_queue.get()
+        if index is None:
+            break
+        current[0] = index
+        test_plan = test_plans[index]
+        try:
+            CALLBACK_REGISTRY.run_all(type="testplan", callback="before", test_plan=test_plan)
+            CALLBACK_REGISTRY.run_all(type="testplan", callback="before_output", test_plan=test_plan)
+            result = test_plan.run()
+            CALLBACK_REGISTRY.run_all(type="testplan", callback="after", test_plan=test_plan, result=result)
+            CALLBACK_REGISTRY.run_all(type="testplan", callback="after_output", test_plan=test_plan, result=result)
+        except Exception as ex:
+            result = Result(test_plan.name)
+            result.exception = ex
+        make_portable(result)
+        send(event_queue, "result", index, result)
+
+
+def worker_callbacks():
+    """ Gets the callbacks that run in worker processes rather than the parent
+        Returns: a sorted list of "type.callback" names that have callbacks registered
+    """
+    return sorted("%s.%s" % (type, callback)
+                  for (type, callbacks) in CALLBACK_REGISTRY.iteritems() if type != "all"
+                  for (callback, registered) in callbacks.iteritems()
+                  if registered and not callback.endswith("_output"))
+
+
+def run_sharded(test_plans, workers):
+    """ Runs test plans in worker processes
+        Args:
+        test_plans: the test plans to run
+        workers: the number of worker processes
+
+        Returns: the results of the test plans, in the same order
+    """
+    in_workers = worker_callbacks()
+    if in_workers:
+        print "WARNING: These callbacks run in the worker processes, not this one: %s" % ", ".join(in_workers)
+
+    plan_queue = multiprocessing.Queue()
+    event_queue = multiprocessing.Queue()
+    # Failed tasks are counted across the workers, so maxfail limits the whole run
+    failures = multiprocessing.Value('i', FAILURES.count)
+    for index in range(len(test_plans)):
+        plan_queue.put(index)
+
+    processes = []
+    for _ in range(min(workers, len(test_plans))):
+        plan_queue.put(None)
+        process = multiprocessing.Process(target=work, args=(plan_queue, event_queue, test_plans,
+                                                             dict(TASK_REGISTRY), dict(SETTINGS), failures))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+
+    results = [None] * len(test_plans)
+    buffered = [[] for _ in test_plans]
+    replaying = 0
+
+    def replay(event):
+        (_, index, type, callback, kwargs) = event
+        CALLBACK_REGISTRY.run_all(type=type, callback=callback, **kwargs)
+
+    try:
+        while replaying < len(test_plans):
+            try:
+                event = pickle.loads(event_queue.get(timeout=0.5))
+            except Empty:
+                event = None
+                if not any(process.is_alive() for process in processes):
+                    # Workers died without reporting every result
+                    for (index, test_plan) in enumerate(test_plans):
+                        if results[index] is None:
+                            results[index] = Result(test_plan.name)
+                            results[index].exception = WorkerError("Worker process exited before finishing the test plan")
+
+            if event is None:
+                pass
+            elif event[0] == "result":
+                results[event[1]] = event[2]
+            elif event[1] == replaying:
+                replay(event)
+            else:
+                buffered[event[1]].append(event)
+
+            # Once the plan being replayed is finished, catch up on the next ones
+            while replaying < len(test_plans) and results[replaying] is not None:
+                replaying += 1
+                if replaying < len(test_plans):
+                    for buffered_event in buffered[replaying]:
+                        replay(buffered_event)
+                    buffered[replaying] = []
+    finally:
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+        FAILURES.set(failures.value)
+
+    return results
@@ -12,8 +12,9 @@ setup(
     author_email='andrew.abbott@gmail.com',
     url='http://github.com/abbotao/harmonious',
     license='MIT',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires=required_modules,
+    extras_require={'gevent': ['gevent']},
     entry_points={
         'console_scripts': ['harmonious = harmonious.bin:main'],
         }
@@ -0,0 +1,70 @@
+""" Test doubles shared by the engine tests """
+import json
+import threading
+import SocketServer
+import BaseHTTPServer
+
+from harmonious.core import ENVIRONMENT_MAPPING
+
+
+class StubBrowser(object):
+    """ Records the WebDriver calls the engine makes, without a real browser """
+    launched = []
+
+    def __init__(self):
+        self.calls = []
+        self.window_handles = ["main"]
+        StubBrowser.launched.append(self)
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.calls.append((name,) + args)
+        return record
+
+
+ENVIRONMENT_MAPPING['stub'] = StubBrowser
+
+
+class StubWebDriverHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def respond(self):
+        length = int(self.headers.getheader("Content-Length") or 0)
+        body = self.rfile.read(length)
+        self.server.requests.append((self.command, self.path, body))
+        value = None
+        if self.command == "POST" and self.path.endswith("/session"):
+            value = {"browserName": json.loads(body)["desiredCapabilities"]["browserName"]}
+        elif self.path.endswith("/title"):
+            value = "Stub page"
+        data = json.dumps({"status": 0, "sessionId": "stub-session", "value": value})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_DELETE = respond
+
+    def log_message(self, *args):
+        pass
+
+
+class StubWebDriverServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ A WebDriver server on a local port that answers every command with
+        success, recording the requests and counting the connections made.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), StubWebDriverHandler)
+        self.connections = 0
+        self.requests = []
+        self.url = "http://127.0.0.1:%d/wd/hub" % self.server_address[1]
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
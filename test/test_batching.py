@@ -0,0 +1,96 @@
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.core import Step, Directive, NestedScope, Variables
+from harmonious.settings import SETTINGS
+from harmonious.batching import expectation_runs, BATCH_SCRIPT
+
+# Registers the webdriver directives
+from harmonious.directives import webdriver
+
+
+class BatchBrowser(object):
+    """ Answers batched checks with fixed values, and counts the requests made """
+    def __init__(self, held=None, title="Home", current_url="http://app/"):
+        self.held = held
+        self.batches = []
+        self.reads = 0
+        self._title = title
+        self._current_url = current_url
+
+    def execute_script(self, script, checks):
+        assert script == BATCH_SCRIPT
+        self.batches.append(checks)
+        if self.held is None:
+            raise WebDriverException("javascript is disabled")
+        return self.held
+
+    @property
+    def title(self):
+        self.reads += 1
+        return self._title
+
+    @property
+    def current_url(self):
+        self.reads += 1
+        return self._current_url
+
+
+def make_step(*directions):
+    step = Step("step")
+    step.directions = [Directive(direction) for direction in directions]
+    return step
+
+
+class TestBatching(object):
+    def setup(self):
+        self.settings = dict(SETTINGS)
+
+    def teardown(self):
+        SETTINGS.update(self.settings)
+
+    def test_finds_runs(self):
+        step = make_step('Expect Page Title is "Home"', 'Expect url to be "http://app/"', 'load http://app/',
+                         'Expect Page Title is "Home"', 'load http://app/',
+                         'Expect url to contain "app"', 'Expect #name is selected', 'Expect #name is not selected')
+        assert expectation_runs(step.directions) == {0: [0, 1], 5: [5, 6, 7]}
+
+    def test_text_and_patterns_not_batched(self):
+        # JavaScript reads element text and regular expressions differently, so these always run as usual
+        step = make_step('Expect Page Title is "Home"', 'Expect #msg contains "Error"', 'Expect #msg does not contain "OK"',
+                         'Expect #name to contain a value of "^A"', 'Expect url to be "http://app/"')
+        assert expectation_runs(step.directions) == {}
+
+    def test_one_request(self):
+        browser = BatchBrowser([True, True])
+        results = make_step('Expect Page Title is "Home"', 'Expect url to be "http://app/"').run(browser, NestedScope(Variables()))
+        assert not results.failed()
+        assert len(browser.batches) == 1
+        assert browser.batches[0][0][1] == {"title": "Home"}
+        assert browser.reads == 0
+
+    def test_unconfirmed_run_as_usual(self):
+        browser = BatchBrowser([True, False], current_url="http://other/")
+        results = make_step('Expect Page Title is "Home"', 'Expect url to be "http://app/"').run(browser, NestedScope(Variables()))
+        assert results.failed()
+        assert str(results['Expect url to be "http://app/"'].exception) == "URL was http://other/"
+        assert browser.reads == 2
+
+    def test_script_unsupported(self):
+        browser = BatchBrowser()
+        results = make_step('Expect Page Title is "Home"', 'Expect url to be "http://app/"').run(browser, NestedScope(Variables()))
+        assert not results.failed()
+        assert browser.reads == 2
+
+    def test_without_setting(self):
+        SETTINGS["batch_expectations"] = False
+        browser = BatchBrowser([True, True])
+        make_step('Expect Page Title is "Home"', 'Expect url to be "http://app/"').run(browser, NestedScope(Variables()))
+        assert browser.batches == []
+        assert browser.reads == 2
+
+    def test_substitutes_variables(self):
+        browser = BatchBrowser([True, True])
+        variables = Variables()
+        variables["agree"] = ("id", "agree")
+        make_step('Expect [agree] is selected', 'Expect url to be "http://app/"').run(browser, NestedScope(variables))
+        assert browser.batches[0][0][1] == {"elem": ("id", "agree")}
@@ -0,0 +1,113 @@
+import base64
+
+from nose.tools import raises
+
+from selenium.webdriver.chrome import webdriver as chrome_webdriver
+
+from harmonious.browsers import parse_environment, launch, BrowserOptions
+from harmonious.core import TestPlan, ENVIRONMENT_MAPPING
+from harmonious.exceptions import InvalidEnvironmentError
+
+
+class SizedBrowser(object):
+    """ Records what it was launched with and its window size """
+    def __init__(self, **arguments):
+        self.arguments = arguments
+        self.window_size = None
+
+    def set_window_size(self, width, height):
+        self.window_size = (width, height)
+
+
+class StubService(object):
+    """ Stands in for the chromedriver service """
+    service_url = "http://localhost:9515"
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def start(self):
+        pass
+
+
+class StubRemote(object):
+    """ Stands in for the remote WebDriver base class, recording the capabilities it was started with """
+    def __init__(self):
+        self.capabilities = None
+
+        def started(browser, command_executor, desired_capabilities, keep_alive):
+            self.capabilities = desired_capabilities
+        self.__init__ = started
+
+
+ENVIRONMENT_MAPPING['sized'] = SizedBrowser
+
+
+class TestBrowsers(object):
+    def test_browser_name(self):
+        assert parse_environment("Chrome") == ("Chrome", None)
+
+    def test_environment_block(self):
+        (name, options) = parse_environment({"Browser": "chrome", "headless": True, "PageLoadStrategy": "eager",
+                                             "windowsize": "1280x800", "block": ["images", "ads.example.com"]})
+        assert name == "chrome"
+        assert options.headless
+        assert options.page_load_strategy == "eager"
+        assert options.window_size == (1280, 800)
+        assert options.block_images and not options.block_fonts
+        assert options.blocked_hosts == ["ads.example.com"]
+
+    @raises(InvalidEnvironmentError)
+    def test_unknown_strategy(self):
+        parse_environment({"browser": "chrome", "pageloadstrategy": "lazy"})
+
+    @raises(InvalidEnvironmentError)
+    def test_unknown_option(self):
+        parse_environment({"browser": "chrome", "incognito": True})
+
+    @raises(InvalidEnvironmentError)
+    def test_bad_window_size(self):
+        parse_environment({"browser": "chrome", "windowsize": "large"})
+
+    def test_chrome_arguments(self):
+        options = BrowserOptions(True, "none", (800, 600), ["images", "fonts", "*.tracker.net"])
+        browser = launch(SizedBrowser, "Chrome", options)
+        capabilities = browser.arguments["desired_capabilities"]
+        assert capabilities["browserName"] == "chrome"
+        assert capabilities["pageLoadStrategy"] == "none"
+        arguments = capabilities["chromeOptions"]["args"]
+        assert "--headless" in arguments and "--disable-remote-fonts" in arguments
+        pac = [argument for argument in arguments if argument.startswith("--proxy-pac-url=")][0]
+        assert '"*.tracker.net"' in base64.b64decode(pac.split(",", 1)[1])
+        assert capabilities["chromeOptions"]["prefs"]["profile.managed_default_content_settings.images"] == 2
+        assert browser.window_size == (800, 600)
+
+    def test_local_chrome_keeps_options(self):
+        # Goes through selenium's Chrome constructor, which sets its own chromeOptions
+        (service, remote) = (chrome_webdriver.Service, chrome_webdriver.RemoteWebDriver)
+        chrome_webdriver.Service = StubService
+        chrome_webdriver.RemoteWebDriver = StubRemote()
+        try:
+            launch(chrome_webdriver.WebDriver, "chrome", BrowserOptions(True, block=["fonts"]))
+            capabilities = chrome_webdriver.RemoteWebDriver.capabilities
+        finally:
+            (chrome_webdriver.Service, chrome_webdriver.RemoteWebDriver) = (service, remote)
+        assert "--headless" in capabilities["chromeOptions"]["args"]
+        assert "--disable-remote-fonts" in capabilities["chromeOptions"]["args"]
+
+    def test_phantom_images(self):
+        browser = launch(SizedBrowser, "phantom", BrowserOptions(block=["images"]))
+        assert browser.arguments["desired_capabilities"]["phantomjs.page.settings.loadImages"] is False
+
+    def test_suite_environment(self):
+        test_plan = TestPlan("plan")
+        (test_plan.environment, test_plan.browser_options) = parse_environment({"browser": "sized", "windowsize": [640, 480]})
+        browser = test_plan.launch_browser()
+        assert browser.arguments == {}
+        assert browser.window_size == (640, 480)
+
+    def test_without_options(self):
+        test_plan = TestPlan("plan")
+        test_plan.environment = "sized"
+        browser = test_plan.launch_browser()
+        assert browser.window_size is None
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+
+from harmonious.cache import PlanCache
+from harmonious import parsers
+
+HERE = os.path.dirname(__file__)
+INPUT_DATA = os.path.join(HERE, 'input_data')
+
+
+class TestPlanCache(object):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = PlanCache(os.path.join(self.directory, 'cache'))
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def copy_input(self, name):
+        filename = os.path.join(self.directory, os.path.basename(name))
+        shutil.copy(os.path.join(INPUT_DATA, name), filename)
+        return filename
+
+    def test_task_round_trip(self):
+        filename = self.copy_input('testcases/testcase.yml')
+        parsed = self.cache.load(filename, parsers.parse_task_file)
+        cached = PlanCache(self.cache.directory).load(filename, parsers.parse_task_file)
+
+        assert cached.name == parsed.name
+        assert cached.variables["LoginLink"] == parsed.variables["LoginLink"]
+        assert [step.name for step in cached.steps] == [step.name for step in parsed.steps]
+        directive = cached.steps[0].directions[0]
+        assert directive.string == parsed.steps[0].directions[0].string
+        assert directive.func is None
+        directive.bind()
+        assert directive.func is parsed.steps[0].directions[0].func
+
+    def test_hits_and_misses(self):
+        filename = self.copy_input('testplan.yml')
+        self.cache.load(filename, parsers.parse_test_plan)
+        plans = self.cache.load(filename, parsers.parse_test_plan)
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+        assert plans[0].name == "Run Tests in Firefox"
+
+    def test_changed_file_is_parsed_again(self):
+        filename = self.copy_input('testplan.yml')
+        self.cache.load(filename, parsers.parse_test_plan)
+        with open(filename) as filehandle:
+            content = filehandle.read()
+        with open(filename, 'w') as filehandle:
+            filehandle.write(content.replace("Run Tests in Firefox", "Run Tests in Chrome"))
+
+        plans = self.cache.load(filename, parsers.parse_test_plan)
+        assert (self.cache.hits, self.cache.misses) == (0, 2)
+        assert plans[0].name == "Run Tests in Chrome"
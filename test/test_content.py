@@ -0,0 +1,62 @@
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.settings import SETTINGS
+from harmonious.directives import webdriver as wd
+
+
+class ShownElement(object):
+    def __init__(self, shown):
+        self.shown = shown
+
+    def is_displayed(self):
+        return self.shown
+
+
+class ContentBrowser(object):
+    """ Answers the content script, or searches with XPath when scripts don't work """
+    def __init__(self, found=None, elements=()):
+        self.found = found
+        self.elements = list(elements)
+        self.scripts = []
+        self.xpaths = []
+
+    def execute_script(self, script, *args):
+        self.scripts.append(args)
+        if self.found is None:
+            raise WebDriverException("javascript is disabled")
+        return self.found
+
+    def find_elements_by_xpath(self, xpath):
+        self.xpaths.append(xpath)
+        return self.elements
+
+
+class TestContainsContent(object):
+    def setup(self):
+        self.settings = dict(SETTINGS)
+
+    def teardown(self):
+        SETTINGS.update(self.settings)
+
+    def test_one_script(self):
+        browser = ContentBrowser(True)
+        assert wd.contains_content(browser, "Welcome")
+        assert browser.scripts == [("Welcome", True)]
+        assert browser.xpaths == []
+
+    def test_not_found(self):
+        browser = ContentBrowser(False)
+        assert not wd.contains_content(browser, "Welcome")
+        assert browser.xpaths == []
+
+    def test_without_reuse(self):
+        SETTINGS["reuse_page_text"] = False
+        browser = ContentBrowser(True)
+        wd.contains_content(browser, "Welcome")
+        assert browser.scripts == [("Welcome", False)]
+
+    def test_falls_back_to_xpath(self):
+        browser = ContentBrowser(None, [ShownElement(False), ShownElement(True)])
+        assert wd.contains_content(browser, "Welcome")
+        assert browser.xpaths == [wd.contains_xpath("Welcome")]
+        assert not wd.contains_content(ContentBrowser(None, [ShownElement(False)]), "Welcome")
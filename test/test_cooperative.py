@@ -0,0 +1,125 @@
+import time
+import multiprocessing
+
+from nose.plugins.skip import SkipTest
+
+from harmonious import Runner, LOADED_OUTPUT
+from harmonious.core import TestPlan, Task, Step, Directive
+from harmonious.decorators import directive
+from harmonious.registries import TASK_REGISTRY, CALLBACK_REGISTRY
+
+import stubs
+
+OUTPUT = []
+
+
+@directive(r'harmonious cooperative test waits (?P<seconds>[\d.]+) seconds')
+def cooperative_wait(browser, seconds):
+    # A blocking call in the directive, which yields once patched
+    time.sleep(float(seconds))
+
+
+@directive(r'harmonious cooperative test fails')
+def cooperative_fails(browser):
+    return False
+
+
+def record_task(task, result):
+    OUTPUT.append(task.name)
+
+
+def record_plan(test_plan, result):
+    OUTPUT.append(("plan", test_plan.name))
+
+
+def make_task(name, direction, setup_tasks=()):
+    task = Task(name)
+    task.setup_tasks = list(setup_tasks)
+    step = Step("step")
+    step.directions.append(Directive(direction))
+    task.steps.append(step)
+    TASK_REGISTRY[task.name] = task
+
+
+def make_plan(name, task_names):
+    test_plan = TestPlan(name)
+    test_plan.environment = "stub"
+    test_plan.tasks = list(task_names)
+    return test_plan
+
+
+class NoBrowserPlan(TestPlan):
+    def browser_session(self):
+        raise IOError("No browsers left")
+
+
+def in_child(function, *args):
+    """ Calls a function in a child process, so gevent's patching doesn't
+        affect the other tests, and returns what it returns
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=lambda: queue.put(function(*args)))
+    process.start()
+    value = queue.get(timeout=30)
+    process.join()
+    return value
+
+
+def run_timed(test_plans, greenlets):
+    from harmonious.cooperative import run_cooperative
+    start = time.time()
+    results = run_cooperative(test_plans, greenlets)
+    return (time.time() - start, results)
+
+
+def run_recorded(test_plans, greenlets):
+    Runner.run(test_plans, greenlets=greenlets)
+    return OUTPUT
+
+
+class TestCooperative(object):
+    def setup(self):
+        try:
+            import gevent
+        except ImportError:
+            raise SkipTest("gevent is not installed")
+        del OUTPUT[:]
+        LOADED_OUTPUT.append("test")
+        CALLBACK_REGISTRY['task']['after_output'].append(record_task)
+        CALLBACK_REGISTRY['testplan']['after_output'].append(record_plan)
+
+    def teardown(self):
+        LOADED_OUTPUT.remove("test")
+        CALLBACK_REGISTRY['task']['after_output'].remove(record_task)
+        CALLBACK_REGISTRY['testplan']['after_output'].remove(record_plan)
+        TASK_REGISTRY.clear()
+
+    def test_tasks_run_concurrently(self):
+        names = []
+        for index in range(20):
+            names.append("wait %d" % index)
+            make_task(names[-1], "harmonious cooperative test waits 0.2 seconds")
+        test_plans = [make_plan("first", names[:10]), make_plan("second", names[10:])]
+
+        (elapsed, results) = in_child(run_timed, test_plans, 20)
+        assert elapsed < 1.5
+        assert [len(result) for result in results] == [10, 10]
+        assert not any(result.failed() for result in results)
+
+    def test_setup_tasks_and_callbacks(self):
+        make_task("login", "harmonious cooperative test waits 0.05 seconds")
+        make_task("browse", "harmonious cooperative test waits 0.01 seconds", setup_tasks=["login"])
+        make_task("broken", "harmonious cooperative test fails")
+        test_plans = [make_plan("first", ["browse", "broken"]), make_plan("empty", [])]
+
+        output = in_child(run_recorded, test_plans, 4)
+        assert output.index("login") < output.index("browse")
+        assert sorted(output) == sorted(["login", "browse", "broken", ("plan", "first"), ("plan", "empty")])
+
+    def test_task_without_a_browser_fails(self):
+        make_task("login", "harmonious cooperative test waits 0.01 seconds")
+        test_plan = NoBrowserPlan("no browser")
+        test_plan.tasks = ["login"]
+
+        (_, results) = in_child(run_timed, [test_plan], 2)
+        assert isinstance(results[0]["login"].exception, IOError)
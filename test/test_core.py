@@ -0,0 +1,59 @@
+from nose.tools import raises
+
+from harmonious.core import Directive, Variables, NestedScope
+from harmonious.decorators import directive
+from harmonious.exceptions import UnknownDirectiveError, StepReturnedFalseError
+
+CALLS = []
+
+
+@directive(r'harmonious core test records (?P<value>.+)')
+def record_value(browser, value):
+    CALLS.append((browser, value))
+
+
+@directive(r'harmonious core test fails')
+def always_false(browser):
+    return False
+
+
+class TestDirective(object):
+    def setup(self):
+        del CALLS[:]
+        self.variables = Variables()
+        self.variables["name"] = "substituted"
+        self.scope = NestedScope(self.variables)
+
+    def test_bind(self):
+        directive = Directive('harmonious core test records "quoted"')
+        directive.bind()
+        assert directive.func is record_value
+        assert directive.arguments == {"value": ("quoted", False)}
+
+    def test_bind_substitution(self):
+        directive = Directive('harmonious core test records [name]')
+        directive.bind()
+        assert directive.arguments == {"value": ("name", True)}
+
+    @raises(UnknownDirectiveError)
+    def test_bind_unknown(self):
+        Directive('harmonious core test does not exist').bind()
+
+    def test_run_bound(self):
+        directive = Directive('harmonious core test records [name]')
+        directive.bind()
+        result = directive.run("browser", self.scope)
+        assert result.exception is None
+        assert CALLS == [("browser", "substituted")]
+
+    def test_run_binds_lazily(self):
+        directive = Directive('harmonious core test records "value"')
+        result = directive.run("browser", self.scope)
+        assert result.exception is None
+        assert directive.func is record_value
+        assert CALLS == [("browser", "value")]
+
+    def test_run_returned_false(self):
+        directive = Directive('harmonious core test fails')
+        result = directive.run("browser", self.scope)
+        assert type(result.exception) == StepReturnedFalseError
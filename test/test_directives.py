@@ -193,7 +193,7 @@ class TestDirectives(object):
 # def expect_elem_should_not_match_regexp(browser, elem, regexp):
 #     assert re.search(regexp, find_element(browser, elem).text) is None, "Value was in element."
 
-# @directive(r'Expect (?P<elem>.+) does not contain "(?P<regexp>.+) within (?P<seconds>\d+(\.\d+)?) seconds')
+# @directive(r'Expect (?P<elem>.+) does not contain "(?P<regexp>.+)" within (?P<seconds>\d+(\.\d+)?) seconds')
 # def expect_elem_should_not_match_regexp_within(browser, elem, regexp, seconds):
 #     return wait_for_result(expect_elem_should_not_match_regexp, [browser, regexp, elem], seconds)
 
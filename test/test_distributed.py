@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+from nose.tools import raises
+
+from harmonious import LOADED_OUTPUT
+from harmonious.core import TestPlan, Task, Step, Directive
+from harmonious.decorators import directive
+from harmonious.registries import TASK_REGISTRY, CALLBACK_REGISTRY
+from harmonious.distributed import Coordinator, run_worker, parse_address
+from harmonious.exceptions import WorkerError
+
+import stubs
+
+AUTHKEY = "harmonious tests"
+OUTPUT = []
+
+
+@directive(r'harmonious distributed test (?P<outcome>passes|fails)')
+def distributed_outcome(browser, outcome):
+    return outcome == "passes"
+
+
+@directive(r'harmonious distributed test exits once using "(?P<marker>.*)"')
+def distributed_exits_once(browser, marker):
+    # Kills the worker the first time it runs, as if its machine went away
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+
+
+@directive(r'harmonious distributed test always exits')
+def distributed_always_exits(browser):
+    os._exit(1)
+
+
+def record_task(task, result):
+    OUTPUT.append((task.name, result.failed()))
+
+
+def make_task(name, directions, setup_tasks=()):
+    task = Task(name)
+    task.setup_tasks = list(setup_tasks)
+    step = Step("step")
+    for direction in directions:
+        step.directions.append(Directive(direction))
+    task.steps.append(step)
+    TASK_REGISTRY[task.name] = task
+    return task
+
+
+def make_plan(name, task_names):
+    test_plan = TestPlan(name)
+    test_plan.environment = "stub"
+    test_plan.tasks = list(task_names)
+    return test_plan
+
+
+def start_workers(coordinator, count):
+    processes = []
+    for _ in range(count):
+        process = multiprocessing.Process(target=run_worker, args=(coordinator.address, AUTHKEY))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+    return processes
+
+
+class TestDistributed(object):
+    def setup(self):
+        del OUTPUT[:]
+        self.directory = tempfile.mkdtemp()
+        LOADED_OUTPUT.append("test")
+        CALLBACK_REGISTRY['task']['after_output'].append(record_task)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+        LOADED_OUTPUT.remove("test")
+        CALLBACK_REGISTRY['task']['after_output'].remove(record_task)
+        TASK_REGISTRY.clear()
+
+    def test_parse_address(self):
+        assert parse_address("localhost:8765") == ("localhost", 8765)
+        assert parse_address("/tmp/harmonious.sock") == "/tmp/harmonious.sock"
+
+    def test_runs_tasks_on_workers(self):
+        make_task("login", ["harmonious distributed test passes"])
+        make_task("browse", ["harmonious distributed test passes"], setup_tasks=["login"])
+        make_task("broken", ["harmonious distributed test fails"])
+        test_plans = [make_plan("first", ["browse", "broken"]), make_plan("second", ["login"])]
+
+        coordinator = Coordinator(test_plans, ("127.0.0.1", 0), AUTHKEY)
+        processes = start_workers(coordinator, 2)
+        results = coordinator.run()
+        for process in processes:
+            process.join(5)
+
+        assert [result.name for result in results] == ["first", "second"]
+        assert sorted(results[0].keys()) == ["broken", "browse", "login"]
+        assert results[0]["broken"].failed()
+        assert not results[0]["browse"].failed()
+        assert not results[1].failed()
+        # Output callbacks ran in the coordinator, setup tasks first
+        names = [name for (name, _) in OUTPUT]
+        assert sorted(names) == ["broken", "browse", "login", "login"]
+        assert names.index("login") < names.index("browse")
+
+    def test_unix_socket(self):
+        make_task("login", ["harmonious distributed test passes"])
+        coordinator = Coordinator([make_plan("plan", ["login"])], os.path.join(self.directory, "socket"), AUTHKEY)
+        start_workers(coordinator, 1)
+        results = coordinator.run()
+        assert not results[0].failed()
+
+    def test_reassigns_task_of_dead_worker(self):
+        marker = os.path.join(self.directory, "exited")
+        make_task("crashes", ['harmonious distributed test exits once using "%s"' % marker])
+        make_task("other", ["harmonious distributed test passes"])
+        test_plans = [make_plan("plan", ["crashes", "other"])]
+
+        coordinator = Coordinator(test_plans, ("127.0.0.1", 0), AUTHKEY)
+        start_workers(coordinator, 2)
+        results = coordinator.run()
+
+        assert os.path.exists(marker)
+        assert sorted(results[0].keys()) == ["crashes", "other"]
+        assert not results[0].failed()
+
+    def test_fails_task_that_keeps_killing_workers(self):
+        make_task("crashes", ["harmonious distributed test always exits"])
+        make_task("other", ["harmonious distributed test passes"])
+        test_plans = [make_plan("plan", ["crashes", "other"])]
+
+        coordinator = Coordinator(test_plans, ("127.0.0.1", 0), AUTHKEY, max_attempts=2)
+        start_workers(coordinator, 3)
+        results = coordinator.run()
+
+        assert isinstance(results[0]["crashes"].exception, WorkerError)
+        assert not results[0]["other"].failed()
+
+    @raises(WorkerError)
+    def test_stops_without_workers(self):
+        make_task("login", ["harmonious distributed test passes"])
+        Coordinator([make_plan("plan", ["login"])], ("127.0.0.1", 0), AUTHKEY, worker_timeout=1).run()
@@ -0,0 +1,128 @@
+from nose.tools import raises
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+
+from harmonious.settings import SETTINGS
+from harmonious.elements import ELEMENT_CACHE, find_element
+from harmonious.session import BrowserSession
+from harmonious.directives import webdriver as wd
+
+
+class PageElement(object):
+    def __init__(self, page, text):
+        self.page = page
+        self._text = text
+
+    @property
+    def text(self):
+        self.check()
+        return self._text
+
+    def click(self):
+        self.check()
+        self.page.clicks.append(self._text)
+
+    def send_keys(self, keys):
+        self.check()
+        self._text = keys
+
+    def check(self):
+        if self.page.version != self.version:
+            raise StaleElementReferenceException("stale")
+
+
+class PageBrowser(object):
+    """ Finds elements by CSS selector, and counts the finds """
+    def __init__(self, elements):
+        self.elements = elements
+        self.version = 0
+        self.finds = 0
+        self.clicks = []
+        self.current_url = "about:blank"
+
+    def find_element(self, by, value):
+        self.finds += 1
+        if value not in self.elements:
+            raise NoSuchElementException(value)
+        element = PageElement(self, self.elements[value])
+        element.version = self.version
+        return element
+
+    def get(self, url):
+        self.current_url = url
+        self.version += 1
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+class TestElementCache(object):
+    def setup(self):
+        self.settings = dict(SETTINGS)
+        SETTINGS["element_cache"] = True
+        ELEMENT_CACHE.clear()
+        self.browser = PageBrowser({"#name": "Name", "#go": "Go"})
+
+    def teardown(self):
+        SETTINGS.update(self.settings)
+        ELEMENT_CACHE.clear()
+
+    def test_finds_once(self):
+        wd.type_into_element(self.browser, "#name", "Typed")
+        wd.expect_elem_match_regexp(self.browser, "#name", "T.")
+        assert self.browser.finds == 1
+        assert (ELEMENT_CACHE.hits, ELEMENT_CACHE.misses) == (1, 1)
+
+    def test_click_invalidates(self):
+        # A click can submit a form or change the page without navigating
+        wd.click_element(self.browser, "#go")
+        find_element(self.browser, "#go")
+        assert self.browser.finds == 2
+
+    def test_sessions_forget_browsers(self):
+        for reuse in (False, True):
+            session = BrowserSession(lambda: PageBrowser({"#go": "Go"}), reuse, recycle_after=1)
+            find_element(session.acquire(), "#go")
+            session.release()
+            assert len(ELEMENT_CACHE.elements) == 0
+
+    def test_without_setting(self):
+        SETTINGS["element_cache"] = False
+        find_element(self.browser, "#go")
+        find_element(self.browser, "#go")
+        assert self.browser.finds == 2
+        assert ELEMENT_CACHE.misses == 0
+
+    def test_navigation_invalidates(self):
+        find_element(self.browser, "#go")
+        wd.load_url(self.browser, "http://app/")
+        find_element(self.browser, "#go")
+        assert self.browser.finds == 2
+
+    def test_stale_element_found_again(self):
+        element = find_element(self.browser, "#go")
+        # Navigating without a directive leaves the cached element stale
+        self.browser.get("http://app/")
+        assert element.text == "Go"
+        element.click()
+        assert self.browser.clicks == ["Go"]
+        assert self.browser.finds == 2
+        find_element(self.browser, "#go").click()
+        assert self.browser.finds == 2
+
+    def test_existence_checks_ask_browser(self):
+        find_element(self.browser, "#name")
+        del self.browser.elements["#name"]
+        wd.expect_not_exist(self.browser, "#name")
+        assert self.browser.finds == 2
+
+    @raises(NoSuchElementException)
+    def test_missing_element(self):
+        find_element(self.browser, "#missing")
+
+    def test_cached_by_browser(self):
+        other = PageBrowser({"#go": "Other"})
+        find_element(self.browser, "#go")
+        assert find_element(other, "#go").text == "Other"
@@ -0,0 +1,128 @@
+from harmonious.core import TestPlan, Task, Step, Directive, Result, NestedScope, Variables, FAILURES
+from harmonious.decorators import directive
+from harmonious.registries import TASK_REGISTRY
+from harmonious.output.results import analyze_results
+from harmonious.scheduler import SuiteScheduler
+
+import stubs
+
+RUN = []
+
+
+@directive(r'harmonious fail fast test (?P<name>\w+) (?P<outcome>passes|fails)')
+def fail_fast_outcome(browser, name, outcome):
+    RUN.append(name)
+    return outcome == "passes"
+
+
+def make_step(name, outcomes):
+    step = Step(name)
+    for (index, outcome) in enumerate(outcomes):
+        step.directions.append(Directive("harmonious fail fast test %s%d %s" % (name, index, outcome)))
+    return step
+
+
+def make_task(name, outcomes, setup_tasks=()):
+    task = Task(name)
+    task.setup_tasks = list(setup_tasks)
+    task.steps.append(make_step(name, outcomes))
+    TASK_REGISTRY[name] = task
+
+
+def make_plan(tasks, **settings):
+    test_plan = TestPlan("plan")
+    test_plan.environment = "stub"
+    test_plan.tasks = list(tasks)
+    test_plan.settings.update(settings)
+    return test_plan
+
+
+class TestFailFast(object):
+    def setup(self):
+        del RUN[:]
+        FAILURES.reset()
+        make_task("setup", ["fails"])
+        make_task("dependent", ["passes"], ["setup"])
+        make_task("independent", ["passes"])
+
+    def teardown(self):
+        TASK_REGISTRY.clear()
+        FAILURES.reset()
+
+    def test_step_runs_everything_by_default(self):
+        results = make_step("s", ["fails", "passes"]).run(None, NestedScope(Variables()))
+        assert RUN == ["s0", "s1"]
+        assert not results["harmonious fail fast test s1 passes"].skipped
+
+    def test_directive_level(self):
+        results = make_step("s", ["passes", "fails", "passes"]).run(None, NestedScope(Variables()), "directive")
+        assert RUN == ["s0", "s1"]
+        assert results["harmonious fail fast test s2 passes"].skipped
+
+    def test_step_level(self):
+        task = Task("task")
+        task.steps = [make_step("first", ["fails", "passes"]), make_step("second", ["passes"])]
+        results = task.run(None, NestedScope(Variables()), "step")
+        assert RUN == ["first0"]
+        assert results["second"].skipped
+        assert not results["second"].failed()
+
+    def test_task_level_skips_dependents(self):
+        results = make_plan(["dependent", "independent"], fail_fast="task").run()
+        assert RUN == ["setup0", "independent0"]
+        assert results["dependent"].skipped
+        assert results["setup"].failed()
+
+    def test_dependents_run_without_setting(self):
+        make_plan(["dependent", "independent"]).run()
+        assert RUN == ["setup0", "dependent0", "independent0"]
+
+    def test_plan_level(self):
+        results = make_plan(["dependent", "independent"], fail_fast="plan").run()
+        assert RUN == ["setup0"]
+        assert results["independent"].skipped
+
+    def test_maxfail(self):
+        make_task("again", ["fails"])
+        test_plan = make_plan(["setup", "again", "independent"], maxfail=2)
+        results = test_plan.run()
+        assert RUN == ["setup0", "again0"]
+        assert results["independent"].skipped
+        # The count carries over to the next test plan
+        assert make_plan(["independent"], maxfail=2).run()["independent"].skipped
+
+    def test_decides_from_its_own_prerequisite_results(self):
+        # Another task running in parallel stores its passing run of the
+        # execute prerequisite over this task's failing one
+        class Overwritten(Result):
+            def __setitem__(self, name, result):
+                Result.__setitem__(self, name, Result(name) if name == "setup" else result)
+
+        task = TASK_REGISTRY["dependent"]
+        (task.setup_tasks, task.execute_prerequisites) = ([], ["setup"])
+        test_plan = make_plan(["dependent"], fail_fast="task")
+        results = Overwritten("plan")
+        test_plan.run_task("dependent", test_plan.browser_session(), results)
+        assert RUN == ["setup0"]
+        assert results["dependent"].skipped
+        assert FAILURES.count == 1
+
+    def test_suite_scheduler_skips_dependents(self):
+        test_plan = make_plan(["dependent", "independent"], fail_fast="task")
+        results = [Result("plan")]
+        schedule = SuiteScheduler([test_plan], results)
+        assert schedule.take() == (0, "independent")
+        assert schedule.take() == (0, "setup")
+        failed = Result("setup")
+        failed.exception = AssertionError()
+        schedule.done((0, "setup"), {"setup": failed})
+        assert schedule.take() is None
+        assert results[0]["dependent"].skipped
+
+    def test_summary_counts(self):
+        results = make_plan(["dependent", "independent"], fail_fast="task").run()
+        passing = Result("passing")
+        summary = analyze_results([results, passing, results])
+        assert summary.plan_count == 3
+        assert summary.in_error == 2
+        assert summary.skipped == 2
@@ -0,0 +1,151 @@
+import os
+
+from nose.tools import raises
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.common.exceptions import WebDriverException, InvalidSelectorException
+
+from harmonious.core import TestPlan, Task, Step, Directive, NestedScope, Variables
+from harmonious.fake import FakeBrowser, FAKE_PAGES
+from harmonious.registries import TASK_REGISTRY
+from harmonious.directives import webdriver as wd
+
+HERE = os.path.dirname(__file__)
+TEST_HTML = os.path.join(HERE, 'html')
+PAGES = dict()
+for filename in os.listdir(TEST_HTML):
+    name = filename.split('.html')[0]
+    PAGES[name] = 'file://%s' % os.path.join(TEST_HTML, filename)
+
+LIST_PAGE = """<html><head><title>List</title></head><body>
+<ul id="items">
+  <li class="item first">One
+  <li class="item">Two <b>bold</b>
+  <li class="item" style="display: none">Three
+</ul>
+<div><a href="next.html">Next <span>page</span></a></div>
+<select id="single"><option value="a">A<option value="b">B</select>
+<input type="radio" name="size" value="s" checked><input type="radio" name="size" value="m">
+</body></html>"""
+
+
+class TestFakeBrowser(object):
+    def setup(self):
+        self.browser = FakeBrowser()
+        FAKE_PAGES["http://fake/list.html"] = LIST_PAGE
+        FAKE_PAGES["http://fake/next.html"] = "<title>Next</title>"
+
+    def teardown(self):
+        FAKE_PAGES.clear()
+        TASK_REGISTRY.clear()
+
+    def test_basic_page(self):
+        self.browser.get(PAGES['basic_page'])
+        assert self.browser.title == "This is a test page"
+        wd.expect_exists(self.browser, "#test1")
+        wd.expect_exists(self.browser, ("id", "test2"))
+        wd.expect_content(self.browser, "Testing")
+        assert not wd.contains_content(self.browser, "hidden")
+        assert not wd.contains_content(self.browser, "notfound")
+        wd.expect_elem_match_regexp(self.browser, "#test2", "Google")
+
+    @raises(NoSuchElementException)
+    def test_missing_element(self):
+        self.browser.get(PAGES['basic_page'])
+        wd.find_element(self.browser, "#notfound")
+
+    def test_form(self):
+        self.browser.get(PAGES['form'])
+        wd.type_into_element(self.browser, "#test1", "typed")
+        wd.expect_element_to_have_value(self.browser, "#test1", "typed")
+        wd.check_checkbox(self.browser, "#checkbox1")
+        wd.expect_checkbox_selected(self.browser, "#checkbox1")
+        wd.uncheck_checkbox(self.browser, "#checkbox1")
+        wd.expect_checkbox_not_selected(self.browser, "#checkbox1")
+        wd.choose_radio(self.browser, "rad")
+        assert wd.find_element(self.browser, "#radio1").is_selected()
+
+    def test_multi_select(self):
+        self.browser.get(PAGES['form'])
+        wd.select_multi_items(self.browser, "opt1, Test3", "#select1")
+        wd.assert_multi_selected(self.browser, "#select1", "opt1,opt3")
+        wd.select_contains(self.browser, "select1", "opt2")
+
+    def test_single_select_and_radios(self):
+        self.browser.get("http://fake/list.html")
+        assert wd.find_element(self.browser, "#single > option[value='a']").is_selected()
+        wd.select_single_item(self.browser, "#single", "b")
+        assert wd.find_element(self.browser, "#single").get_attribute("value") == "b"
+        wd.find_element(self.browser, "input[value=m]").click()
+        assert not wd.find_element(self.browser, "input[value='s']").is_selected()
+
+    def test_css_selectors(self):
+        self.browser.get("http://fake/list.html")
+        assert [element.text for element in self.browser.find_elements("css selector", "ul > li.item")] == \
+            ["One", "Two bold", ""]
+        assert self.browser.find_element("css selector", "li.first + li b").text == "bold"
+        assert len(self.browser.find_elements("css selector", "#items li:first-child, div a")) == 2
+
+    @raises(InvalidSelectorException)
+    def test_unsupported_selector(self):
+        self.browser.find_elements("css selector", "li:nth-child(2)")
+
+    def test_xpath(self):
+        self.browser.get("http://fake/list.html")
+        assert self.browser.find_element_by_xpath('//li[2]/b').text == "bold"
+        assert self.browser.find_element_by_xpath('//a[@href="next.html"][contains(., "Next")]')
+        assert len(self.browser.find_elements_by_xpath('//li[contains(@class, "item") and not(b)]')) == 2
+        assert self.browser.find_elements_by_xpath(wd.contains_xpath("Next page"))[0].tag_name == "a"
+
+    def test_links_navigate(self):
+        self.browser.get("http://fake/list.html")
+        link = wd.find_element(self.browser, "div a")
+        wd.follow_link(self.browser, "div a")
+        assert self.browser.current_url == "http://fake/next.html"
+        assert self.browser.title == "Next"
+        try:
+            link.text
+            assert False, "The link should be stale"
+        except StaleElementReferenceException:
+            pass
+
+    @raises(WebDriverException)
+    def test_unknown_url(self):
+        self.browser.get("http://example.com/")
+
+    def test_alerts(self):
+        wd.expect_no_alert(self.browser)
+        self.browser.alert = "Saved"
+        wd.expect_alert(self.browser, "Saved")
+        wd.accept_alert(self.browser)
+        assert self.browser.alert is None
+
+    def test_select_and_url_directives(self):
+        self.browser.get("http://fake/list.html")
+        variables = NestedScope(Variables())
+        for direction in ['Select "b" from "#single"', 'Expect url to contain "list"',
+                          'Expect url to contain "list" within 0.1 seconds']:
+            assert Directive(direction).run(self.browser, variables).exception is None
+        assert wd.find_element(self.browser, "#single").get_attribute("value") == "b"
+        assert Directive('Expect url to contain "other"').run(self.browser, variables).exception is not None
+
+    def test_does_not_contain_within(self):
+        self.browser.get("http://fake/list.html")
+        variables = NestedScope(Variables())
+        direction = Directive('Expect #items does not contain "Two" within 0.1 seconds')
+        assert direction.run(self.browser, variables).exception is not None
+        direction = Directive('Expect #items does not contain "Four" within 0.1 seconds')
+        assert direction.run(self.browser, variables).exception is None
+
+    def test_plan_runs(self):
+        task = Task("fake task")
+        step = Step("step")
+        for direction in ['load http://fake/list.html', 'expect to see content Two bold', 'click div a',
+                          'Expect Page Title is "Next"', 'Expect url to be "http://fake/next.html"',
+                          'Wait until the page is idle']:
+            step.directions.append(Directive(direction))
+        task.steps.append(step)
+        TASK_REGISTRY["fake task"] = task
+        test_plan = TestPlan("plan")
+        test_plan.environment = "fake"
+        test_plan.tasks = ["fake task"]
+        assert not test_plan.run().failed()
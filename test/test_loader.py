@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+
+from harmonious import loader
+from harmonious.cache import PlanCache
+from harmonious.core import TestPlan
+from harmonious.registries import TASK_REGISTRY
+
+TASK = """---
+Name: Task%03d
+Steps:
+    - Step 1:
+        - Load http://localhost/%d
+"""
+
+REFERENCED_TASK = """---
+Name: %s
+%s
+Steps: []
+"""
+
+
+class TestLoader(object):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'testcases', 'nested'))
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+        TASK_REGISTRY.clear()
+
+    def write_tasks(self, count, subdirectory=''):
+        for index in range(count):
+            filename = os.path.join(self.directory, 'testcases', subdirectory, 'task%03d.yml' % index)
+            with open(filename, 'w') as filehandle:
+                filehandle.write(TASK % (index, index))
+
+    def test_discover_task_files(self):
+        self.write_tasks(2)
+        self.write_tasks(1, 'nested')
+        testcases = os.path.join(self.directory, 'testcases')
+        assert loader.discover_task_files(self.directory) == [
+            os.path.join(testcases, 'nested', 'task000.yml'),
+            os.path.join(testcases, 'task000.yml'),
+            os.path.join(testcases, 'task001.yml')]
+        assert len(loader.discover_task_files(self.directory, recursive=False)) == 2
+
+    def test_parallel_matches_serial(self):
+        self.write_tasks(loader.MIN_PARALLEL_FILES * 2)
+        filenames = loader.discover_task_files(self.directory)
+        serial = loader.load_task_files(filenames, processes=1)
+        parallel = loader.load_task_files(filenames, processes=2)
+        assert [task.name for task in parallel] == [task.name for task in serial]
+        assert [task.filename for task in parallel] == filenames
+
+    def test_load_with_cache(self):
+        self.write_tasks(3)
+        filenames = loader.discover_task_files(self.directory)
+        cache = PlanCache(os.path.join(self.directory, 'cache'))
+        loader.load_task_files(filenames, cache)
+        tasks = loader.load_task_files(filenames, cache)
+        assert (cache.hits, cache.misses) == (3, 3)
+        assert [task.name for task in tasks] == ["Task000", "Task001", "Task002"]
+
+    def test_load_referenced_tasks(self):
+        for (name, prerequisites) in [("Plain", ""), ("Dependent", "Prerequisites:\n    SetupTasks: [Setup]"),
+                                      ("Setup", "Prerequisites:\n    ExecutePrerequisites: [Login]"),
+                                      ("Login", ""), ("Unused", "")]:
+            with open(os.path.join(self.directory, 'testcases', '%s.yml' % name), 'w') as filehandle:
+                filehandle.write(REFERENCED_TASK % (name, prerequisites))
+        test_plan = TestPlan("plan")
+        test_plan.tasks = ["Plain", "Dependent"]
+
+        loaded = loader.load_referenced_tasks([test_plan], loader.discover_task_files(self.directory))
+        assert loaded == 4
+        assert TASK_REGISTRY.get("Login") is not None
+        assert TASK_REGISTRY.get("Unused") is None
+
+    def test_load_referenced_tasks_falls_back(self):
+        with open(os.path.join(self.directory, 'testcases', 'odd.yml'), 'w') as filehandle:
+            filehandle.write('{"Name": "Odd", "Steps": []}')
+        self.write_tasks(2)
+        test_plan = TestPlan("plan")
+        test_plan.tasks = ["Odd"]
+
+        loaded = loader.load_referenced_tasks([test_plan], loader.discover_task_files(self.directory))
+        assert loaded == 3
+        assert TASK_REGISTRY.get("Odd") is not None
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+
+from nose.tools import raises
+
+from harmonious import parsers
+from harmonious.exceptions import InvalidSettingError
+
+HERE = os.path.dirname(__file__)
+INPUT_DATA = os.path.join(HERE, 'input_data')
+
+PLANS = """---
+- name: First
+  environment: Firefox
+  tasks:
+    - TestGoogleFrontPage
+---
+name: Second
+environment: Chrome
+remote: http://grid:4444/wd/hub
+tasks:
+    - TestGoogleFrontPage
+---
+"""
+
+
+class TestParsers(object):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_task_file_keys(self):
+        task = parsers.parse_task_file(os.path.join(INPUT_DATA, 'testcases', 'testcase.yml'))
+        assert task.name == "TestGoogleFrontPage"
+        # Keys of mappings inside lists are kept as written
+        assert [step.name for step in task.steps] == ["Step 1", "Step 2"]
+        assert task.variables["LoginLink"] == ("id", "gb_70")
+
+    def test_multiple_plan_documents(self):
+        filename = os.path.join(self.directory, 'plans.yml')
+        with open(filename, 'w') as filehandle:
+            filehandle.write(PLANS)
+        plans = parsers.parse_test_plan(filename)
+        assert [plan.name for plan in plans] == ["First", "Second"]
+        assert plans[1].environment == "Chrome"
+        assert plans[0].remote is None
+        assert plans[1].remote == "http://grid:4444/wd/hub"
+
+    def test_environment_block(self):
+        filename = os.path.join(self.directory, 'plans.yml')
+        with open(filename, 'w') as filehandle:
+            filehandle.write("name: Fast\n"
+                             "environment:\n"
+                             "  browser: Chrome\n"
+                             "  headless: true\n"
+                             "  pageloadstrategy: eager\n"
+                             "tasks: [TestGoogleFrontPage]\n")
+        plan = parsers.parse_test_plan(filename)[0]
+        assert plan.environment == "Chrome"
+        assert plan.browser_options.headless
+        assert plan.browser_options.page_load_strategy == "eager"
+
+    @raises(InvalidSettingError)
+    def test_run_settings_rejected(self):
+        filename = os.path.join(self.directory, 'plans.yml')
+        with open(filename, 'w') as filehandle:
+            filehandle.write("name: Slow\n"
+                             "environment: Chrome\n"
+                             "wait_max_delay: 2\n"
+                             "tasks: [TestGoogleFrontPage]\n")
+        parsers.parse_test_plan(filename)
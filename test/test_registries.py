@@ -0,0 +1,79 @@
+import re
+
+from nose.tools import raises
+
+from harmonious.registries import DirectiveRegistry, literal_prefix, specificity, LOOKUP_CACHE_SIZE
+from harmonious.exceptions import UnknownDirectiveError
+
+
+def compiled(regexp):
+    return re.compile(regexp, flags=re.IGNORECASE)
+
+
+def test_literal_prefix():
+    assert literal_prefix(compiled(r'Load (?P<url>.+)')) == "load "
+    assert literal_prefix(compiled(r'Select \[(?P<list>.+)\] from (?P<elem>.+)')) == "select ["
+    assert literal_prefix(compiled(r'^Accept the alert')) == "accept the alert"
+    assert literal_prefix(compiled(r'(?P<elem>.+) is shown')) == ""
+
+
+def test_specificity():
+    assert specificity(compiled(r'Expect (?P<elem>.+) to not exist')) == len("Expect  to not exist")
+    assert specificity(compiled(r'Wait (?P<seconds>\d+(\.\d+)?) seconds')) == len("Wait  seconds")
+
+
+class TestDirectiveRegistry(object):
+    def setup(self):
+        self.registry = DirectiveRegistry()
+
+    def test_lookup_by_prefix(self):
+        self.registry.add_directive(r'load (?P<url>.+)', "load")
+        self.registry.add_directive(r'click (?P<elem>.+)', "click")
+        (func, match) = self.registry.lookup("Click #button")
+        assert func == "click"
+        assert match.group("elem") == "#button"
+
+    def test_most_specific_wins(self):
+        self.registry.add_directive(r'Expect (?P<elem>.+) to not exist within (?P<seconds>\d+) seconds', "within")
+        self.registry.add_directive(r'Expect (?P<elem>.+) to not exist', "plain")
+        assert self.registry.lookup("Expect #a to not exist")[0] == "plain"
+        assert self.registry.lookup("Expect #a to not exist within 3 seconds")[0] == "within"
+
+    def test_registration_order_breaks_ties(self):
+        self.registry.add_directive(r'press (?P<elem>.+)', "first")
+        self.registry.add_directive(r'press (?P<button>.+)', "second")
+        assert self.registry.lookup("press #a")[0] == "first"
+
+    def test_prefixed_expressions_are_anchored(self):
+        self.registry.add_directive(r'load (?P<url>.+)', "load")
+        self.registry.add_directive(r'(?P<what>.+) is shown', "shown")
+        assert self.registry.lookup("please load this is shown")[0] == "shown"
+
+    def test_replacing_a_directive(self):
+        self.registry.add_directive(r'load (?P<url>.+)', "old")
+        self.registry.lookup("load here")
+        self.registry.add_directive(r'load (?P<url>.+)', "new")
+        assert self.registry.lookup("load here")[0] == "new"
+        assert len(self.registry) == 1
+
+    @raises(UnknownDirectiveError)
+    def test_removing_a_directive(self):
+        self.registry.add_directive(r'load (?P<url>.+)', "load")
+        self.registry.add_directive(r'click (?P<elem>.+)', "click")
+        del self.registry[compiled(r'load (?P<url>.+)')]
+        assert self.registry.lookup("click here")[0] == "click"
+        self.registry.lookup("load here")
+
+    def test_lookups_are_bounded(self):
+        self.registry.add_directive(r'load (?P<url>.+)', "load")
+        self.registry.lookup("load first")
+        for index in range(LOOKUP_CACHE_SIZE):
+            self.registry.lookup("load page%d" % index)
+        assert len(self.registry._lookups) == LOOKUP_CACHE_SIZE
+        assert "load first" not in self.registry._lookups
+        assert self.registry.lookup("load first")[1].group("url") == "first"
+
+    @raises(UnknownDirectiveError)
+    def test_unknown(self):
+        self.registry.add_directive(r'load (?P<url>.+)', "load")
+        self.registry.lookup("unload here")
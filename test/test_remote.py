@@ -0,0 +1,73 @@
+import httplib
+
+from nose.tools import raises
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from harmonious.core import TestPlan
+from harmonious.remote import ConnectionPool, PooledConnection, desired_capabilities, CONNECTION_POOL
+
+import stubs
+
+
+class TestRemote(object):
+    def setup(self):
+        self.server = stubs.StubWebDriverServer()
+        self.pool = ConnectionPool()
+
+    def teardown(self):
+        self.pool.clear()
+        CONNECTION_POOL.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def launch(self):
+        return WebDriver(command_executor=PooledConnection(self.server.url, self.pool),
+                         desired_capabilities=desired_capabilities("firefox"))
+
+    def test_commands_share_a_connection(self):
+        browser = self.launch()
+        for _ in range(10):
+            assert browser.title == "Stub page"
+        browser.get("http://example.com")
+        browser.quit()
+        assert len(self.server.requests) == 13
+        assert self.server.connections == 1
+        assert self.pool.connects == 1
+
+    def test_sessions_share_connections(self):
+        for _ in range(3):
+            self.launch().quit()
+        assert self.server.connections == 1
+
+    def test_reconnects_when_idle_connection_closed(self):
+        browser = self.launch()
+        for connection in self.pool.idle.values()[0]:
+            # As if the server timed the idle connection out
+            connection.sock.shutdown(2)
+        assert browser.title == "Stub page"
+        assert self.server.connections == 2
+
+    def test_https_server(self):
+        connection = PooledConnection("https://grid.example.com/wd/hub", self.pool)
+        assert connection.server == ("https", "grid.example.com", 443)
+        (pooled, reused) = self.pool.acquire(connection.server)
+        assert isinstance(pooled, httplib.HTTPSConnection) and not reused
+        assert pooled.port == 443
+
+    @raises(ValueError)
+    def test_unknown_scheme(self):
+        PooledConnection("ftp://grid.example.com/wd/hub", self.pool)
+
+    def test_desired_capabilities(self):
+        assert desired_capabilities("Chrome")["browserName"] == "chrome"
+        assert desired_capabilities("phantom")["browserName"] == "phantomjs"
+        assert desired_capabilities("htmlunit") == {"browserName": "htmlunit"}
+
+    def test_test_plan_launches_remote_browser(self):
+        test_plan = TestPlan("remote")
+        test_plan.environment = "Firefox"
+        test_plan.remote = self.server.url
+        browser = test_plan.launch_browser()
+        assert isinstance(browser, WebDriver)
+        assert browser.capabilities["browserName"] == "firefox"
+        browser.quit()
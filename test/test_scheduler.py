@@ -0,0 +1,119 @@
+import time
+import threading
+
+from nose.tools import raises
+
+from harmonious.core import TestPlan, Task, Step, Directive
+from harmonious.decorators import directive
+from harmonious.exceptions import DependencyCycleError
+from harmonious.registries import TASK_REGISTRY
+from harmonious.scheduler import TaskGraph, TaskScheduler
+from harmonious.bin import validate
+
+from stubs import StubBrowser
+
+EVENTS = []
+
+
+@directive(r'harmonious scheduler test records (?P<name>.+)')
+def record_task(browser, name):
+    EVENTS.append(("start", name, threading.current_thread().name))
+    time.sleep(0.05)
+    EVENTS.append(("end", name, threading.current_thread().name))
+
+
+def make_task(name, setup_tasks=()):
+    task = Task(name)
+    task.setup_tasks = list(setup_tasks)
+    step = Step("step")
+    step.directions.append(Directive("harmonious scheduler test records %s" % name))
+    task.steps.append(step)
+    TASK_REGISTRY[name] = task
+    return task
+
+
+def position(kind, name):
+    return [(event[0], event[1]) for event in EVENTS].index((kind, name))
+
+
+class TestScheduler(object):
+    def setup(self):
+        del EVENTS[:]
+        make_task("setup")
+        make_task("first", ["setup"])
+        make_task("second", ["setup"])
+        make_task("independent")
+
+    def teardown(self):
+        TASK_REGISTRY.clear()
+
+    def test_graph_includes_setup_tasks(self):
+        graph = TaskGraph(["first", "second", "independent"])
+        assert graph.order == ["first", "second", "independent", "setup"]
+        assert graph.dependents["setup"] == ["first", "second"]
+
+    def test_scheduler_order(self):
+        scheduler = TaskScheduler(TaskGraph(["first", "second", "independent"]))
+        assert list(scheduler.ready) == ["independent", "setup"]
+        scheduler.take()
+        assert scheduler.take() == "setup"
+        scheduler.done("setup")
+        assert list(scheduler.ready) == ["first", "second"]
+        assert not scheduler.finished()
+
+    def test_topological_order(self):
+        make_task("diamond", ["first", "second"])
+        graph = TaskGraph(["independent", "diamond", "first"])
+        assert graph.topological_order() == ["independent", "setup", "first", "second", "diamond"]
+
+    def test_ready_sets(self):
+        make_task("diamond", ["first", "second"])
+        graph = TaskGraph(["diamond", "independent"])
+        assert graph.ready_sets() == [["independent", "setup"], ["first", "second"], ["diamond"]]
+
+    def test_find_cycle(self):
+        assert TaskGraph(["first", "second"]).find_cycle() == []
+        make_task("setup", ["second"])
+        assert TaskGraph(["first", "independent"]).find_cycle() == ["setup", "second", "setup"]
+
+    @raises(DependencyCycleError)
+    def test_topological_order_cycle(self):
+        make_task("setup", ["first"])
+        TaskGraph(["first"]).topological_order()
+
+    def test_validate_reports_cycles(self):
+        make_task("setup", ["first"])
+        test_plan = TestPlan("plan")
+        test_plan.tasks = ["first", "independent"]
+        assert validate([test_plan]) == ["Setup tasks in test plan 'plan' depend on each other: first -> setup -> first"]
+
+    def test_serial_run_order(self):
+        test_plan = TestPlan("plan")
+        test_plan.environment = "stub"
+        test_plan.tasks = ["first", "second", "setup"]
+        test_plan.run()
+        assert [event[1] for event in EVENTS if event[0] == "start"] == ["setup", "first", "second"]
+
+    def test_parallel_run(self):
+        test_plan = TestPlan("plan")
+        test_plan.environment = "stub"
+        test_plan.settings["parallel"] = 3
+        test_plan.tasks = ["first", "second", "independent"]
+        results = test_plan.run()
+
+        assert sorted(results.keys()) == ["first", "independent", "second", "setup"]
+        assert not results.failed()
+        assert position("end", "setup") < position("start", "first")
+        assert position("end", "setup") < position("start", "second")
+        # independent tasks overlap
+        assert position("start", "setup") < position("end", "independent")
+        assert len(set(event[2] for event in EVENTS)) > 1
+
+    @raises(DependencyCycleError)
+    def test_parallel_cycle(self):
+        make_task("setup", ["first"])
+        test_plan = TestPlan("plan")
+        test_plan.environment = "stub"
+        test_plan.settings["parallel"] = 2
+        test_plan.tasks = ["first"]
+        test_plan.run()
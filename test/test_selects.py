@@ -0,0 +1,79 @@
+from nose.tools import raises
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.directives import webdriver as wd
+
+
+class Option(object):
+    def __init__(self, value, text, selected):
+        self.attributes = {"id": "", "name": None, "value": value}
+        self.text = text
+        self.selected = selected
+        self.reads = 0
+
+    def get_attribute(self, name):
+        self.reads += 1
+        return self.attributes[name]
+
+    def is_selected(self):
+        self.reads += 1
+        return self.selected
+
+
+class SelectBox(object):
+    def __init__(self, options):
+        self.options = options
+
+    def find_elements_by_xpath(self, xpath):
+        return self.options
+
+
+class SelectBrowser(object):
+    """ Has one select, and answers the option scripts unless scripts are turned off """
+    def __init__(self, options, scripts=True):
+        self.select = SelectBox(options)
+        self.scripts = scripts
+        self.calls = []
+
+    def find_element(self, by, value):
+        return self.select
+
+    def execute_script(self, script, select, *args):
+        self.calls.append(script)
+        if not self.scripts:
+            raise WebDriverException("javascript is disabled")
+        if script == wd.OPTION_STATES_SCRIPT:
+            return [dict(option.attributes, text=option.text, selected=option.selected) for option in select.options]
+        wanted = args[0]
+        missing = [value for value in wanted if value not in [option.attributes["value"] for option in select.options]]
+        if not missing:
+            for option in select.options:
+                option.selected = option.attributes["value"] in wanted
+        return missing
+
+
+def make_options():
+    return [Option("us", "United States", True), Option("fr", "France", False), Option("de", "Germany", True)]
+
+
+class TestSelects(object):
+    def test_multi_selected_in_one_call(self):
+        browser = SelectBrowser(make_options())
+        wd.assert_multi_selected(browser, "#country", "us,Germany")
+        assert browser.calls == [wd.OPTION_STATES_SCRIPT]
+        assert sum(option.reads for option in browser.select.options) == 0
+
+    @raises(AssertionError)
+    def test_multi_selected_fails(self):
+        wd.assert_multi_selected(SelectBrowser(make_options()), "#country", "us")
+
+    def test_multi_selected_without_scripts(self):
+        browser = SelectBrowser(make_options(), scripts=False)
+        wd.assert_multi_selected(browser, "#country", "us,Germany")
+        assert sum(option.reads for option in browser.select.options) > 0
+
+    def test_select_in_one_call(self):
+        browser = SelectBrowser(make_options())
+        wd.select_multi_items(browser, "fr, de", "#country")
+        assert browser.calls == [wd.SELECT_OPTIONS_SCRIPT]
+        assert [option.selected for option in browser.select.options] == [False, True, True]
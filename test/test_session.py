@@ -0,0 +1,72 @@
+from harmonious.core import TestPlan, Task, Step, Directive
+from harmonious.decorators import directive
+from harmonious.registries import TASK_REGISTRY
+from harmonious.session import BrowserSession
+
+from stubs import StubBrowser
+
+
+@directive(r'harmonious session test (?P<outcome>passes|fails)')
+def session_outcome(browser, outcome):
+    return outcome == "passes"
+
+
+def make_task(name, outcome="passes"):
+    task = Task(name)
+    step = Step("step")
+    step.directions.append(Directive("harmonious session test %s" % outcome))
+    task.steps.append(step)
+    TASK_REGISTRY[name] = task
+    return task
+
+
+class TestBrowserSession(object):
+    def setup(self):
+        del StubBrowser.launched[:]
+
+    def teardown(self):
+        TASK_REGISTRY.clear()
+
+    def test_no_reuse(self):
+        session = BrowserSession(StubBrowser)
+        first = session.acquire()
+        session.release()
+        second = session.acquire()
+        session.release()
+        assert first is not second
+        assert ("close",) in first.calls
+
+    def test_reuse_resets_browser(self):
+        session = BrowserSession(StubBrowser, reuse=True)
+        first = session.acquire()
+        session.release()
+        assert session.acquire() is first
+        assert ("delete_all_cookies",) in first.calls
+        assert ("get", "about:blank") in first.calls
+        session.close()
+        assert ("quit",) in first.calls
+
+    def test_recycle_after(self):
+        session = BrowserSession(StubBrowser, reuse=True, recycle_after=2)
+        for _ in range(5):
+            session.acquire()
+            session.release()
+        assert session.launches == 3
+
+    def test_recycle_on_failure(self):
+        session = BrowserSession(StubBrowser, reuse=True)
+        first = session.acquire()
+        session.release(failed=True)
+        assert session.acquire() is not first
+
+    def test_plan_reuses_browser(self):
+        test_plan = TestPlan("plan")
+        test_plan.environment = "stub"
+        test_plan.settings["reuse_browser"] = True
+        test_plan.tasks = [make_task("one").name, make_task("two").name, make_task("three", "fails").name,
+                           make_task("four").name]
+        results = test_plan.run()
+        assert results["three"].failed()
+        assert not results["four"].failed()
+        # "three" fails, so "four" gets a new browser
+        assert len(StubBrowser.launched) == 2
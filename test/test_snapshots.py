@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+
+from selenium.common.exceptions import WebDriverException
+
+from harmonious.core import TestPlan, Task, Step, Directive, ENVIRONMENT_MAPPING
+from harmonious.decorators import directive
+from harmonious.registries import TASK_REGISTRY
+from harmonious.snapshots import SNAPSHOTS, CAPTURE_STORAGE_SCRIPT
+
+LOGINS = []
+
+
+class StateBrowser(object):
+    """ Keeps the cookies, storage and URL a real browser would """
+    broken_cookies = False
+
+    def __init__(self):
+        self.current_url = "about:blank"
+        self.cookies = []
+        self.local_storage = {}
+        self.session_storage = {}
+        self.loads = []
+
+    def get(self, url):
+        self.current_url = url
+        self.loads.append(url)
+
+    def get_cookies(self):
+        return list(self.cookies)
+
+    def add_cookie(self, cookie):
+        if StateBrowser.broken_cookies:
+            raise WebDriverException("Invalid cookie domain")
+        self.cookies.append(cookie)
+
+    def delete_all_cookies(self):
+        self.cookies = []
+
+    def execute_script(self, script, *args):
+        if script == CAPTURE_STORAGE_SCRIPT:
+            return {"local": dict(self.local_storage), "session": dict(self.session_storage)}
+        (self.local_storage, self.session_storage) = (dict(args[0]), dict(args[1]))
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+ENVIRONMENT_MAPPING['state'] = StateBrowser
+
+
+@directive(r'harmonious snapshot test logs in')
+def snapshot_login(browser):
+    LOGINS.append(browser)
+    browser.get("http://app/home")
+    browser.add_cookie({"name": "session", "value": "secret"})
+    browser.local_storage["user"] = "test"
+
+
+@directive(r'harmonious snapshot test expects to be logged in')
+def snapshot_logged_in(browser):
+    return browser.current_url == "http://app/home" and browser.get_cookies()[0]["value"] == "secret" \
+        and browser.local_storage == {"user": "test"}
+
+
+def make_task(name, direction, prerequisites=()):
+    task = Task(name)
+    task.execute_prerequisites = list(prerequisites)
+    step = Step("step")
+    step.directions.append(Directive(direction))
+    task.steps.append(step)
+    TASK_REGISTRY[name] = task
+    return task
+
+
+class TestSnapshots(object):
+    def setup(self):
+        del LOGINS[:]
+        SNAPSHOTS.clear()
+        StateBrowser.broken_cookies = False
+        self.directory = tempfile.mkdtemp()
+        login = make_task("login", "harmonious snapshot test logs in")
+        login.filename = os.path.join(self.directory, "login.yml")
+        open(login.filename, "w").write("name: login\n")
+        self.test_plan = TestPlan("plan")
+        self.test_plan.environment = "state"
+        self.test_plan.settings["snapshot_prerequisites"] = True
+        for index in range(3):
+            make_task("task %d" % index, "harmonious snapshot test expects to be logged in", ["login"])
+            self.test_plan.tasks.append("task %d" % index)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+        TASK_REGISTRY.clear()
+        SNAPSHOTS.clear()
+
+    def test_prerequisite_runs_once(self):
+        results = self.test_plan.run()
+        assert not results.failed()
+        assert len(LOGINS) == 1
+
+    def test_without_setting(self):
+        self.test_plan.settings["snapshot_prerequisites"] = False
+        results = self.test_plan.run()
+        assert not results.failed()
+        assert len(LOGINS) == 3
+
+    def test_changed_file_invalidates(self):
+        self.test_plan.run()
+        with open(TASK_REGISTRY["login"].filename, "a") as filehandle:
+            filehandle.write("description: changed\n")
+        self.test_plan.run()
+        assert len(LOGINS) == 2
+
+    def test_failed_restore_runs_prerequisite(self):
+        self.test_plan.run()
+        StateBrowser.broken_cookies = True
+        self.test_plan.run()
+        assert len(LOGINS) == 4
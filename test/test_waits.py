@@ -0,0 +1,156 @@
+import time
+
+from nose.tools import raises
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from harmonious.settings import SETTINGS
+from harmonious.core import Directive, Variables
+from harmonious.waits import BackoffPolicy, wait_for_result, wait_in_browser, wait_for_element, wait_for_idle
+from harmonious.directives import webdriver as wd
+
+
+class ScriptBrowser(object):
+    """ Answers browser waits with a fixed value, recording the scripts run """
+    def __init__(self, answer=True, supported=True):
+        self.answer = answer
+        self.supported = supported
+        self.scripts = []
+        self.script_timeouts = []
+        self.title = "Loaded"
+
+    def set_script_timeout(self, seconds):
+        self.script_timeouts.append(seconds)
+
+    def execute_async_script(self, script, *args):
+        if not self.supported:
+            raise WebDriverException("async scripts are not supported")
+        self.scripts.append(args)
+        return self.answer
+
+    def execute_script(self, script, *args):
+        return "complete"
+
+    def find_element(self, by, value):
+        raise NoSuchElementException("not found")
+
+
+class TestWaits(object):
+    def setup(self):
+        self.settings = dict(SETTINGS)
+
+    def teardown(self):
+        SETTINGS.update(self.settings)
+
+    def test_backoff_delays(self):
+        delays = BackoffPolicy(0.1, 2, 0.5).delays()
+        assert [next(delays) for _ in range(5)] == [0.1, 0.2, 0.4, 0.5, 0.5]
+
+    def test_returns_at_once(self):
+        start = time.time()
+        assert wait_for_result(lambda: True, [], 5)
+        assert time.time() - start < 0.1
+
+    def test_checks_less_often_over_time(self):
+        calls = []
+
+        def condition():
+            calls.append(time.time())
+            raise AssertionError()
+
+        try:
+            wait_for_result(condition, [], 0.5, BackoffPolicy(0.02, 2, 1))
+        except AssertionError:
+            pass
+        gaps = [later - earlier for (earlier, later) in zip(calls, calls[1:])]
+        assert 4 <= len(calls) <= 7
+        assert gaps[-1] > gaps[0] * 2
+        # One last check once the time is up
+        assert calls[-1] - calls[0] >= 0.5
+
+    def test_passes_once_condition_holds(self):
+        ready = time.time() + 0.2
+
+        def condition():
+            assert time.time() >= ready
+            return True
+
+        assert wait_for_result(condition, [], 2, BackoffPolicy(0.01, 1.5, 0.05))
+        assert time.time() - ready < 0.1
+
+    @raises(AssertionError)
+    def test_zero_seconds_checks_once(self):
+        def condition():
+            raise AssertionError()
+        wait_for_result(condition, [], 0)
+
+    def test_browser_wait(self):
+        browser = ScriptBrowser()
+        assert wait_in_browser(browser, "return true;", ["a"], 2) is True
+        assert browser.scripts == [("return true;", ["a"], 2000)]
+        # The wait's timeout only applies to its own script
+        assert browser.script_timeouts == [3, 0]
+        SETTINGS["script_timeout"] = 30
+        wait_in_browser(browser, "return true;", [], 2)
+        assert browser.script_timeouts[2:] == [3, 30]
+
+    def test_browser_wait_unsupported(self):
+        assert wait_in_browser(ScriptBrowser(supported=False), "return true;", [], 1) is None
+        SETTINGS["browser_waits"] = False
+        assert wait_in_browser(ScriptBrowser(), "return true;", [], 1) is None
+
+    def test_element_locators(self):
+        browser = ScriptBrowser()
+        assert wait_for_element(browser, "#id", 1)
+        assert browser.scripts[-1][1] == ["css selector", "#id"]
+        assert wait_for_element(browser, ("link text", "Home"), 1) is None
+
+    def test_title_within_uses_browser_wait(self):
+        browser = ScriptBrowser()
+        wd.expect_page_title_within(browser, "Loaded", 5)
+        assert browser.scripts[0][1] == ["Loaded"]
+
+    def test_not_exist_within_passes_at_once(self):
+        browser = ScriptBrowser(supported=False)
+        start = time.time()
+        wd.expect_not_exist_within(browser, "#gone", 2)
+        assert time.time() - start < 0.5
+
+    def test_idle_wait(self):
+        browser = ScriptBrowser({"idle": True, "readyState": "complete", "pending": 0})
+        assert wait_for_idle(browser, 200, 2)["idle"]
+        assert browser.scripts == [(200, 2000)]
+
+    def test_idle_wait_falls_back_to_ready_state(self):
+        state = wait_for_idle(ScriptBrowser(supported=False), 200, 1)
+        assert state == {"idle": True, "readyState": "complete", "pending": 0}
+
+    def test_idle_wait_without_javascript(self):
+        browser = ScriptBrowser(supported=False)
+        browser.capabilities = {"javascriptEnabled": False}
+        assert wait_for_idle(browser, 200, 5)["idle"]
+        assert browser.scripts == []
+
+    @raises(WebDriverException)
+    def test_idle_wait_script_errors(self):
+        # A browser that runs scripts but fails to, say because an alert is open, isn't idle
+        browser = ScriptBrowser(supported=False)
+        browser.execute_script = lambda script: browser.execute_async_script(script)
+        wait_for_idle(browser, 200, 0.2)
+
+    def test_idle_directive(self):
+        browser = ScriptBrowser({"idle": True, "readyState": "complete", "pending": 0})
+        result = Directive("Wait until the page is idle for 250ms within 3 seconds").run(browser, Variables())
+        assert result.exception is None
+        assert browser.scripts == [(250, 3000)]
+        assert result.elapsed is not None
+
+    def test_idle_directive_defaults(self):
+        browser = ScriptBrowser({"idle": True, "readyState": "complete", "pending": 0})
+        Directive("Wait until the page is idle").run(browser, Variables())
+        assert browser.scripts == [(SETTINGS["idle_quiet_ms"], SETTINGS["idle_timeout"] * 1000)]
+
+    def test_idle_directive_fails(self):
+        browser = ScriptBrowser({"idle": False, "readyState": "interactive", "pending": 2})
+        result = Directive("Wait until the page is idle within 1 seconds").run(browser, Variables())
+        assert isinstance(result.exception, AssertionError)
+        assert "2 requests in flight" in str(result.exception)
@@ -0,0 +1,89 @@
+from harmonious import Runner, LOADED_OUTPUT
+from harmonious.core import TestPlan, Task, Step, Directive, FAILURES
+from harmonious.decorators import directive
+from harmonious.registries import TASK_REGISTRY, CALLBACK_REGISTRY
+from harmonious.workers import run_sharded, worker_callbacks
+
+import stubs
+
+OUTPUT = []
+
+
+@directive(r'harmonious workers test (?P<outcome>passes|fails)')
+def worker_outcome(browser, outcome):
+    return outcome == "passes"
+
+
+def record_directive(directive, result):
+    OUTPUT.append((directive.string, result.exception is not None))
+
+
+def record_summary(results):
+    OUTPUT.append(("summary", [result.name for result in results]))
+
+
+def make_plan(name, outcomes):
+    test_plan = TestPlan(name)
+    test_plan.environment = "stub"
+    for (index, outcome) in enumerate(outcomes):
+        task = Task("%s task %d" % (name, index))
+        step = Step("step")
+        step.directions.append(Directive("harmonious workers test %s" % outcome))
+        task.steps.append(step)
+        TASK_REGISTRY[task.name] = task
+        test_plan.tasks.append(task.name)
+    return test_plan
+
+
+class TestWorkers(object):
+    def setup(self):
+        del OUTPUT[:]
+        # Stand in for an output module so Runner.run doesn't load the console one
+        LOADED_OUTPUT.append("test")
+        CALLBACK_REGISTRY['directive']['after_output'].append(record_directive)
+        CALLBACK_REGISTRY['all']['after_output'].append(record_summary)
+        self.test_plans = [make_plan("first", ["passes", "fails"]), make_plan("second", ["passes"]),
+                           make_plan("third", ["fails", "passes", "passes"])]
+
+    def teardown(self):
+        LOADED_OUTPUT.remove("test")
+        CALLBACK_REGISTRY['directive']['after_output'].remove(record_directive)
+        CALLBACK_REGISTRY['all']['after_output'].remove(record_summary)
+        TASK_REGISTRY.clear()
+
+    def test_output_matches_serial_run(self):
+        Runner.run(self.test_plans)
+        serial = list(OUTPUT)
+        del OUTPUT[:]
+        Runner.run(self.test_plans, workers=2)
+        assert OUTPUT == serial
+        assert serial[-1] == ("summary", ["first", "second", "third"])
+
+    def test_results(self):
+        results = run_sharded(self.test_plans, 3)
+        assert [result.name for result in results] == ["first", "second", "third"]
+        assert results[0]["first task 1"].failed()
+        assert not results[1].failed()
+
+    def test_maxfail_counts_across_workers(self):
+        test_plans = [make_plan("fourth", ["fails"] * 4), make_plan("fifth", ["fails"] * 4)]
+        for test_plan in test_plans:
+            test_plan.settings["maxfail"] = 2
+        FAILURES.reset()
+        try:
+            results = run_sharded(test_plans, 2)
+            failed = [name for result in results for (name, task) in result.iteritems() if task.failed()]
+            # Each worker counting alone would let four tasks fail; at most one more
+            # than the limit can fail while the other worker's task is running
+            assert 2 <= len(failed) <= 3
+            assert FAILURES.count == len(failed)
+        finally:
+            FAILURES.reset()
+
+    def test_callbacks_run_in_workers(self):
+        assert worker_callbacks() == []
+        CALLBACK_REGISTRY['task']['before'].append(record_summary)
+        try:
+            assert worker_callbacks() == ["task.before"]
+        finally:
+            CALLBACK_REGISTRY['task']['before'].remove(record_summary)